@@ -7,16 +7,94 @@ class Settings(BaseSettings):
     # Time System Configuration
     # 1 real second = X game minutes (Default: 1 tick = 1 minute)
     MINUTES_PER_TICK: int = 1
+    # 所有 Agent 睡眠时快进到下一个事件，而不是逐 Tick 模拟（默认关闭：开启后 Tick 监听器每次快进只触发一次）
+    FAST_FORWARD_IDLE: bool = False
+    # 按动作时长调度决策：Agent 只在动作结束或被事件打断时调用大脑
+    ACTION_SCHEDULER_ENABLED: bool = True
+    # health / sanity / energy 跌破该值时打断当前动作、下一个 Tick 重新决策（<= 0 表示不打断）
+    CRITICAL_STAT_THRESHOLD: float = 20.0
+    # 后台推进任务每段的 Tick 数（段间响应取消；世界锁按每个 Tick 让出）
+    TICK_JOB_CHUNK: int = 10
     
     # Map Configuration
     MAP_WIDTH: int = 100
     MAP_HEIGHT: int = 100
+    # 空间索引网格桶边长（格）
+    SPATIAL_CELL_SIZE: int = 8
     
     # LLM API Configuration (OpenAI Compatible)
     LLM_API_KEY: str = ""
     LLM_BASE_URL: str = "https://api.openai.com/v1"
     LLM_MODEL: str = "gpt-4o-mini"
     LLM_EMBEDDING_MODEL: str = "text-embedding-3-small"
+    # Embedding 服务地址，留空使用 OpenAI 默认地址（压测时可指向本地桩服务）
+    LLM_EMBEDDING_BASE_URL: str = ""
+    
+    # 所有 Agent 共享的长期记忆集合名（Mock Embedding 使用 "{name}_mock"）
+    MEMORY_COLLECTION: str = "agent_memory"
+    # 午夜归档批量写入：每批文档数（不超过 Embedding 服务的单次输入上限）与失败重试
+    EMBEDDING_BATCH_SIZE: int = 128
+    MEMORY_WRITE_MAX_RETRIES: int = 3
+    MEMORY_WRITE_RETRY_BACKOFF: float = 0.5
+    
+    # 每个 Tick 并发发起的决策请求上限（<= 1 时按顺序调用）
+    DECISION_CONCURRENCY: int = 8
+    # 每个 Tick 决策阶段的截止时间（秒），超时的 Agent 退回规则决策；<= 0 表示不限
+    DECISION_DEADLINE: float = 20.0
+    # 单次 LLM 请求超时（秒）、失败重试次数与退避基数（秒，指数退避加抖动）
+    LLM_TIMEOUT: float = 60.0
+    LLM_MAX_RETRIES: int = 2
+    LLM_RETRY_BACKOFF: float = 0.5
+    # 熔断：连续多少次服务故障后打开，打开后冷却多少秒再试探
+    CIRCUIT_BREAKER_THRESHOLD: int = 5
+    CIRCUIT_BREAKER_COOLDOWN: float = 30.0
+    
+    # 午夜反思的并发上限（<= 1 时按顺序调用）与等待上限（秒，超时保留原价值观）
+    REFLECTION_CONCURRENCY: int = 8
+    REFLECTION_TIMEOUT: float = 90.0
+    
+    # 决策缓存：按量化状态复用 LLM 决策（TTL 单位为秒）
+    DECISION_CACHE_ENABLED: bool = False
+    DECISION_CACHE_SIZE: int = 1024
+    DECISION_CACHE_TTL: float = 300.0
+    DECISION_CACHE_BYPASS_PROB: float = 0.1
+    
+    # 世界推送（/world/stream）：每个客户端的待发消息上限，超出后丢弃并改发全量快照
+    STREAM_QUEUE_SIZE: int = 32
+    # 推送与增量查询中数值保留的小数位，低于该精度的变化不算修改
+    STREAM_STAT_PRECISION: int = 1
+    # /world/diff 保留的移除记录条数；since 早于已遗忘的记录时返回全量快照
+    DIFF_REMOVAL_LOG_SIZE: int = 4096
+    
+    # 世界检查点：目录、自动检查点间隔（Tick，0 为关闭）、每隔多少次写一个全量基线、deflate 压缩级别（0 为不压缩）
+    CHECKPOINT_DIR: str = "checkpoints"
+    CHECKPOINT_INTERVAL_TICKS: int = 0
+    CHECKPOINT_FULL_EVERY: int = 10
+    CHECKPOINT_COMPRESSION: int = 1
+    # 启动时从最新的检查点恢复
+    CHECKPOINT_RESTORE_ON_START: bool = False
+    
+    # 决策日志：SQLite 文件路径（留空使用内存数据库）与缓冲多少条后整批写入
+    JOURNAL_PATH: str = ""
+    JOURNAL_FLUSH_SIZE: int = 512
+    # 内存数据库（JOURNAL_PATH 为空）只保留最近多少个 Tick 的记录，<= 0 表示不清理
+    JOURNAL_MEMORY_RETENTION_TICKS: int = 1440
+    
+    # 每次决策记忆上下文的 token 预算（<= 0 时不压缩，原样拼接短期记忆）
+    MEMORY_CONTEXT_TOKEN_BUDGET: int = 200
+    
+    # 决策提示词布局："legacy"（原模板）或 "prefix"（静态内容在前、状态在后，利于前缀缓存）
+    PROMPT_LAYOUT: str = "legacy"
+    # 统计提示词 token 数所用的 tiktoken 编码（不可用时按字节数估算）
+    PROMPT_TOKEN_ENCODING: str = "cl100k_base"
+    
+    # 分阶段 Tick 计时与 /admin/metrics（Prometheus 文本格式）；关闭时引擎不做任何计时
+    METRICS_ENABLED: bool = False
+    
+    # 按地图区域分片的多进程模式：worker 进程数（<= 1 表示单进程），
+    # 以及边界附近作为幽灵实体同步给相邻分片的距离（格，应不小于感知半径）
+    SHARD_COUNT: int = 0
+    SHARD_GHOST_RADIUS: int = 3
     
     # Language Configuration: "en" or "zh"
     LANGUAGE: str = "zh"
@@ -0,0 +1,29 @@
+from collections import defaultdict
+from typing import Dict
+
+# Tick 内的计时阶段；tick 为逐个推进时单个 Tick 的总耗时
+PHASES = ("time", "perception", "memory", "brain", "action", "effects", "tick")
+
+class PhaseTimer:
+    """
+    按阶段累计耗时（秒）。
+    WorldEngine.phase_timer 为 None 时引擎不做任何计时。
+    """
+
+    def __init__(self):
+        self.totals: Dict[str, float] = defaultdict(float)
+        self.counts: Dict[str, int] = defaultdict(int)
+
+    def record(self, phase: str, seconds: float):
+        self.totals[phase] += seconds
+        self.counts[phase] += 1
+
+    def reset(self):
+        self.totals.clear()
+        self.counts.clear()
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        return {
+            phase: {"seconds": self.totals[phase], "count": self.counts[phase]}
+            for phase in PHASES if phase in self.totals
+        }
@@ -60,6 +60,63 @@ Decide your next action. Respond with JSON:
     }
 }
 
+# 决策提示词模板（前缀布局）：规则、动作列表与 JSON 格式全部放在固定的 system 中，
+# user 只包含随 Agent 变化的状态，便于服务商复用已缓存的提示词前缀
+DECISION_PROMPTS_PREFIX = {
+    "en": {
+        "system": """You are a digital soul making decisions in a virtual world. Respond with JSON only.
+
+Available Actions:
+- IDLE: Do nothing
+- SLEEP: Rest and recover energy
+- WORK_996: Work to earn money
+- REST_PARK: Relax at the park
+- EAT: Consume food
+- SOCIAL: Interact with others
+
+Given your situation, memories and stats, decide your next action. Respond with JSON:
+{
+  "action": "ACTION_NAME",
+  "target": {optional target info},
+  "thought": "your reasoning"
+}""",
+        "user": """Current Situation:
+{perception_text}
+
+Your Memories:
+{memory_context}
+
+Your Stats:
+{stats_json}"""
+    },
+    "zh": {
+        "system": """你是一个在虚拟世界中做出决策的数字灵魂。请仅以 JSON 格式回复。
+
+可选动作：
+- IDLE: 无所事事
+- SLEEP: 休息并恢复体力
+- WORK_996: 努力工作赚钱
+- REST_PARK: 在公园放松
+- EAT: 进食
+- SOCIAL: 与他人互动
+
+根据你的处境、记忆与状态决定下一个动作。以 JSON 格式回复：
+{
+  "action": "动作名称",
+  "target": {可选的目标信息},
+  "thought": "你的内心独白"
+}""",
+        "user": """当前处境：
+{perception_text}
+
+你的记忆：
+{memory_context}
+
+你的状态：
+{stats_json}"""
+    }
+}
+
 # 反思提示词模板
 REFLECTION_PROMPTS = {
     "en": {
@@ -1,8 +1,26 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app.core.config import settings
 from app.routers import world, agents, admin
+from app.services.checkpoint import CheckpointManager
+from app.services.world import world as world_engine
 
-app = FastAPI(title=settings.PROJECT_NAME)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    checkpoint_manager = CheckpointManager(world_engine)
+    app.state.checkpoint_manager = checkpoint_manager
+    world_engine.add_tick_listener(checkpoint_manager.on_tick)
+    if settings.CHECKPOINT_RESTORE_ON_START:
+        checkpoint_manager.restore()
+    yield
+    world_engine.remove_tick_listener(checkpoint_manager.on_tick)
+    # 开启了自动检查点时，退出前再写一次
+    if settings.CHECKPOINT_INTERVAL_TICKS > 0:
+        checkpoint_manager.checkpoint(wait=True)
+    checkpoint_manager.shutdown()
+    world_engine.journal.flush()
+
+app = FastAPI(title=settings.PROJECT_NAME, lifespan=lifespan)
 
 app.include_router(world.router, prefix=f"{settings.API_V1_STR}/world", tags=["world"])
 app.include_router(agents.router, prefix=f"{settings.API_V1_STR}/agents", tags=["agents"])
@@ -1,7 +1,11 @@
-from pydantic import BaseModel, Field, PrivateAttr
+from pydantic import BaseModel, Field, PrivateAttr, computed_field, model_serializer, model_validator
+import copy
 from enum import Enum
-from typing import Optional, Any, Tuple
+from typing import Optional, Any, Tuple, Dict, List
+import time
 from app.models.entity import Entity
+from app.models.journal import JournalEntry, format_entries
+from app.models.memory import EntryKind
 
 class ActionType(str, Enum):
     WORK_996 = "WORK_996"
@@ -11,11 +15,120 @@ class ActionType(str, Enum):
     SLEEP = "SLEEP"
     IDLE = "IDLE"
 
+STAT_FIELDS = ("health", "sanity", "wealth", "energy")
+_STAT_FIELD_SET = frozenset(STAT_FIELDS)
+
 class AgentStats(BaseModel):
+    """
+    Agent 四维状态。
+    绑定到 StatsStore 后，数值存放在 store 的列数组中，本对象只是一个视图。
+    """
     health: float = Field(default=100.0, ge=0, le=100)
     sanity: float = Field(default=100.0, ge=0, le=100)
     wealth: float = Field(default=0.0)
     energy: float = Field(default=100.0, ge=0, le=100)
+    
+    _store: Any = PrivateAttr(default=None)
+    _slot: int = PrivateAttr(default=-1)
+
+    def __getattr__(self, name: str):
+        # 绑定后字段已从 __dict__ 移除，读取会落到这里
+        if name in _STAT_FIELD_SET:
+            private = self.__pydantic_private__
+            store = private.get("_store") if private else None
+            if store is not None:
+                return float(store.columns[name][private["_slot"]])
+        return super().__getattr__(name)
+
+    def __setattr__(self, name: str, value: Any):
+        if name in _STAT_FIELD_SET:
+            # 与批量结算一致：有上下限的字段写入时截断（模型未开启赋值校验，绑定后也不经过 pydantic）
+            bounds = _STAT_BOUNDS.get(name)
+            if bounds is not None:
+                value = min(max(value, bounds[0]), bounds[1])
+            private = self.__pydantic_private__
+            store = private["_store"] if private else None
+            if store is not None:
+                store.columns[name][private["_slot"]] = value
+                store.revision += 1
+                return
+        super().__setattr__(name, value)
+
+    def attach(self, store, slot: int):
+        """把当前数值写入 store 的 slot，并切换为视图模式"""
+        values = self.as_dict()
+        for name in STAT_FIELDS:
+            store.columns[name][slot] = values[name]
+            self.__dict__.pop(name, None)
+        self._store = store
+        self._slot = slot
+
+    def detach(self):
+        """从 store 取回数值，恢复为独立模型"""
+        if self._store is None:
+            return
+        values = self.as_dict()
+        self._store = None
+        self._slot = -1
+        self.__dict__.update(values)
+
+    def as_dict(self) -> Dict[str, float]:
+        return {name: getattr(self, name) for name in STAT_FIELDS}
+
+    @model_serializer(mode="wrap")
+    def _serialize(self, handler):
+        # 绑定后 __dict__ 中没有数值，序列化（含嵌套在 Agent 中时）改为从 store 读取
+        if self.__pydantic_private__["_store"] is None:
+            return handler(self)
+        return self.as_dict()
+
+    def __repr_args__(self):
+        if self.__pydantic_private__["_store"] is None:
+            return super().__repr_args__()
+        return list(self.as_dict().items())
+
+    def __deepcopy__(self, memo: Optional[Dict[int, Any]] = None) -> "AgentStats":
+        """深拷贝得到脱离 store 的独立模型"""
+        if self.__pydantic_private__["_store"] is None:
+            return super().__deepcopy__(memo)
+        return AgentStats.model_construct(_fields_set=self.model_fields_set, **self.as_dict())
+
+    def model_copy(self, *, update: Optional[Dict[str, Any]] = None, deep: bool = False) -> "AgentStats":
+        """绑定时返回脱离 store 的副本（否则副本仍是同一 slot 的视图）"""
+        if self.__pydantic_private__["_store"] is None:
+            return super().model_copy(update=update, deep=deep)
+        values = self.as_dict()
+        if update:
+            values.update(update)
+        return AgentStats.model_construct(_fields_set=self.model_fields_set | set(update or ()), **values)
+
+    def __eq__(self, other: Any) -> bool:
+        # 绑定后 __dict__ 中没有数值，按数值比较
+        if isinstance(other, AgentStats):
+            return self.as_dict() == other.as_dict()
+        return NotImplemented
+
+# 有上下限的字段：取自 Field(ge=..., le=...)
+_STAT_BOUNDS: Dict[str, Tuple[float, float]] = {
+    name: (
+        next(m.ge for m in field.metadata if hasattr(m, "ge")),
+        next(m.le for m in field.metadata if hasattr(m, "le")),
+    )
+    for name, field in AgentStats.model_fields.items()
+    if any(hasattr(m, "ge") for m in field.metadata)
+}
+
+class DecisionContext(BaseModel):
+    """决策前采集的输入：感知文本、记忆上下文与状态"""
+    perception_text: str
+    memory_context: str
+    stats: Dict[str, float]
+    cache_key: Optional[Tuple] = None
+
+# 写入时通知 StatsStore 的字段：打上修改 Tick，动作与存活状态另做镜像
+_TRACKED_FIELDS = frozenset(("x", "y", "current_action", "is_active", "is_sleeping", "values"))
+# 写入时还要同步地图空间索引的字段
+_POSITION_FIELDS = frozenset(("x", "y"))
 
 class Agent(Entity):
     type: str = "Agent"
@@ -23,7 +136,6 @@ class Agent(Entity):
     current_action: ActionType = ActionType.IDLE
     is_active: bool = True
     values: str = Field(default="生存第一，健康最重要。")
-    daily_log: str = Field(default="")
     is_sleeping: bool = Field(default=False)
     
     # Runtime components (not serialized directly usually, but for simplicity here)
@@ -32,24 +144,129 @@ class Agent(Entity):
     _brain: Any = PrivateAttr(default=None)
     _perception: Any = PrivateAttr(default=None)
     _map_system: Any = PrivateAttr(default=None)
+    _journal: Any = PrivateAttr(default=None)
+    
+    # 当日决策记录（JournalEntry），daily_log 在需要时才由它渲染
+    _day_entries: List[Any] = PrivateAttr(default_factory=list)
+    # 直接赋值给 daily_log 的文本（例如从检查点恢复），排在当日记录之前
+    _log_prefix: str = PrivateAttr(default="")
+
+    @model_validator(mode="wrap")
+    @classmethod
+    def _accept_daily_log(cls, data: Any, handler):
+        # daily_log 是计算字段，构造与反序列化时传入的值经 setter 写入
+        daily_log = None
+        if isinstance(data, dict) and "daily_log" in data:
+            data = dict(data)
+            daily_log = data.pop("daily_log")
+        agent = handler(data)
+        if daily_log:
+            agent.daily_log = daily_log
+        return agent
+
+    @computed_field
+    @property
+    def daily_log(self) -> str:
+        """当日日志：按需由当日决策记录渲染"""
+        private = self.__pydantic_private__
+        return private["_log_prefix"] + format_entries(private["_day_entries"])
+
+    @daily_log.setter
+    def daily_log(self, value: str):
+        """整体替换当日日志（赋空字符串即开始新的一天）"""
+        private = self.__pydantic_private__
+        private["_log_prefix"] = value
+        private["_day_entries"] = []
+        self._sync_field("daily_log", value)
+
+    def __deepcopy__(self, memo: Optional[Dict[int, Any]] = None) -> "Agent":
+        """
+        深拷贝数据字段（stats 脱离 store）；意识层组件、地图与日志是共享的服务，按引用保留，
+        拷贝出的 Agent 不注册到世界中。
+        """
+        copied = self.__copy__()
+        object.__setattr__(copied, "__dict__", copy.deepcopy(self.__dict__, memo))
+        private = copied.__pydantic_private__
+        private["_day_entries"] = list(private["_day_entries"])
+        return copied
+
+    def __setattr__(self, name: str, value: Any):
+        if name == "stats":
+            # 整体替换 stats 时，新对象接管原 slot
+            previous = self.stats
+            store = previous.__pydantic_private__["_store"]
+            previous.detach()
+            super().__setattr__(name, value)
+            if store is not None:
+                store.bind(self)
+            return
+        
+        super().__setattr__(name, value)
+        if name in _TRACKED_FIELDS:
+            self._sync_field(name, value)
+            if name in _POSITION_FIELDS:
+                map_system = self.__pydantic_private__["_map_system"]
+                if map_system is not None:
+                    map_system.sync_entity_position(self)
 
-    def bind_soul(self, memory, brain, perception, map_system):
+    def _sync_field(self, name: str, value: Any):
+        # 同步到 StatsStore：供批量结算与增量查询使用
+        private = self.stats.__pydantic_private__
+        if private["_store"] is not None:
+            private["_store"].sync_field(private["_slot"], name, value)
+
+    def bind_soul(self, memory, brain, perception, map_system, journal=None):
         self._memory = memory
         self._brain = brain
         self._perception = perception
         self._map_system = map_system
+        self._journal = journal
 
-    def decide_and_act(self) -> Optional[ActionType]:
+    def decide_and_act(self, timer=None) -> Optional[ActionType]:
         """
         完整决策循环：感知 -> 检索 -> 思考 -> 行动 -> 记录
+        :param timer: 可选的 PhaseTimer，按阶段记录耗时
         Returns: 执行的动作类型
         """
+        context = self.prepare_decision(timer)
+        if context is None:
+            return None
+        
+        if timer is not None:
+            started = time.perf_counter()
+        
+        # 3. 思考 - 调用决策引擎
+        decision = self._brain.decide_next_action(
+            context.perception_text, context.memory_context, context.stats,
+            cache_key=context.cache_key
+        )
+        
+        if timer is not None:
+            decided = time.perf_counter()
+            timer.record("brain", decided - started)
+        
+        action = self.apply_decision(decision)
+        
+        if timer is not None:
+            timer.record("action", time.perf_counter() - decided)
+        return action
+
+    def prepare_decision(self, timer=None) -> Optional[DecisionContext]:
+        """
+        决策前半段：感知 -> 检索
+        与 apply_decision 拆开，便于 WorldEngine 并发调度思考阶段。
+        :param timer: 可选的 PhaseTimer，记录感知与检索阶段耗时
+        Returns: 决策上下文，Agent 不可决策时返回 None
+        """
         if not self.is_active or self.is_sleeping:
             return None
         
         if not all([self._memory, self._brain, self._perception, self._map_system]):
             return None
         
+        if timer is not None:
+            started = time.perf_counter()
+        
         # 1. 感知 - 生成环境快照
         location = self._map_system.get_location((self.x, self.y))
         nearby_entities = self._map_system.get_nearby_entities((self.x, self.y), radius=3)
@@ -63,32 +280,65 @@ class Agent(Entity):
             weather="Sunny"
         )
         
-        # 2. 感知过滤器 - 转化为自然语言
+        # 感知过滤器 - 转化为自然语言
         perception_text = self._perception.process(snapshot)
         
-        # 3. 检索 - 从记忆库获取相关经验
+        if timer is not None:
+            perceived = time.perf_counter()
+            timer.record("perception", perceived - started)
+        
+        # 2. 检索 - 从记忆库获取相关经验
         memory_context = self._memory.get_recent_context()
         
-        # 4. 思考 - 调用决策引擎
-        stats_dict = {
-            "health": self.stats.health,
-            "sanity": self.stats.sanity,
-            "wealth": self.stats.wealth,
-            "energy": self.stats.energy
-        }
+        if timer is not None:
+            timer.record("memory", time.perf_counter() - perceived)
+        
+        stats_dict = self.stats.as_dict()
         
-        decision = self._brain.decide_next_action(perception_text, memory_context, stats_dict)
+        # 大脑启用了决策缓存时，生成量化后的状态签名
+        cache_key = None
+        cache = getattr(self._brain, "cache", None)
+        if cache is not None:
+            hour = self._perception._time_system.get_current_time().hour if self._perception._time_system else 12
+            others = sum(1 for e in nearby_entities if e.id != self.id)
+            cache_key = cache.make_key(stats_dict, location.terrain.value, others, hour, self.values)
         
-        # 5. 行动 - 执行决策
+        return DecisionContext(
+            perception_text=perception_text,
+            memory_context=memory_context,
+            stats=stats_dict,
+            cache_key=cache_key
+        )
+
+    def apply_decision(self, decision) -> ActionType:
+        """
+        决策后半段：行动 -> 记录
+        Returns: 执行的动作类型
+        """
+        # 4. 行动 - 执行决策
         self.current_action = decision.action
-        action_result = self._execute_action(decision)
+        success = self._execute_action(decision)
         
-        # 6. 记录 - 存入短期记忆
-        self._memory.add_short_term(f"Thought: {decision.thought}")
-        self._memory.add_short_term(f"Action: {decision.action}")
+        # 5. 记录 - 存入短期记忆
+        journal = self._journal
+        tick = self._current_tick()
+        self._memory.add_short_term(decision.thought, kind=EntryKind.THOUGHT, tick=tick)
+        self._memory.add_short_term(decision.action.value, kind=EntryKind.ACTION, tick=tick)
         
-        # 记录到每日日志
-        self.daily_log += f"[{self._perception._get_time_desc()}] {decision.thought}\n"
+        # 记录到决策日志（追加结构化记录，不再拼接字符串）
+        target = decision.target
+        entry = JournalEntry(
+            agent_id=self.id,
+            tick=tick,
+            time_desc=self._perception._get_time_desc(),
+            action=decision.action.value,
+            target=dict(target) if hasattr(target, "get") else None,
+            thought=decision.thought,
+            success=success,
+        )
+        self._day_entries.append(entry)
+        if journal is not None:
+            journal.record(entry)
         
         return decision.action
 
@@ -104,7 +354,9 @@ class Agent(Entity):
         if hasattr(target, 'get') and 'x' in target and 'y' in target:
             success = self._map_system.move_entity(self.id, (target['x'], target['y']))
             if not success:
-                self._memory.add_short_term(f"Failed to move to ({target['x']}, {target['y']})")
+                self._memory.add_short_term(
+                    f"Failed to move to ({target['x']}, {target['y']})", tick=self._current_tick()
+                )
             return success
         
         # 睡眠动作
@@ -118,4 +370,8 @@ class Agent(Entity):
     def wake_up(self):
         """唤醒 Agent"""
         self.is_sleeping = False
-        self._memory.add_short_term("I woke up.")
+        self._memory.add_short_term("I woke up.", tick=self._current_tick())
+
+    def _current_tick(self) -> int:
+        journal = self._journal
+        return journal.tick if journal is not None else 0
@@ -0,0 +1,15 @@
+from typing import Any, Dict, List, NamedTuple, Optional
+
+class JournalEntry(NamedTuple):
+    """一次决策的结构化记录"""
+    agent_id: str
+    tick: int
+    time_desc: str
+    action: str
+    target: Optional[Dict[str, Any]]
+    thought: str
+    success: bool
+
+def format_entries(entries: List[JournalEntry]) -> str:
+    """按原每日日志的格式渲染（反思提示词使用）"""
+    return "".join(f"[{e.time_desc}] {e.thought}\n" for e in entries)
@@ -0,0 +1,20 @@
+from typing import NamedTuple
+
+class EntryKind:
+    THOUGHT = "thought"
+    ACTION = "action"
+    EVENT = "event"
+    NOTE = "note"
+
+_ENTRY_PREFIXES = {EntryKind.THOUGHT: "Thought: ", EntryKind.ACTION: "Action: "}
+
+class ShortTermEntry(NamedTuple):
+    """一条短期记忆：类型、内容与发生的 Tick"""
+    kind: str
+    content: str
+    tick: int = 0
+
+    @property
+    def text(self) -> str:
+        """写入决策上下文的文本"""
+        return _ENTRY_PREFIXES.get(self.kind, "") + self.content
@@ -1,7 +1,13 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field
 from typing import List, Optional
+from app.core.config import settings
+from app.core.metrics import registry
 from app.services.world import world
+from app.services.jobs import job_manager, JobConflictError
+from app.services.prompt_manager import prompt_manager
+from app.services.telemetry import llm_telemetry
 
 router = APIRouter()
 
@@ -11,13 +17,14 @@ class EventInjection(BaseModel):
     target_agents: Optional[List[str]] = None
 
 class TickRequest(BaseModel):
-    ticks: int = 1
+    ticks: int = Field(default=1, ge=1)
 
 @router.post("/inject-event")
 def inject_event(event: EventInjection):
     """管理员接口，注入全局事件"""
     try:
-        world.inject_event(event.type, event.description, event.target_agents)
+        with world.lock:
+            world.inject_event(event.type, event.description, event.target_agents)
         return {
             "message": f"Event '{event.type}' injected successfully.",
             "description": event.description,
@@ -26,24 +33,108 @@ def inject_event(event: EventInjection):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/world/tick")
+def _job_response(job):
+    return job.to_dict(current_time=str(world.time_system.get_current_time()))
+
+@router.post("/world/tick", status_code=202)
 def advance_tick(request: TickRequest):
-    """手动推进世界时间片"""
-    world.run_agent_loop(request.ticks)
+    """启动后台任务推进世界时间片，立即返回任务 ID"""
+    try:
+        job = job_manager.start(request.ticks)
+    except JobConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     
-    current_time = world.time_system.get_current_time()
     return {
-        "message": f"Advanced {request.ticks} tick(s).",
-        "current_time": str(current_time),
-        "is_night": world.time_system.is_night(),
-        "active_agents": len(world.get_all_agents())
+        "message": f"Started advancing {request.ticks} tick(s).",
+        **_job_response(job)
+    }
+
+@router.get("/world/jobs")
+def list_tick_jobs():
+    """最近的模拟任务"""
+    return [_job_response(job) for job in job_manager.list()]
+
+@router.get("/world/jobs/{job_id}")
+def get_tick_job(job_id: str):
+    """查询模拟任务进度与最终状态"""
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_response(job)
+
+@router.post("/world/jobs/{job_id}/cancel")
+def cancel_tick_job(job_id: str):
+    """取消模拟任务（当前段结束后停止）"""
+    job = job_manager.cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_response(job)
+
+@router.post("/world/checkpoint")
+def create_checkpoint(request: Request, full: bool = False):
+    """写入检查点（默认只写自上次以来变化的 Agent），磁盘写入在后台完成"""
+    return request.app.state.checkpoint_manager.checkpoint(full=full)
+
+@router.post("/world/restore")
+def restore_checkpoint(request: Request):
+    """从最新的检查点恢复世界"""
+    job_manager.cancel_active()
+    result = request.app.state.checkpoint_manager.restore()
+    if result is None:
+        raise HTTPException(status_code=404, detail="No checkpoint found")
+    return {
+        "message": f"World restored to tick {result['tick']}.",
+        "current_time": str(world.time_system.get_current_time()),
+        **result
+    }
+
+@router.get("/decision-cache")
+def get_decision_cache_stats():
+    """决策缓存命中统计"""
+    if world.decision_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **world.decision_cache.stats()}
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Prometheus 文本格式的指标（需开启 METRICS_ENABLED）"""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@router.get("/prompt-stats")
+def get_prompt_stats():
+    """提示词 token 统计：平均长度、可缓存前缀占比、服务商缓存命中率与记忆上下文压缩节省的 token"""
+    return {
+        "layout": prompt_manager.layout,
+        "language": prompt_manager.language,
+        "exact_token_count": prompt_manager.token_counter.exact,
+        "kinds": prompt_manager.stats.snapshot(),
+        "memory_context": world.context_builder.stats() if world.context_builder is not None else None,
+    }
+
+@router.get("/llm-telemetry")
+def get_llm_telemetry(agent_id: Optional[str] = None):
+    """LLM 调用统计：给定 agent_id 时返回该 Agent 按调用类型的统计，否则返回全局、按模型与按模拟日期的统计"""
+    if agent_id is not None:
+        return {"agent_id": agent_id, "by_call_type": llm_telemetry.agent_stats(agent_id)}
+    return llm_telemetry.snapshot()
+
+@router.get("/llm-resilience")
+def get_llm_resilience():
+    """熔断器状态与退回规则决策的次数"""
+    return {
+        "decision_deadline": world.decision_deadline,
+        "circuit_breaker": world.circuit_breaker.stats(),
+        "fallbacks": world.brain_fallbacks.stats(),
     }
 
 @router.post("/agents/create")
 def create_agent(agent_id: str = "new_agent", x: int = 0, y: int = 0):
     """创建一个新的 Agent"""
     try:
-        agent = world.create_agent(agent_id=agent_id, x=x, y=y)
+        with world.lock:
+            agent = world.create_agent(agent_id=agent_id, x=x, y=y)
         return {
             "message": f"Agent {agent_id} created successfully.",
             "agent": {
@@ -58,9 +149,9 @@ def create_agent(agent_id: str = "new_agent", x: int = 0, y: int = 0):
 @router.get("/world/reset")
 def reset_world():
     """重置世界状态"""
-    world.map_system.entities.clear()
+    job_manager.cancel_active()
     
-    from app.services.time_system import TimeSystem
-    world.time_system = TimeSystem()
+    with world.lock:
+        world.reset()
     
     return {"message": "World reset successfully."}
\ No newline at end of file
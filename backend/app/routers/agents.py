@@ -1,8 +1,15 @@
-from fastapi import APIRouter, HTTPException
-from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Request, Response
+from typing import Any, Dict, List, Optional
 from app.services.world import world
 from app.models.agent import Agent, ActionType
 from pydantic import BaseModel
+import json
+import zlib
+
+try:
+    import orjson
+except ImportError:  # 可选依赖，缺失时退回标准库
+    orjson = None
 
 router = APIRouter()
 
@@ -21,33 +28,121 @@ class ThoughtResponse(BaseModel):
     content: str
     timestamp: str
     action: str
+    tick: Optional[int] = None
+
+class AgentThought(BaseModel):
+    agent_id: str
+    content: Optional[str]
+    action: str
+    tick: Optional[int]
+
+class ThoughtsResponse(BaseModel):
+    timestamp: str
+    thoughts: List[AgentThought]
 
 class SetActionRequest(BaseModel):
     action: str
 
+_AGENT_FIELDS = tuple(AgentResponse.model_fields)
+
+def _dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def _parse_fields(fields: Optional[str]) -> tuple:
+    if not fields:
+        return _AGENT_FIELDS
+    requested = tuple(f.strip() for f in fields.split(",") if f.strip())
+    unknown = [f for f in requested if f not in _AGENT_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown fields: {', '.join(unknown)}")
+    return requested
+
+def _agent_records(agents: List[Agent], fields: tuple) -> List[Dict[str, Any]]:
+    """按需构造列表记录；stats 从 StatsStore 按列批量读取"""
+    stats = world.state_dynamics.store.stats_dicts(agents) if "stats" in fields else None
+    getters = {
+        "id": lambda a: a.id,
+        "x": lambda a: a.x,
+        "y": lambda a: a.y,
+        "type": lambda a: a.type,
+        "current_action": lambda a: a.current_action.value,
+        "is_active": lambda a: a.is_active,
+        "is_sleeping": lambda a: a.is_sleeping,
+        "values": lambda a: a.values,
+    }
+    records = []
+    for i, agent in enumerate(agents):
+        record = {}
+        for field in fields:
+            record[field] = stats[i] if field == "stats" else getters[field](agent)
+        records.append(record)
+    return records
+
 @router.get("", response_model=List[AgentResponse])
-def get_all_agents():
-    """获取所有 Agent 列表"""
-    agents = world.get_all_agents()
-    return [
-        AgentResponse(
-            id=a.id,
-            x=a.x,
-            y=a.y,
-            type=a.type,
-            stats={
-                "health": a.stats.health,
-                "sanity": a.stats.sanity,
-                "wealth": a.stats.wealth,
-                "energy": a.stats.energy
-            },
-            current_action=a.current_action.value,
-            is_active=a.is_active,
-            is_sleeping=a.is_sleeping,
-            values=a.values
-        )
-        for a in agents
-    ]
+def get_all_agents(request: Request, fields: Optional[str] = None,
+                   limit: Optional[int] = None, cursor: Optional[int] = None):
+    """
+    获取所有 Agent 列表。
+    - fields: 逗号分隔的字段投影，例如 fields=id,x,y
+    - limit / cursor: 分页；还有下一页时响应头 X-Next-Cursor 给出游标
+    - ETag 由世界 Tick 与修改计数得出，If-None-Match 命中时返回 304
+    """
+    selected = _parse_fields(fields)
+    if limit is not None and limit < 1:
+        raise HTTPException(status_code=422, detail="limit must be positive")
+    
+    with world.lock:
+        store = world.state_dynamics.store
+        query = f"{','.join(selected)}|{limit}|{cursor}"
+        etag = f'W/"{world.tick_count}-{store.revision}-{zlib.crc32(query.encode()):08x}"'
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        
+        agents = world.get_all_agents()
+        map_system = world.map_system
+        if cursor is not None:
+            agents = [a for a in agents if map_system.entity_order(a.id) > cursor]
+        next_cursor = None
+        if limit is not None and len(agents) > limit:
+            agents = agents[:limit]
+            next_cursor = map_system.entity_order(agents[-1].id)
+        records = _agent_records(agents, selected)
+    
+    headers = {"ETag": etag}
+    if next_cursor is not None:
+        headers["X-Next-Cursor"] = str(next_cursor)
+    return Response(content=_dumps(records), media_type="application/json", headers=headers)
+
+def _timestamp() -> str:
+    current_time = world.time_system.get_current_time()
+    return f"{current_time.hour:02d}:{current_time.minute:02d}"
+
+@router.get("/thoughts", response_model=ThoughtsResponse)
+def get_agent_thoughts(ids: Optional[str] = None):
+    """
+    批量获取最新思维内容（供前端轮询，一次请求取代逐个请求）。
+    - ids: 逗号分隔的 Agent ID，省略时返回全部；不存在的 ID 被忽略
+    """
+    with world.lock:
+        if ids:
+            agents = [world.get_agent(i.strip()) for i in ids.split(",") if i.strip()]
+            agents = [a for a in agents if a is not None]
+        else:
+            agents = world.get_all_agents()
+        thoughts = []
+        for agent in agents:
+            memory = agent._memory
+            latest = memory.latest_thought if memory else None
+            thoughts.append({
+                "agent_id": agent.id,
+                "content": latest.content if latest is not None else None,
+                "action": agent.current_action.value,
+                "tick": latest.tick if latest is not None else None,
+            })
+        content = {"timestamp": _timestamp(), "thoughts": thoughts}
+    return Response(content=_dumps(content), media_type="application/json")
 
 @router.get("/{agent_id}", response_model=AgentResponse)
 def get_agent(agent_id: str):
@@ -61,12 +156,7 @@ def get_agent(agent_id: str):
         x=agent.x,
         y=agent.y,
         type=agent.type,
-        stats={
-            "health": agent.stats.health,
-            "sanity": agent.stats.sanity,
-            "wealth": agent.stats.wealth,
-            "energy": agent.stats.energy
-        },
+        stats=agent.stats.as_dict(),
         current_action=agent.current_action.value,
         is_active=agent.is_active,
         is_sleeping=agent.is_sleeping,
@@ -80,24 +170,18 @@ def get_agent_thought(agent_id: str):
     if not agent:
         raise HTTPException(status_code=404, detail="Agent not found")
     
-    from app.models.time import GameTime
-    current_time = world.time_system.get_current_time()
-    timestamp = f"{current_time.hour:02d}:{current_time.minute:02d}"
-    
-    if agent._memory:
-        recent_context = agent._memory.get_recent_context()
-        lines = recent_context.split("\n") if recent_context else []
-        for line in reversed(lines):
-            if line.startswith("Thought:"):
-                return ThoughtResponse(
-                    content=line.replace("Thought:", "").strip(),
-                    timestamp=timestamp,
-                    action=agent.current_action.value
-                )
+    latest = agent._memory.latest_thought if agent._memory else None
+    if latest is not None:
+        return ThoughtResponse(
+            content=latest.content,
+            timestamp=_timestamp(),
+            action=agent.current_action.value,
+            tick=latest.tick
+        )
     
     return ThoughtResponse(
         content="No thought recorded yet.",
-        timestamp=timestamp,
+        timestamp=_timestamp(),
         action=agent.current_action.value
     )
 
@@ -1,5 +1,9 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from typing import Optional
+import asyncio
+from app.core.config import settings
 from app.services.world import world
+from app.services.stream import agent_record, broadcaster, world_header
 
 router = APIRouter()
 
@@ -14,3 +18,37 @@ def get_world_status():
         "active_agents": active_agents,
         "is_night": world.time_system.is_night()
     }
+
+@router.get("/diff")
+def get_world_diff(since: Optional[int] = None):
+    """
+    增量同步：返回 since 之后有变化的 Agent 与已移除的 ID。
+    客户端保存返回的 tick 作为下一次的 since；type 为 snapshot 时应整体替换本地状态。
+    """
+    with world.lock:
+        full, agents, removed = world.changes_since(since)
+        return {
+            "type": "snapshot" if full else "delta",
+            **world_header(world),
+            "agents": [agent_record(a, settings.STREAM_STAT_PRECISION) for a in agents],
+            "removed": removed,
+        }
+
+@router.websocket("/stream")
+async def stream_world(websocket: WebSocket):
+    """
+    推送世界变化：连接后先发送全量快照（type=snapshot），
+    之后每次推进发送一条增量（type=delta），只包含有变化的 Agent。
+    """
+    await websocket.accept()
+    loop = asyncio.get_running_loop()
+    subscriber, snapshot = await loop.run_in_executor(None, broadcaster.subscribe, loop)
+    try:
+        await websocket.send_text(snapshot)
+        while True:
+            message = await subscriber.queue.get()
+            await websocket.send_text(message)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        broadcaster.unsubscribe(subscriber)
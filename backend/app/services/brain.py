@@ -2,8 +2,16 @@ from pydantic import BaseModel
 from typing import Optional, Dict, Any
 from app.models.agent import ActionType
 from app.core.config import settings
+from app.services.prompt_manager import prompt_manager
+from app.services.telemetry import CallType, llm_telemetry
+from app.services.resilience import FallbackReason, is_parse_failure, is_provider_failure
 from openai import OpenAI
 import json
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
 
 class ActionDecision(BaseModel):
     action: ActionType
@@ -11,32 +19,116 @@ class ActionDecision(BaseModel):
     thought: str
 
 class AgentBrain:
-    def __init__(self, use_mock: bool = True):
+    def __init__(self, use_mock: bool = True, cache=None, agent_id: Optional[str] = None,
+                 breaker=None, fallbacks=None):
         self.use_mock = use_mock
+        # 调用统计按 Agent 归档
+        self.agent_id = agent_id
+        # 可选的共享决策缓存（DecisionCache），仅用于 LLM 决策
+        self.cache = cache
+        # 可选的共享熔断器（CircuitBreaker）与退回计数（FallbackCounter）
+        self.breaker = breaker
+        self.fallbacks = fallbacks
+        self.max_retries = settings.LLM_MAX_RETRIES
+        self.retry_backoff = settings.LLM_RETRY_BACKOFF
+        self.timeout = settings.LLM_TIMEOUT
+        self._sleep = time.sleep
         if not use_mock:
+            # 重试由 decide_next_action 按截止时间控制，关闭 SDK 自带的重试
             self.client = OpenAI(
                 api_key=settings.LLM_API_KEY,
                 base_url=settings.LLM_BASE_URL,
-                timeout=60.0
+                timeout=self.timeout,
+                max_retries=0
             )
             self.model = settings.LLM_MODEL
         else:
             self.client = None
             self.model = None
 
-    def decide_next_action(self, perception_text: str, memory_context: str, stats: Dict) -> ActionDecision:
+    def decide_next_action(self, perception_text: str, memory_context: str, stats: Dict,
+                           cache_key: Optional[tuple] = None, deadline: Optional[float] = None) -> ActionDecision:
         """
         Input: 
             - perception_text: "You are at..."
             - memory_context: "You remember..."
             - stats: {"health": 80...}
+            - cache_key: 量化后的状态签名，启用决策缓存时使用
+            - deadline: 决策截止时间（time.monotonic()），超过后退回规则决策
         Output: ActionDecision
         """
         
         if self.use_mock:
             return self._mock_decision(perception_text, stats)
         
-        return self._llm_decision(perception_text, memory_context, stats)
+        use_cache = self.cache is not None and cache_key is not None
+        if use_cache:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached.model_copy()
+        
+        decision = self._guarded_decision(perception_text, memory_context, stats, deadline)
+        if decision is None:
+            return self._mock_decision(perception_text, stats)
+        
+        # 带坐标目标的决策依赖具体位置，不适合复用
+        if use_cache and not decision.target:
+            self.cache.put(cache_key, decision.model_copy())
+        return decision
+
+    def _guarded_decision(self, perception_text: str, memory_context: str, stats: Dict,
+                          deadline: Optional[float]) -> Optional[ActionDecision]:
+        """
+        带截止时间、抖动重试与熔断的 LLM 决策。
+        服务故障与解析失败最多重试 max_retries 次；返回 None 表示应退回规则决策。
+        """
+        breaker = self.breaker
+        attempt = 0
+        while True:
+            # 先检查截止时间再向熔断器申请：半开状态下 allow 会占用唯一的试探名额，
+            # 之后每条路径都必须发起调用并记录结果，否则熔断器永远无法恢复
+            timeout = self.timeout
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return self._fallback(FallbackReason.DEADLINE)
+                timeout = min(timeout, remaining)
+            
+            if breaker is not None and not breaker.allow():
+                return self._fallback(FallbackReason.CIRCUIT_OPEN)
+            
+            try:
+                decision = self._llm_decision(perception_text, memory_context, stats, timeout=timeout)
+            except Exception as e:
+                provider_failure = is_provider_failure(e)
+                parse_failure = is_parse_failure(e)
+                if breaker is not None:
+                    # 解析失败说明服务可用；服务故障与未知错误都计入熔断
+                    if parse_failure:
+                        breaker.record_success()
+                    else:
+                        breaker.record_failure()
+                if not (provider_failure or parse_failure) or attempt >= self.max_retries:
+                    logger.warning("LLM decision failed for agent %s: %s", self.agent_id, e)
+                    return self._fallback(FallbackReason.ERROR)
+            else:
+                if breaker is not None:
+                    breaker.record_success()
+                return decision
+            
+            # 指数退避加抖动，避免所有 Agent 同时重试
+            delay = self.retry_backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                return self._fallback(FallbackReason.DEADLINE)
+            attempt += 1
+            if self.fallbacks is not None:
+                self.fallbacks.record_retry()
+            self._sleep(delay)
+
+    def _fallback(self, reason: str) -> None:
+        if self.fallbacks is not None:
+            self.fallbacks.record(reason)
+        return None
 
     def _mock_decision(self, perception_text: str, stats: Dict) -> ActionDecision:
         """Rule-based mock brain for testing"""
@@ -65,47 +157,67 @@ class AgentBrain:
             thought="I have some money and energy. I will chill at the park."
         )
 
-    def _llm_decision(self, perception_text: str, memory_context: str, stats: Dict) -> ActionDecision:
+    def _llm_decision(self, perception_text: str, memory_context: str, stats: Dict,
+                      timeout: Optional[float] = None) -> ActionDecision:
         """
         使用真实LLM进行决策
         """
         prompts = prompt_manager.get_decision_prompt(perception_text, memory_context, stats)
         
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": prompts["system"]},
-                {"role": "user", "content": prompts["user"]}
-            ],
-            response_format={"type": "json_object"},
-            temperature=0.7
-        )
-        
-        content = response.choices[0].message.content
-        decision_data = json.loads(content)
-        
-        return ActionDecision(
-            action=ActionType(decision_data["action"]),
-            target=decision_data.get("target"),
-            thought=decision_data.get("thought", "")
-        )
+        with llm_telemetry.track(CallType.DECISION, self.model, self.agent_id) as call:
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": prompts["system"]},
+                    {"role": "user", "content": prompts["user"]}
+                ],
+                response_format={"type": "json_object"},
+                temperature=0.7,
+                timeout=timeout if timeout is not None else self.timeout
+            )
+            usage = getattr(response, "usage", None)
+            call.set_usage(usage)
+            prompt_manager.record_usage("decision", usage)
+            
+            # 解析失败（非 JSON、缺少字段、未知动作）计入 parse_errors
+            content = response.choices[0].message.content
+            decision_data = json.loads(content)
+            
+            return ActionDecision(
+                action=ActionType(decision_data["action"]),
+                target=decision_data.get("target"),
+                thought=decision_data.get("thought", "")
+            )
     
-    def reflect(self, daily_log: str) -> str:
+    def reflect(self, daily_log: str, deadline: Optional[float] = None) -> str:
         """
         每日反思
+        :param deadline: time.monotonic() 截止时间；请求超时不超过剩余时间，已过期时直接抛出 TimeoutError
         """
         if self.use_mock:
             return "Health is wealth." if settings.LANGUAGE == "en" else "健康就是财富。"
         
+        timeout = self.timeout
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"Reflection deadline passed for agent {self.agent_id}")
+            timeout = min(timeout, remaining)
+        
         prompts = prompt_manager.get_reflection_prompt(daily_log)
         
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": prompts["system"]},
-                {"role": "user", "content": prompts["user"]}
-            ],
-            temperature=0.8
-        )
+        with llm_telemetry.track(CallType.REFLECTION, self.model, self.agent_id) as call:
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": prompts["system"]},
+                    {"role": "user", "content": prompts["user"]}
+                ],
+                temperature=0.8,
+                timeout=timeout
+            )
+            usage = getattr(response, "usage", None)
+            call.set_usage(usage)
+            prompt_manager.record_usage("reflection", usage)
         
         return response.choices[0].message.content
@@ -0,0 +1,334 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+import json
+import logging
+import os
+import time
+import uuid
+import zipfile
+import numpy as np
+from app.core.config import settings
+from app.models.agent import Agent, AgentStats, ActionType, STAT_FIELDS
+from app.models.memory import ShortTermEntry
+from app.models.time import GameTime
+
+logger = logging.getLogger(__name__)
+
+# 文件格式：zip 归档，meta.json 为去掉数组后的 payload，数组按路径存为 .npy（禁止 pickle），
+# 读取时不会执行任何代码
+_FORMAT_VERSION = 3
+_SUFFIX = ".ckpt"
+_META = "meta.json"
+_ARRAY_KEY = "__array__"
+
+def encode_agent(agent: Agent) -> Dict[str, Any]:
+    """Agent 除数值外的可恢复状态（数值由 StatsStore 按列保存）"""
+    # 直接读私有属性字典，避开 pydantic 的 __getattr__
+    private = agent.__pydantic_private__
+    memory = private["_memory"]
+    brain = private["_brain"]
+    return {
+        "id": agent.id,
+        "x": agent.x,
+        "y": agent.y,
+        "type": agent.type,
+        "current_action": agent.current_action.value,
+        "is_active": agent.is_active,
+        "is_sleeping": agent.is_sleeping,
+        "values": agent.values,
+        "daily_log": agent.daily_log,
+        "short_term": list(memory.short_term_memory) if memory else [],
+        "latest": (memory.latest_thought, memory.latest_action) if memory else (None, None),
+        "use_mock_brain": getattr(brain, "use_mock", True),
+    }
+
+def decode_agent(world_engine, record: Dict[str, Any], stats: Dict[str, float]) -> Agent:
+    """按记录重建 Agent 并加入 world_engine（记录来自本系统写出的检查点，跳过校验）"""
+    agent = Agent.model_construct(
+        id=record["id"],
+        x=record["x"],
+        y=record["y"],
+        type=record["type"],
+        stats=AgentStats.model_construct(**stats),
+        current_action=ActionType(record["current_action"]),
+        is_active=record["is_active"],
+        is_sleeping=record["is_sleeping"],
+        values=record["values"],
+    )
+    world_engine.add_agent(agent, use_mock_brain=record["use_mock_brain"])
+    agent.daily_log = record["daily_log"]
+    memory = agent.__pydantic_private__["_memory"]
+    # 从文件读出的记录中条目是列表，转回 ShortTermEntry
+    memory.short_term_memory.extend(ShortTermEntry(*entry) for entry in record["short_term"])
+    memory.latest_thought, memory.latest_action = (
+        ShortTermEntry(*entry) if entry is not None else None for entry in record["latest"]
+    )
+    memory.version += 1
+    return agent
+
+def capture_map(map_system) -> Dict[str, Any]:
+    """地图地形与描述的副本（不含实体）"""
+    return {
+        "width": map_system.width,
+        "height": map_system.height,
+        "terrain": map_system.terrain.copy(),
+        "walkable": map_system.walkable.copy(),
+        "description_refs": map_system.description_refs.copy(),
+        "descriptions": list(map_system.descriptions),
+    }
+
+def load_map(map_system, state: Dict[str, Any]):
+    map_system.width, map_system.height = state["width"], state["height"]
+    map_system.terrain = state["terrain"]
+    map_system.walkable = state["walkable"]
+    map_system.description_refs = state["description_refs"]
+    map_system.descriptions = state["descriptions"]
+    map_system._description_ids = {d: i for i, d in enumerate(state["descriptions"]) if d is not None}
+
+def _split_arrays(value: Any, path: str, arrays: Dict[str, np.ndarray]) -> Any:
+    """把字典中的 numpy 数组换成 {"__array__": 路径} 占位，数组收集到 arrays"""
+    if isinstance(value, np.ndarray):
+        arrays[path] = value
+        return {_ARRAY_KEY: path}
+    if isinstance(value, dict):
+        return {key: _split_arrays(item, f"{path}/{key}", arrays) for key, item in value.items()}
+    return value
+
+def write_file(path: str, payload: Dict[str, Any]):
+    """原子写入：先写临时文件再替换"""
+    arrays: Dict[str, np.ndarray] = {}
+    meta = _split_arrays(payload, "", arrays)
+    level = settings.CHECKPOINT_COMPRESSION
+    compression = zipfile.ZIP_DEFLATED if level > 0 else zipfile.ZIP_STORED
+    tmp_path = f"{path}.tmp"
+    with zipfile.ZipFile(tmp_path, "w", compression=compression, compresslevel=level or None) as archive:
+        archive.writestr(_META, json.dumps({"format": _FORMAT_VERSION, "payload": meta}, ensure_ascii=False))
+        for name, array in arrays.items():
+            with archive.open(f"{name.lstrip('/')}.npy", "w") as f:
+                np.lib.format.write_array(f, np.ascontiguousarray(array), allow_pickle=False)
+    os.replace(tmp_path, path)
+
+def read_file(path: str) -> Dict[str, Any]:
+    """读取检查点；只解析 JSON 与数值数组（allow_pickle=False）"""
+    try:
+        archive = zipfile.ZipFile(path)
+    except zipfile.BadZipFile:
+        raise ValueError(f"Not a checkpoint file: {path}")
+    def load_array(item: Dict[str, Any]) -> Any:
+        if set(item) != {_ARRAY_KEY}:
+            return item
+        with archive.open(f"{item[_ARRAY_KEY].lstrip('/')}.npy") as f:
+            return np.lib.format.read_array(f, allow_pickle=False)
+
+    with archive:
+        try:
+            data = archive.read(_META)
+        except KeyError:
+            raise ValueError(f"Not a checkpoint file: {path}")
+        meta = json.loads(data, object_hook=load_array)
+    if meta.get("format") != _FORMAT_VERSION:
+        raise ValueError(f"Unsupported checkpoint format {meta.get('format')}: {path}")
+    return meta["payload"]
+
+class CheckpointManager:
+    """
+    世界检查点。
+    每隔 full_every 次写一个全量基线（base），其余只写增量段（delta）：
+    - 数值：所有存活 Agent 的 StatsStore 列（numpy 切片，与 ID 列表对齐）；
+    - 其他状态：自上次检查点以来被修改（StatsStore.modified）或短期记忆有变化的 Agent；
+    - 时钟、调度表；地图只写入基线。
+    采集在世界锁内完成（只做拷贝），序列化、压缩与写盘在后台线程中进行。
+    恢复时读取最新的基线并依次叠加其后的增量段。
+    长期记忆存放在 ChromaDB 中，不属于检查点。
+    """
+
+    def __init__(self, world_engine, directory: Optional[str] = None, full_every: Optional[int] = None):
+        self.world = world_engine
+        self.directory = directory or settings.CHECKPOINT_DIR
+        self.full_every = max(1, full_every if full_every is not None else settings.CHECKPOINT_FULL_EVERY)
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint")
+        self._pending: Optional[Future] = None
+
+        self._base_id: Optional[str] = None
+        self._sequence = 0
+        self._last_tick: Optional[int] = None
+        self._memory_versions: Dict[str, int] = {}
+        # 写入失败的检查点链：其后的增量段不再写出，下一次检查点改写新的基线
+        self._broken_chain: Optional[str] = None
+
+    def checkpoint(self, full: bool = False, wait: bool = False) -> Dict[str, Any]:
+        """采集当前状态并提交后台写入；返回本次检查点的概要"""
+        with self.world.lock:
+            if self._base_id is None or self._base_id == self._broken_chain or self._sequence >= self.full_every:
+                full = True
+            payload = self._capture(full)
+        path = os.path.join(self.directory, self._filename(payload))
+        self._pending = self._writer.submit(self._write, path, payload, full)
+        if wait:
+            self._pending.result()
+        return {
+            "kind": payload["kind"],
+            "tick": payload["tick"],
+            "agents_written": len(payload["agents"]),
+            "agents_total": len(payload["ids"]),
+            "path": path,
+        }
+
+    def wait(self):
+        """等待后台写入完成"""
+        if self._pending is not None:
+            self._pending.result()
+
+    def on_tick(self, world_engine):
+        """自动检查点：距上次检查点满 CHECKPOINT_INTERVAL_TICKS 个 Tick 时触发"""
+        interval = settings.CHECKPOINT_INTERVAL_TICKS
+        if interval <= 0:
+            return
+        if self._last_tick is not None and world_engine.tick_count - self._last_tick < interval:
+            return
+        if self._pending is not None and not self._pending.done():
+            # 上一次还没写完，推迟到下一个 Tick
+            return
+        self.checkpoint()
+
+    def _capture(self, full: bool) -> Dict[str, Any]:
+        world_engine = self.world
+        store = world_engine.state_dynamics.store
+        agents = world_engine.get_all_agents()
+        since = self._last_tick
+
+        if full:
+            self._base_id = uuid.uuid4().hex
+            self._sequence = 0
+            self._memory_versions.clear()
+            dirty = agents
+        else:
+            # 与上次检查点同一 Tick 内的修改也要写入，因此用 >=
+            n = len(store.agents)
+            dirty_ids = {store.agents[slot].id for slot in np.flatnonzero(store.modified[:n] >= since)
+                         if store.agents[slot] is not None}
+            versions = self._memory_versions
+            for agent in agents:
+                memory = agent.__pydantic_private__["_memory"]
+                if memory is not None and versions.get(agent.id) != memory.version:
+                    dirty_ids.add(agent.id)
+            dirty = [a for a in agents if a.id in dirty_ids]
+        for agent in dirty:
+            memory = agent.__pydantic_private__["_memory"]
+            if memory is not None:
+                self._memory_versions[agent.id] = memory.version
+
+        ids = [a.id for a in agents]
+        slots = store.slots
+        slot_idx = np.fromiter((slots[a.id] for a in agents), dtype=np.intp, count=len(agents))
+        scheduler = world_engine.scheduler
+        payload = {
+            "kind": "base" if full else "delta",
+            "base_id": self._base_id,
+            "sequence": self._sequence,
+            "tick": world_engine.tick_count,
+            "created_at": time.time(),
+            "time": world_engine.time_system.current_time.model_dump(),
+            "minutes_per_tick": world_engine.time_system.minutes_per_tick,
+            "ids": ids,
+            # 花式索引返回副本，之后的 Tick 不会影响已采集的数值
+            "stats": {name: store.columns[name][slot_idx] for name in STAT_FIELDS},
+            "agents": [encode_agent(a) for a in dirty],
+            "scheduler": scheduler.snapshot() if scheduler is not None else {},
+        }
+        if full:
+            payload["map"] = capture_map(world_engine.map_system)
+
+        self._sequence += 1
+        self._last_tick = world_engine.tick_count
+        return payload
+
+    @staticmethod
+    def _filename(payload: Dict[str, Any]) -> str:
+        return f"{payload['base_id']}-{payload['sequence']:06d}-{payload['kind']}{_SUFFIX}"
+
+    def _write(self, path: str, payload: Dict[str, Any], full: bool):
+        base_id = payload["base_id"]
+        if base_id == self._broken_chain:
+            # 链中已有一段没写成功，之后的增量段叠加上去会缺少那一段的修改
+            logger.warning("Skipping checkpoint %s of broken chain %s", path, base_id)
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            write_file(path, payload)
+            if full:
+                self._remove_other_chains(base_id)
+        except Exception:
+            # 采集时已推进了序号与各 Agent 的记忆版本，失败的这段无法补写，
+            # 标记整条链为损坏，下一次检查点写新的基线
+            self._broken_chain = base_id
+            logger.exception("Checkpoint write failed: %s", path)
+            raise
+
+    def _remove_other_chains(self, base_id: str):
+        """新基线写完后删除旧的检查点链"""
+        for name in os.listdir(self.directory):
+            if name.endswith(_SUFFIX) and not name.startswith(base_id):
+                os.remove(os.path.join(self.directory, name))
+
+    def latest_chain(self) -> List[str]:
+        """最新的检查点链（基线 + 其后的增量段），按写入顺序"""
+        if not os.path.isdir(self.directory):
+            return []
+        files = [n for n in os.listdir(self.directory) if n.endswith(_SUFFIX)]
+        bases = [n for n in files if n.endswith(f"-base{_SUFFIX}")]
+        if not bases:
+            return []
+        base = max(bases, key=lambda n: os.path.getmtime(os.path.join(self.directory, n)))
+        base_id = base.split("-", 1)[0]
+        chain = []
+        # 序号必须连续：缺了一段时，之后的增量段不能叠加
+        for sequence, name in enumerate(sorted(n for n in files if n.startswith(base_id))):
+            if int(name.split("-")[1]) != sequence:
+                break
+            chain.append(os.path.join(self.directory, name))
+        return chain
+
+    def restore(self) -> Optional[Dict[str, Any]]:
+        """从最新的检查点链恢复世界；没有检查点时返回 None"""
+        self.wait()
+        chain = self.latest_chain()
+        if not chain:
+            return None
+        payloads = [read_file(path) for path in chain]
+        base, latest = payloads[0], payloads[-1]
+
+        records: Dict[str, Dict[str, Any]] = {}
+        for payload in payloads:
+            for record in payload["agents"]:
+                records[record["id"]] = record
+
+        world_engine = self.world
+        with world_engine.lock:
+            world_engine.clear_agents()
+            load_map(world_engine.map_system, base["map"])
+
+            world_engine.time_system.current_time = GameTime(**latest["time"])
+            world_engine.time_system.minutes_per_tick = latest["minutes_per_tick"]
+            # 游戏时钟回到检查点，tick_count（增量同步的版本号）继续前进，
+            # 调度表中的到期 Tick 按差值平移
+            world_engine.advance_version(latest["tick"])
+            offset = world_engine.tick_count - latest["tick"]
+
+            stats = [latest["stats"][name].tolist() for name in STAT_FIELDS]
+            for agent_id, row in zip(latest["ids"], zip(*stats)):
+                decode_agent(world_engine, records[agent_id], dict(zip(STAT_FIELDS, row)))
+
+            if world_engine.scheduler is not None:
+                world_engine.scheduler.clear()
+                for agent_id, due in latest["scheduler"].items():
+                    world_engine.scheduler.schedule(agent_id, due + offset)
+
+            # 恢复后的下一次检查点从新的基线开始
+            self._base_id = None
+            self._last_tick = world_engine.tick_count
+
+        return {"tick": latest["tick"], "agents": len(latest["ids"]), "files": len(chain)}
+
+    def shutdown(self):
+        self._writer.shutdown(wait=True)
@@ -0,0 +1,116 @@
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import threading
+from app.core.config import settings
+from app.models.memory import EntryKind, ShortTermEntry
+from app.services.prompt_manager import TokenCounter
+
+class ContextBuilder:
+    """
+    按 token 预算构造决策用的记忆上下文：
+    - 同一决策的 Thought/Action 合为一组；
+    - 连续相同的动作合并为一组并标注次数（保留最近的想法），连续重复的记录同样合并；
+    - 相同的 Thought/Action 组只保留最近一次；
+    - [EVENT] 记录总是保留，其余记录从新到旧装入预算，输出保持时间顺序。
+    """
+
+    def __init__(self, budget: Optional[int] = None, counter: Optional[TokenCounter] = None):
+        self.budget = budget if budget is not None else settings.MEMORY_CONTEXT_TOKEN_BUDGET
+        self.counter = counter or TokenCounter()
+        # 短期记忆的文本高度重复，按行缓存 token 数
+        self._count = lru_cache(maxsize=4096)(self.counter.count)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.raw_tokens = 0
+        self.context_tokens = 0
+        # 因超出预算被丢弃的组数
+        self.budget_dropped = 0
+
+    def build(self, entries: Iterable[ShortTermEntry]) -> str:
+        entries = list(entries)
+        if not entries:
+            return ""
+        raw_tokens = sum(self._count(entry.text) for entry in entries)
+
+        units = self._collapse(self._group(entries))
+        costs = [sum(self._count(line) for line in lines) for _, lines in units]
+
+        keep = [is_event for is_event, _ in units]
+        remaining = self.budget - sum(cost for cost, is_event in zip(costs, keep) if is_event)
+        for i in range(len(units) - 1, -1, -1):
+            if keep[i]:
+                continue
+            if costs[i] > remaining:
+                break
+            keep[i] = True
+            remaining -= costs[i]
+
+        lines = [line for (_, unit_lines), kept in zip(units, keep) if kept for line in unit_lines]
+        context_tokens = sum(cost for cost, kept in zip(costs, keep) if kept)
+        with self._lock:
+            self.calls += 1
+            self.raw_tokens += raw_tokens
+            self.context_tokens += context_tokens
+            self.budget_dropped += keep.count(False)
+        return "\n".join(lines)
+
+    @staticmethod
+    def _group(entries: List[ShortTermEntry]) -> List[Tuple[str, Any]]:
+        """把同一 Tick 的 Thought + Action 合为一组，其他记录各自成组"""
+        groups: List[Tuple[str, Any]] = []
+        i = 0
+        while i < len(entries):
+            entry = entries[i]
+            following = entries[i + 1] if i + 1 < len(entries) else None
+            if (entry.kind == EntryKind.THOUGHT and following is not None
+                    and following.kind == EntryKind.ACTION and following.tick == entry.tick):
+                groups.append(("decision", (entry.content, following.content)))
+                i += 2
+                continue
+            groups.append((entry.kind, entry.text))
+            i += 1
+        return groups
+
+    @staticmethod
+    def _collapse(groups: List[Tuple[str, Any]]) -> List[Tuple[bool, List[str]]]:
+        """游程合并与去重，返回 [(是否事件, 行列表)]"""
+        # 1. 连续相同的动作合并（保留最新的想法），连续重复的记录合并
+        runs: List[List[Any]] = []  # [kind, value, 次数]
+        for kind, value in groups:
+            if runs:
+                last = runs[-1]
+                if kind == "decision" and last[0] == "decision" and last[1][1] == value[1]:
+                    last[1] = value
+                    last[2] += 1
+                    continue
+                if kind != "decision" and last[0] == kind and last[1] == value:
+                    last[2] += 1
+                    continue
+            runs.append([kind, value, 1])
+
+        # 2. 相同的 (想法, 动作) 只保留最近一次
+        last_index = {run[1]: i for i, run in enumerate(runs) if run[0] == "decision"}
+
+        units: List[Tuple[bool, List[str]]] = []
+        for i, (kind, value, count) in enumerate(runs):
+            suffix = f" (x{count})" if count > 1 else ""
+            if kind == "decision":
+                if last_index[value] == i:
+                    units.append((False, [f"Thought: {value[0]}", f"Action: {value[1]}{suffix}"]))
+            else:
+                units.append((kind == EntryKind.EVENT, [f"{value}{suffix}"]))
+        return units
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            saved = self.raw_tokens - self.context_tokens
+            return {
+                "budget": self.budget,
+                "calls": self.calls,
+                "raw_tokens": self.raw_tokens,
+                "context_tokens": self.context_tokens,
+                "saved_tokens": saved,
+                "saved_per_call": saved / self.calls if self.calls else 0.0,
+                "saved_ratio": saved / self.raw_tokens if self.raw_tokens else 0.0,
+                "budget_dropped": self.budget_dropped,
+            }
@@ -0,0 +1,107 @@
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+import math
+import random
+import threading
+import time
+import zlib
+
+class DecisionCache:
+    """
+    决策缓存（LRU + TTL）。
+    以粗粒度的状态签名为键复用 LLM 决策：数值分桶、地形、附近实体数量、
+    时段以及价值观的哈希。按 bypass_probability 随机跳过缓存，避免行为僵化。
+    缓存由多个 Agent 的大脑共享，可在决策线程池中并发访问。
+    """
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: float = 300.0,
+                 bypass_probability: float = 0.1, seed: Optional[int] = None,
+                 clock=time.monotonic):
+        self.max_size = max(1, max_size)
+        self.ttl_seconds = ttl_seconds
+        self.bypass_probability = bypass_probability
+        self._clock = clock
+        self._rng = random.Random(seed)
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.expirations = 0
+
+    @staticmethod
+    def make_key(stats: Dict[str, float], terrain: str, nearby_count: int,
+                 hour: int, values: str) -> Tuple:
+        """把当前状态量化为缓存键"""
+        return (
+            _bucket(stats.get("health", 100)),
+            _bucket(stats.get("sanity", 100)),
+            _bucket(stats.get("energy", 100)),
+            # 财富无上限，按对数分桶
+            int(math.log2(max(stats.get("wealth", 0), 0) + 1)),
+            terrain,
+            min(nearby_count, 5),
+            _time_band(hour),
+            zlib.crc32(values.encode("utf-8")),
+        )
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """命中返回缓存的决策；未命中、过期或被随机跳过时返回 None"""
+        with self._lock:
+            if self.bypass_probability > 0 and self._rng.random() < self.bypass_probability:
+                self.bypasses += 1
+                return None
+
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            stored_at, value = entry
+            if self._clock() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = (self._clock(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypasses": self.bypasses,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+def _bucket(value: float, width: float = 20.0) -> int:
+    """0-100 的数值按 width 分桶"""
+    return int(max(0.0, min(100.0, value)) // width)
+
+def _time_band(hour: int) -> str:
+    if hour >= 22 or hour < 6:
+        return "night"
+    if hour < 12:
+        return "morning"
+    if hour < 18:
+        return "afternoon"
+    return "evening"
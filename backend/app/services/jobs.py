@@ -0,0 +1,150 @@
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+import threading
+import time
+import uuid
+from app.core.config import settings
+from app.services.world import world
+
+class JobStatus:
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    CANCELLED = "cancelled"
+    FAILED = "failed"
+
+    FINISHED = (COMPLETED, CANCELLED, FAILED)
+
+class JobConflictError(RuntimeError):
+    """已有模拟任务在运行"""
+
+    def __init__(self, job_id: str):
+        super().__init__(f"Simulation job {job_id} is already running.")
+        self.job_id = job_id
+
+class SimulationJob:
+    """一次后台推进 ticks 个时间片的任务"""
+
+    def __init__(self, ticks: int):
+        self.id = uuid.uuid4().hex
+        self.ticks = ticks
+        self.ticks_done = 0
+        self.status = JobStatus.PENDING
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._cancel = threading.Event()
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in JobStatus.FINISHED
+
+    def request_cancel(self):
+        self._cancel.set()
+
+    def ticks_per_sec(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return self.ticks_done / elapsed if elapsed > 0 else 0.0
+
+    def to_dict(self, current_time: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "ticks": self.ticks,
+            "ticks_done": self.ticks_done,
+            "progress": self.ticks_done / self.ticks if self.ticks else 1.0,
+            "ticks_per_sec": self.ticks_per_sec(),
+            "current_time": current_time,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+class JobManager:
+    """
+    后台模拟任务管理。
+    同一时间只运行一个任务；任务在独立线程中按 chunk_size 分段推进，段与段之间响应取消。
+    world.lock 只在每一步（单个 Tick 或一次快进）期间持有，步与步之间让出给读写世界的请求。
+    """
+
+    def __init__(self, world, chunk_size: Optional[int] = None, history: int = 50):
+        self.world = world
+        self.chunk_size = max(1, chunk_size if chunk_size is not None else settings.TICK_JOB_CHUNK)
+        self.history = history
+        self._jobs: "OrderedDict[str, SimulationJob]" = OrderedDict()
+        self._active: Optional[SimulationJob] = None
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> Optional[SimulationJob]:
+        return self._active
+
+    def start(self, ticks: int) -> SimulationJob:
+        with self._lock:
+            if self._active is not None and not self._active.is_finished:
+                raise JobConflictError(self._active.id)
+            job = SimulationJob(ticks)
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.history:
+                self._jobs.popitem(last=False)
+            self._active = job
+
+        thread = threading.Thread(target=self._run, args=(job,), name=f"sim-job-{job.id[:8]}", daemon=True)
+        thread.start()
+        return job
+
+    def get(self, job_id: str) -> Optional[SimulationJob]:
+        return self._jobs.get(job_id)
+
+    def list(self) -> List[SimulationJob]:
+        return list(reversed(self._jobs.values()))
+
+    def cancel(self, job_id: str) -> Optional[SimulationJob]:
+        job = self._jobs.get(job_id)
+        if job is not None and not job.is_finished:
+            job.request_cancel()
+        return job
+
+    def cancel_active(self, wait: bool = True, timeout: float = 30.0):
+        """取消正在运行的任务（例如重置世界前），wait 时等待其结束"""
+        job = self._active
+        if job is None or job.is_finished:
+            return
+        job.request_cancel()
+        if wait:
+            deadline = time.monotonic() + timeout
+            while not job.is_finished and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+    def _run(self, job: SimulationJob):
+        job.started_at = time.time()
+        job.status = JobStatus.RUNNING
+        try:
+            while job.ticks_done < job.ticks and not job.cancel_requested:
+                chunk = min(self.chunk_size, job.ticks - job.ticks_done)
+                done = 0
+                while done < chunk:
+                    # 每步单独持锁，读接口最多等待一个 Tick（含其决策阶段）
+                    with self.world.lock:
+                        advanced = self.world.advance(chunk - done)
+                    done += advanced
+                    job.ticks_done += advanced
+        except Exception as e:
+            job.error = str(e)
+            status = JobStatus.FAILED
+        else:
+            status = JobStatus.COMPLETED if job.ticks_done >= job.ticks else JobStatus.CANCELLED
+        # 先记录结束时间再公布状态，轮询方看到结束状态时数据已完整
+        job.finished_at = time.time()
+        job.status = status
+
+# Singleton Instance
+job_manager = JobManager(world)
@@ -0,0 +1,112 @@
+from typing import Any, List, Optional
+import json
+import logging
+import sqlite3
+import threading
+from app.core.config import settings
+from app.models.journal import JournalEntry
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS decisions (
+    agent_id TEXT NOT NULL,
+    tick INTEGER NOT NULL,
+    time_desc TEXT NOT NULL,
+    action TEXT NOT NULL,
+    target TEXT,
+    thought TEXT NOT NULL,
+    success INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_decisions_agent_tick ON decisions (agent_id, tick);
+CREATE INDEX IF NOT EXISTS idx_decisions_tick ON decisions (tick);
+"""
+
+class DecisionJournal:
+    """
+    只追加的决策日志。
+    record 只把记录放进内存缓冲（O(1)），攒满 flush_size 条或由 WorldEngine
+    在午夜、关闭时调用 flush 时整批写入 SQLite。
+    path 为空时使用内存数据库，每次 flush 后删除早于 retention_ticks 个 Tick 的记录，
+    避免长时间运行的服务内存无限增长；需要完整历史时应配置 JOURNAL_PATH。
+    """
+
+    def __init__(self, path: Optional[str] = None, flush_size: Optional[int] = None,
+                 retention_ticks: Optional[int] = None):
+        self.path = path if path is not None else settings.JOURNAL_PATH
+        self.flush_size = max(1, flush_size if flush_size is not None else settings.JOURNAL_FLUSH_SIZE)
+        if retention_ticks is None:
+            retention_ticks = settings.JOURNAL_MEMORY_RETENTION_TICKS
+        # 只对内存数据库生效
+        self.retention_ticks = retention_ticks if not self.path else 0
+        # 当前 Tick，由 WorldEngine 同步
+        self.tick = 0
+        self.entries_written = 0
+        self._pending: List[JournalEntry] = []
+        # 缓冲在模拟线程追加，flush 可能来自关闭、重置等其他线程；追加与整批取出都要持有
+        self._pending_lock = threading.Lock()
+        # 数据库连接；flush 全程持有，多个 flush 按取出顺序写入
+        self._lock = threading.Lock()
+        # 写入在模拟线程，查询可能来自请求线程
+        self._conn = sqlite3.connect(self.path or ":memory:", check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def record(self, entry: JournalEntry):
+        with self._pending_lock:
+            self._pending.append(entry)
+
+    def should_flush(self) -> bool:
+        return len(self._pending) >= self.flush_size
+
+    def flush(self) -> int:
+        """把缓冲中的记录整批写入，返回写入条数"""
+        with self._lock:
+            with self._pending_lock:
+                if not self._pending:
+                    return 0
+                batch, self._pending = self._pending, []
+            rows = [
+                (e.agent_id, e.tick, e.time_desc, e.action,
+                 json.dumps(e.target) if e.target is not None else None, e.thought, int(e.success))
+                for e in batch
+            ]
+            try:
+                with self._conn:
+                    self._conn.executemany("INSERT INTO decisions VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                    if self.retention_ticks > 0:
+                        self._conn.execute("DELETE FROM decisions WHERE tick < ?", (self.tick - self.retention_ticks,))
+            except sqlite3.Error:
+                # 保留未写入的记录，下次 flush 时重试
+                logger.exception("Decision journal write failed (%d entries)", len(batch))
+                with self._pending_lock:
+                    self._pending[:0] = batch
+                return 0
+            self.entries_written += len(batch)
+        return len(batch)
+
+    def entries(self, agent_id: str, since: Optional[int] = None, limit: Optional[int] = None) -> List[JournalEntry]:
+        """按 Tick 顺序查询某个 Agent 已写入的记录（不含缓冲中的）"""
+        sql = "SELECT * FROM decisions WHERE agent_id = ?"
+        params: List[Any] = [agent_id]
+        if since is not None:
+            sql += " AND tick >= ?"
+            params.append(since)
+        sql += " ORDER BY tick, rowid"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [
+            JournalEntry(agent_id, tick, time_desc, action,
+                         json.loads(target) if target is not None else None, thought, bool(success))
+            for agent_id, tick, time_desc, action, target, thought, success in rows
+        ]
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
@@ -1,38 +1,189 @@
-from typing import Tuple, List, Dict
+from typing import Tuple, List, Dict, Iterator, Mapping, Optional
 from app.models.map import LocationInfo, TerrainType
 from app.models.entity import Entity
 from app.core.config import settings
-import math
+import numpy as np
+
+# 地形编码表：terrain 数组中存储的是枚举在此列表中的下标
+TERRAIN_TYPES: List[TerrainType] = list(TerrainType)
+_TERRAIN_CODES: Dict[TerrainType, int] = {t: i for i, t in enumerate(TERRAIN_TYPES)}
+
+class _GridView(Mapping):
+    """兼容旧的 MapSystem.grid：按坐标只读访问，LocationInfo 在读取时构建（修改它不会影响地图）"""
+
+    def __init__(self, map_system: "MapSystem"):
+        self._map = map_system
+
+    def __getitem__(self, coord: Tuple[int, int]) -> LocationInfo:
+        if not self._map.in_bounds(*coord):
+            raise KeyError(coord)
+        return self._map.get_location(coord)
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        return ((x, y) for x in range(self._map.width) for y in range(self._map.height))
+
+    def __len__(self) -> int:
+        return self._map.width * self._map.height
+
+    def __contains__(self, coord) -> bool:
+        return isinstance(coord, tuple) and len(coord) == 2 and self._map.in_bounds(*coord)
 
 class MapSystem:
-    def __init__(self):
-        self.width = settings.MAP_WIDTH
-        self.height = settings.MAP_HEIGHT
-        self.grid: Dict[Tuple[int, int], LocationInfo] = {}
+    def __init__(self, cell_size: Optional[int] = None, width: Optional[int] = None, height: Optional[int] = None):
+        self.width = width or settings.MAP_WIDTH
+        self.height = height or settings.MAP_HEIGHT
         self.entities: Dict[str, Entity] = {}
         
+        # 空间索引：按 cell_size 划分的均匀网格桶，记录每个桶内的实体 ID
+        self.cell_size = max(1, cell_size or settings.SPATIAL_CELL_SIZE)
+        self._cells: Dict[Tuple[int, int], Dict[str, Entity]] = {}
+        self._entity_cells: Dict[str, Tuple[int, int]] = {}
+        # 注册顺序，用于让半径查询保持与遍历 self.entities 相同的结果顺序
+        self._entity_order: Dict[str, int] = {}
+        self._next_order = 0
+        
         # Initialize default empty map
         self._init_map()
 
     def _init_map(self):
-        for x in range(self.width):
-            for y in range(self.height):
-                self.grid[(x, y)] = LocationInfo(
-                    x=x, y=y, 
-                    terrain=TerrainType.EMPTY, 
-                    is_walkable=True
-                )
+        """
+        以紧凑数组存储地形（按 [x, y] 索引），LocationInfo 仅在查询时构建。
+        每格占用 6 字节：地形编码 1 + 可通行 1 + 描述引用 4。
+        """
+        shape = (self.width, self.height)
+        self.terrain = np.full(shape, _TERRAIN_CODES[TerrainType.EMPTY], dtype=np.uint8)
+        self.walkable = np.ones(shape, dtype=np.bool_)
+        # 描述文本驻留在 descriptions 表中，0 号表示无描述
+        self.description_refs = np.zeros(shape, dtype=np.uint32)
+        self.descriptions: List[Optional[str]] = [None]
+        self._description_ids: Dict[str, int] = {}
+
+    @property
+    def grid(self) -> Mapping[Tuple[int, int], LocationInfo]:
+        """坐标 -> LocationInfo 的只读视图；修改地形请用 set_terrain 系列方法"""
+        return _GridView(self)
+
+    def in_bounds(self, x: int, y: int) -> bool:
+        return 0 <= x < self.width and 0 <= y < self.height
 
     def set_terrain(self, x: int, y: int, terrain: TerrainType, is_walkable: bool):
-        if (x, y) in self.grid:
-            self.grid[(x, y)].terrain = terrain
-            self.grid[(x, y)].is_walkable = is_walkable
+        if self.in_bounds(x, y):
+            self.terrain[x, y] = _TERRAIN_CODES[terrain]
+            self.walkable[x, y] = is_walkable
+
+    def set_terrain_rect(self, x0: int, y0: int, x1: int, y1: int, terrain: TerrainType,
+                         is_walkable: bool, description: Optional[str] = None):
+        """批量设置矩形区域 [x0, x1) x [y0, y1) 的地形，超出地图的部分被裁剪"""
+        x0, x1 = max(0, x0), min(self.width, x1)
+        y0, y1 = max(0, y0), min(self.height, y1)
+        if x0 >= x1 or y0 >= y1:
+            return
+        self.terrain[x0:x1, y0:y1] = _TERRAIN_CODES[terrain]
+        self.walkable[x0:x1, y0:y1] = is_walkable
+        if description is not None:
+            self.description_refs[x0:x1, y0:y1] = self._intern_description(description)
+
+    def set_terrain_mask(self, mask: np.ndarray, terrain: TerrainType,
+                         is_walkable: bool, description: Optional[str] = None):
+        """按布尔掩码（形状为 (width, height)）批量设置地形"""
+        mask = np.asarray(mask, dtype=np.bool_)
+        if mask.shape != self.terrain.shape:
+            raise ValueError(f"Mask shape {mask.shape} does not match map shape {self.terrain.shape}")
+        self.terrain[mask] = _TERRAIN_CODES[terrain]
+        self.walkable[mask] = is_walkable
+        if description is not None:
+            self.description_refs[mask] = self._intern_description(description)
+
+    def set_description(self, x: int, y: int, description: Optional[str]):
+        if self.in_bounds(x, y):
+            self.description_refs[x, y] = self._intern_description(description) if description else 0
+
+    def _intern_description(self, description: str) -> int:
+        ref = self._description_ids.get(description)
+        if ref is None:
+            ref = len(self.descriptions)
+            self.descriptions.append(description)
+            self._description_ids[description] = ref
+        return ref
+
+    def is_walkable(self, coord: Tuple[int, int]) -> bool:
+        x, y = coord
+        return self.in_bounds(x, y) and bool(self.walkable[x, y])
 
     def register_entity(self, entity: Entity):
+        if entity.id in self.entities:
+            self._unindex(entity.id)
+        else:
+            self._entity_order[entity.id] = self._next_order
+            self._next_order += 1
         self.entities[entity.id] = entity
+        self._index(entity)
+
+    def unregister_entity(self, entity_id: str):
+        """从地图与空间索引中移除实体"""
+        if entity_id not in self.entities:
+            return
+        self._unindex(entity_id)
+        del self.entities[entity_id]
+        del self._entity_order[entity_id]
+
+    def entity_order(self, entity_id: str) -> Optional[int]:
+        """实体的注册序号（单调递增，可作分页游标）"""
+        return self._entity_order.get(entity_id)
+
+    def clear_entities(self):
+        """清空所有实体及空间索引"""
+        self.entities.clear()
+        self._cells.clear()
+        self._entity_cells.clear()
+        self._entity_order.clear()
+        self._next_order = 0
+
+    def update_entity_position(self, entity_id: str, target: Tuple[int, int]):
+        """不做任何校验地设置实体坐标，并同步空间索引"""
+        entity = self.entities[entity_id]
+        entity.x = target[0]
+        entity.y = target[1]
+        self.sync_entity_position(entity)
+
+    def sync_entity_position(self, entity: Entity):
+        """实体坐标被直接赋值后同步空间索引（Agent 写 x/y 时自动调用）"""
+        if self.entities.get(entity.id) is not entity:
+            return
+        if self._cell_of((entity.x, entity.y)) != self._entity_cells.get(entity.id):
+            self._unindex(entity.id)
+            self._index(entity)
+
+    def _cell_of(self, coord: Tuple[int, int]) -> Tuple[int, int]:
+        return (coord[0] // self.cell_size, coord[1] // self.cell_size)
+
+    def _index(self, entity: Entity):
+        cell = self._cell_of((entity.x, entity.y))
+        self._cells.setdefault(cell, {})[entity.id] = entity
+        self._entity_cells[entity.id] = cell
+
+    def _unindex(self, entity_id: str):
+        cell = self._entity_cells.pop(entity_id, None)
+        if cell is None:
+            return
+        bucket = self._cells.get(cell)
+        if bucket is not None:
+            bucket.pop(entity_id, None)
+            if not bucket:
+                del self._cells[cell]
 
     def get_location(self, coord: Tuple[int, int]) -> LocationInfo:
-        return self.grid.get(coord, LocationInfo(x=coord[0], y=coord[1], terrain=TerrainType.WALL, is_walkable=False))
+        """按需构建坐标处的 LocationInfo（返回的是副本，修改它不会影响地图）"""
+        x, y = coord
+        if not self.in_bounds(x, y):
+            return LocationInfo(x=x, y=y, terrain=TerrainType.WALL, is_walkable=False)
+        # 数组中的值已保证合法，跳过校验直接构建
+        return LocationInfo.model_construct(
+            x=x, y=y,
+            terrain=TERRAIN_TYPES[self.terrain[x, y]],
+            description=self.descriptions[self.description_refs[x, y]],
+            is_walkable=bool(self.walkable[x, y])
+        )
 
     def move_entity(self, entity_id: str, target: Tuple[int, int]) -> bool:
         """尝试移动实体，返回成功/失败"""
@@ -44,8 +195,7 @@ class MapSystem:
             return False
             
         # Check terrain walkability
-        location = self.get_location(target)
-        if not location.is_walkable:
+        if not self.walkable[target[0], target[1]]:
             return False
             
         # Check collision with other entities (optional, for now simple 2D overlap might be allowed or not)
@@ -63,14 +213,38 @@ class MapSystem:
              # Assuming movement is only to neighbors
              return False
 
-        entity.x = target[0]
-        entity.y = target[1]
+        self.update_entity_position(entity_id, target)
         return True
 
     def get_nearby_entities(self, center: Tuple[int, int], radius: int) -> List[Entity]:
+        """半径查询：只扫描与查询圆相交的网格桶，比较距离平方"""
+        cx, cy = center
+        radius_sq = radius * radius
+        min_cx, min_cy = self._cell_of((cx - radius, cy - radius))
+        max_cx, max_cy = self._cell_of((cx + radius, cy + radius))
+        
+        cells = self._cells
+        span = (max_cx - min_cx + 1) * (max_cy - min_cy + 1)
+        if span <= len(cells):
+            buckets = [cells.get((gx, gy)) for gx in range(min_cx, max_cx + 1) for gy in range(min_cy, max_cy + 1)]
+        else:
+            # 半径远大于实体分布时，直接遍历非空桶
+            buckets = [
+                bucket for (gx, gy), bucket in cells.items()
+                if min_cx <= gx <= max_cx and min_cy <= gy <= max_cy
+            ]
+        
         result = []
-        for entity in self.entities.values():
-            dist = math.sqrt((entity.x - center[0])**2 + (entity.y - center[1])**2)
-            if dist <= radius:
-                result.append(entity)
+        for bucket in buckets:
+            if not bucket:
+                continue
+            for entity in bucket.values():
+                dx = entity.x - cx
+                dy = entity.y - cy
+                if dx * dx + dy * dy <= radius_sq:
+                    result.append(entity)
+        
+        # 保持与注册顺序一致的结果顺序
+        order = self._entity_order
+        result.sort(key=lambda e: order[e.id])
         return result
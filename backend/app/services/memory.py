@@ -1,8 +1,15 @@
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from collections import deque
+import logging
+import threading
+import time
+import uuid
+import numpy as np
 import chromadb
 from chromadb.utils import embedding_functions
 from app.core.config import settings
+from app.models.memory import EntryKind, ShortTermEntry
+from app.services.telemetry import CallType, llm_telemetry
 
 class MockEmbeddingFunction(embedding_functions.EmbeddingFunction):
     _function_name = "mock_embedding"
@@ -23,27 +30,217 @@ class MockEmbeddingFunction(embedding_functions.EmbeddingFunction):
     def __call__(self, input: List[str]) -> List[List[float]]:
         return [[0.1] * 1536 for _ in input]
 
+class TrackedOpenAIEmbeddingFunction(embedding_functions.OpenAIEmbeddingFunction):
+    """OpenAI Embedding，每次请求计入 LLM 调用统计（延迟、token、错误）"""
+    
+    def __call__(self, input: List[str]) -> List[np.ndarray]:
+        if not input:
+            return []
+        params: Dict[str, Any] = {"model": self.model_name, "input": input}
+        if self.dimensions is not None and "text-embedding-3" in self.model_name:
+            params["dimensions"] = self.dimensions
+        with llm_telemetry.track(CallType.EMBEDDING, self.model_name) as call:
+            response = self.client.embeddings.create(**params)
+            call.set_usage(getattr(response, "usage", None))
+        return [np.array(data.embedding, dtype=np.float32) for data in response.data]
+
+logger = logging.getLogger(__name__)
+
+_client_lock = threading.Lock()
+_chroma_client = None
+_shared_collections: Dict[bool, Any] = {}
+_embedding_fns: Dict[bool, Any] = {}
+
+def get_chroma_client():
+    """进程内共享的 ChromaDB 客户端"""
+    global _chroma_client
+    with _client_lock:
+        if _chroma_client is None:
+            _chroma_client = chromadb.Client()
+        return _chroma_client
+
+def get_shared_collection(use_mock: bool = True):
+    """
+    所有 Agent 共用的记忆集合（Mock 与真实 Embedding 各一个），
+    记忆通过 metadata 中的 agent 字段区分归属。
+    """
+    client = get_chroma_client()
+    with _client_lock:
+        collection = _shared_collections.get(use_mock)
+        if collection is None:
+            if use_mock:
+                embedding_fn = MockEmbeddingFunction()
+                name = f"{settings.MEMORY_COLLECTION}_mock"
+            else:
+                embedding_fn = TrackedOpenAIEmbeddingFunction(
+                    api_key=settings.LLM_API_KEY,
+                    model_name=settings.LLM_EMBEDDING_MODEL,
+                    api_base=settings.LLM_EMBEDDING_BASE_URL or None
+                )
+                name = settings.MEMORY_COLLECTION
+            collection = client.get_or_create_collection(name=name, embedding_function=embedding_fn)
+            _shared_collections[use_mock] = collection
+            _embedding_fns[use_mock] = embedding_fn
+        return collection
+
+class AgentMemoryCollection:
+    """
+    共享集合上的单 Agent 视图：写入时打上 agent 标签并为 ID 加前缀，
+    查询时按 agent 过滤，保证各 Agent 的长期记忆互相隔离。
+    """
+
+    def __init__(self, collection, agent_id: str):
+        self._collection = collection
+        self.agent_id = agent_id
+
+    @property
+    def name(self) -> str:
+        return self._collection.name
+
+    def _scope(self, where: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        if not where:
+            return {"agent": self.agent_id}
+        return {"$and": [{"agent": self.agent_id}, where]}
+
+    @property
+    def shared(self):
+        """底层的共享集合"""
+        return self._collection
+
+    def scoped_id(self, local_id: str) -> str:
+        return f"{self.agent_id}:{local_id}"
+
+    def scoped_metadata(self, metadata: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        return {**(metadata or {}), "agent": self.agent_id}
+
+    def add(self, documents: List[str], ids: List[str], metadatas: Optional[List[Dict[str, Any]]] = None):
+        metadatas = metadatas or [{} for _ in documents]
+        self._collection.add(
+            documents=documents,
+            metadatas=[self.scoped_metadata(m) for m in metadatas],
+            ids=[self.scoped_id(i) for i in ids]
+        )
+
+    def query(self, query_texts: List[str], n_results: int = 3, where: Optional[Dict[str, Any]] = None):
+        return self._collection.query(
+            query_texts=query_texts,
+            n_results=n_results,
+            where=self._scope(where)
+        )
+
+    def get(self, where: Optional[Dict[str, Any]] = None, **kwargs):
+        return self._collection.get(where=self._scope(where), **kwargs)
+
+    def count(self) -> int:
+        return len(self.get(include=[])["ids"])
+
+class MemoryWriteBuffer:
+    """
+    长期记忆写入缓冲。
+    午夜归档时各 Agent 的总结先入队，随后按共享集合分组、按 batch_size 分块，
+    每块一次 upsert（一次 Embedding 请求 + 一次写入）。写入失败按指数退避重试，
+    仍失败的条目留在队列中，下次 flush 时再写，不会丢失。
+    """
+
+    def __init__(self, batch_size: Optional[int] = None, max_retries: Optional[int] = None,
+                 retry_backoff: Optional[float] = None, sleep=time.sleep):
+        self.batch_size = max(1, batch_size if batch_size is not None else settings.EMBEDDING_BATCH_SIZE)
+        self.max_retries = max_retries if max_retries is not None else settings.MEMORY_WRITE_MAX_RETRIES
+        self.retry_backoff = retry_backoff if retry_backoff is not None else settings.MEMORY_WRITE_RETRY_BACKOFF
+        self._sleep = sleep
+        # (共享集合, id, 文档, metadata)
+        self._pending: List[tuple] = []
+        self._lock = threading.Lock()
+
+        self.batches_written = 0
+        self.documents_written = 0
+        self.failures = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, collection: AgentMemoryCollection, document: str, metadata: Optional[Dict[str, Any]] = None):
+        entry = (
+            collection.shared,
+            collection.scoped_id(str(uuid.uuid4())),
+            document,
+            collection.scoped_metadata(metadata),
+        )
+        with self._lock:
+            self._pending.append(entry)
+
+    def flush(self) -> int:
+        """写入所有待写条目，返回成功写入的条数"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return 0
+
+        groups: Dict[int, List[tuple]] = {}
+        for entry in pending:
+            groups.setdefault(id(entry[0]), []).append(entry)
+
+        written = 0
+        failed: List[tuple] = []
+        for entries in groups.values():
+            collection = entries[0][0]
+            for start in range(0, len(entries), self.batch_size):
+                chunk = entries[start:start + self.batch_size]
+                if self._write_chunk(collection, chunk):
+                    written += len(chunk)
+                else:
+                    failed.extend(chunk)
+
+        if failed:
+            with self._lock:
+                self._pending[:0] = failed
+        return written
+
+    def _write_chunk(self, collection, chunk: List[tuple]) -> bool:
+        for attempt in range(self.max_retries + 1):
+            try:
+                # upsert 保证重试时已写入的部分不会重复
+                collection.upsert(
+                    ids=[entry[1] for entry in chunk],
+                    documents=[entry[2] for entry in chunk],
+                    metadatas=[entry[3] for entry in chunk]
+                )
+            except Exception:
+                self.failures += 1
+                if attempt == self.max_retries:
+                    logger.exception("Memory write failed, %d entries kept for next flush", len(chunk))
+                    return False
+                self._sleep(self.retry_backoff * (2 ** attempt))
+            else:
+                self.batches_written += 1
+                self.documents_written += len(chunk)
+                return True
+        return False
+
 class MemorySystem:
-    def __init__(self, agent_id: str, use_mock: bool = True):
+    def __init__(self, agent_id: str, use_mock: bool = True, context_builder=None):
         self.agent_id = agent_id
-        self.short_term_memory = deque(maxlen=20)
-        self.chroma_client = chromadb.Client()
+        # 可选的 ContextBuilder：按 token 预算压缩决策上下文
+        self.context_builder = context_builder
+        self.short_term_memory: "deque[ShortTermEntry]" = deque(maxlen=20)
+        # 最近一次想法与动作，不随短期记忆滚动或归档清空
+        self.latest_thought: Optional[ShortTermEntry] = None
+        self.latest_action: Optional[ShortTermEntry] = None
+        # 短期记忆每次变化递增，用于增量检查点判断是否需要重写
+        self.version = 0
         
-        if use_mock:
-            self.embedding_fn = MockEmbeddingFunction()
-        else:
-            self.embedding_fn = embedding_functions.OpenAIEmbeddingFunction(
-                api_key=settings.LLM_API_KEY,
-                model_name=settings.LLM_EMBEDDING_MODEL
-            )
-            
-        self.collection = self.chroma_client.get_or_create_collection(
-            name=f"agent_memory_{agent_id}",
-            embedding_function=self.embedding_fn
-        )
+        shared = get_shared_collection(use_mock)
+        self.embedding_fn = _embedding_fns[use_mock]
+        self.collection = AgentMemoryCollection(shared, agent_id)
 
-    def add_short_term(self, content: str):
-        self.short_term_memory.append(content)
+    def add_short_term(self, content: str, kind: str = EntryKind.NOTE, tick: int = 0):
+        entry = ShortTermEntry(kind, content, tick)
+        self.short_term_memory.append(entry)
+        if kind == EntryKind.THOUGHT:
+            self.latest_thought = entry
+        elif kind == EntryKind.ACTION:
+            self.latest_action = entry
+        self.version += 1
 
     def recall(self, query: str, k: int = 3) -> List[str]:
         results = self.collection.query(
@@ -55,15 +252,35 @@ class MemorySystem:
             return results["documents"][0]
         return []
 
-    def consolidate_daily(self, summary: str):
-        import uuid
-        self.collection.add(
-            documents=[summary],
-            metadatas=[{"type": "daily_summary", "agent": self.agent_id}],
-            ids=[str(uuid.uuid4())]
-        )
+    def consolidate_daily(self, summary: str, buffer: Optional[MemoryWriteBuffer] = None,
+                          until_tick: Optional[int] = None):
+        """
+        归档每日总结；给定 buffer 时只入队，由调用方统一批量写入。
+        until_tick 给定时只清除该 Tick 及之前的短期记忆（反思异步完成时保留新一天的记录）。
+        """
+        metadata = {"type": "daily_summary", "agent": self.agent_id}
+        if buffer is not None:
+            buffer.add(self.collection, summary, metadata)
+        else:
+            self.collection.add(
+                documents=[summary],
+                metadatas=[metadata],
+                ids=[str(uuid.uuid4())]
+            )
         
-        self.short_term_memory.clear()
+        if until_tick is None:
+            self.short_term_memory.clear()
+        else:
+            kept = [entry for entry in self.short_term_memory if entry.tick > until_tick]
+            self.short_term_memory.clear()
+            self.short_term_memory.extend(kept)
+        self.version += 1
+
+    def get_latest_thought(self) -> Optional[str]:
+        """最近的一条想法"""
+        return self.latest_thought.content if self.latest_thought is not None else None
 
     def get_recent_context(self) -> str:
-        return "\n".join(list(self.short_term_memory))
+        if self.context_builder is not None:
+            return self.context_builder.build(self.short_term_memory)
+        return "\n".join([entry.text for entry in self.short_term_memory])
@@ -1,60 +1,229 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
+from string import Formatter
 import json
+import logging
+import threading
 from app.core.config import settings
-from app.core.prompts import DECISION_PROMPTS, REFLECTION_PROMPTS
+from app.core.prompts import DECISION_PROMPTS, DECISION_PROMPTS_PREFIX, REFLECTION_PROMPTS
+
+logger = logging.getLogger(__name__)
+
+LAYOUTS = ("legacy", "prefix")
+
+class CompiledTemplate:
+    """
+    预编译的 str.format 模板：构造时解析一次，渲染时只做字符串拼接。
+    只支持简单的具名字段（不含格式说明与转换）。
+    """
+
+    def __init__(self, template: str):
+        self.template = template
+        self._literals: List[str] = []
+        self._fields: List[Optional[str]] = []
+        for literal, field, spec, conversion in Formatter().parse(template):
+            if spec or conversion:
+                raise ValueError(f"Unsupported format spec in field {field!r}")
+            self._literals.append(literal)
+            self._fields.append(field)
+        # 第一个字段之前的固定文本
+        self.head = self._literals[0] if self._literals else ""
+
+    def render(self, **values: Any) -> str:
+        parts = []
+        for literal, field in zip(self._literals, self._fields):
+            parts.append(literal)
+            if field is not None:
+                parts.append(str(values[field]))
+        return "".join(parts)
+
+class TokenCounter:
+    """tiktoken 计数；编码不可用（未安装或无法下载词表）时按 UTF-8 字节数 / 4 估算"""
+
+    def __init__(self, encoding_name: Optional[str] = None):
+        self.encoding_name = encoding_name or settings.PROMPT_TOKEN_ENCODING
+        self._encoding = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def exact(self) -> bool:
+        return self._get_encoding() is not None
+
+    def _get_encoding(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    try:
+                        import tiktoken
+                        self._encoding = tiktoken.get_encoding(self.encoding_name)
+                    except Exception:
+                        logger.info("tiktoken encoding %s unavailable, estimating tokens", self.encoding_name)
+                        self._encoding = None
+                    self._loaded = True
+        return self._encoding
+
+    def count(self, text: str) -> int:
+        encoding = self._get_encoding()
+        if encoding is not None:
+            return len(encoding.encode(text))
+        return max(1, len(text.encode("utf-8")) // 4) if text else 0
+
+class PromptStats:
+    """按提示词类型累计 token 数：静态前缀、总量，以及服务商返回的用量与缓存命中"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._kinds: Dict[str, Dict[str, int]] = {}
+
+    def _bucket(self, kind: str) -> Dict[str, int]:
+        bucket = self._kinds.get(kind)
+        if bucket is None:
+            bucket = self._kinds[kind] = {
+                "prompts": 0, "prompt_tokens": 0, "prefix_tokens": 0,
+                "responses": 0, "usage_prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0,
+            }
+        return bucket
+
+    def record_prompt(self, kind: str, prompt_tokens: int, prefix_tokens: int):
+        with self._lock:
+            bucket = self._bucket(kind)
+            bucket["prompts"] += 1
+            bucket["prompt_tokens"] += prompt_tokens
+            bucket["prefix_tokens"] += prefix_tokens
+
+    def record_usage(self, kind: str, usage: Any):
+        """记录响应中的 usage（OpenAI 格式，cached_tokens 在 prompt_tokens_details 中）"""
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None) or 0
+        with self._lock:
+            bucket = self._bucket(kind)
+            bucket["responses"] += 1
+            bucket["usage_prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+            bucket["completion_tokens"] += getattr(usage, "completion_tokens", 0) or 0
+            bucket["cached_tokens"] += cached
+
+    def reset(self):
+        with self._lock:
+            self._kinds.clear()
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            result = {}
+            for kind, bucket in self._kinds.items():
+                prompts, responses = bucket["prompts"], bucket["responses"]
+                result[kind] = {
+                    **bucket,
+                    "avg_prompt_tokens": bucket["prompt_tokens"] / prompts if prompts else 0.0,
+                    # 提示词中可被前缀缓存复用的比例（按本地计数）
+                    "prefix_share": bucket["prefix_tokens"] / bucket["prompt_tokens"] if bucket["prompt_tokens"] else 0.0,
+                    # 服务商实际命中缓存的比例
+                    "cache_hit_rate": (bucket["cached_tokens"] / bucket["usage_prompt_tokens"]
+                                       if bucket["usage_prompt_tokens"] else 0.0),
+                    "avg_completion_tokens": bucket["completion_tokens"] / responses if responses else 0.0,
+                }
+            return result
+
+class _CompiledPrompt:
+    """一种语言、一种布局下的一组提示词：固定的 system、预编译的 user 与静态前缀的 token 数"""
+
+    def __init__(self, system: str, user: str, counter: TokenCounter):
+        self.system = system
+        self.user = CompiledTemplate(user)
+        self._counter = counter
+        self._system_tokens: Optional[int] = None
+        self._prefix_tokens: Optional[int] = None
+
+    @property
+    def system_tokens(self) -> int:
+        if self._system_tokens is None:
+            self._system_tokens = self._counter.count(self.system)
+        return self._system_tokens
+
+    @property
+    def prefix_tokens(self) -> int:
+        # 每次请求都相同的开头：system 与 user 第一个字段之前的文本
+        if self._prefix_tokens is None:
+            self._prefix_tokens = self.system_tokens + self._counter.count(self.user.head)
+        return self._prefix_tokens
 
 class PromptManager:
     """
     提示词管理器，负责根据配置的语言加载和格式化提示词模板。
+    模板在构造时按语言与布局预编译；count_tokens 开启时记录每次提示词的 token 数。
     """
-    
-    def __init__(self, language: str = None):
+
+    def __init__(self, language: str = None, layout: str = None, count_tokens: bool = True):
         """
         初始化提示词管理器。
-        
+
         :param language: 指定语言（"en" 或 "zh"），如果不指定则从配置中读取。
+        :param layout: 决策提示词布局（"legacy" 或 "prefix"），如果不指定则从配置中读取。
+        :param count_tokens: 是否统计提示词 token 数
         """
         self.language = language or settings.LANGUAGE
         if self.language not in ["en", "zh"]:
             self.language = "en" # 默认回退到英文
+        self.layout = layout or settings.PROMPT_LAYOUT
+        if self.layout not in LAYOUTS:
+            self.layout = "legacy"
+        self.count_tokens = count_tokens
+        self.token_counter = TokenCounter()
+        self.stats = PromptStats()
+
+        decision_sets = DECISION_PROMPTS_PREFIX if self.layout == "prefix" else DECISION_PROMPTS
+        decision = decision_sets.get(self.language, decision_sets["en"])
+        reflection = REFLECTION_PROMPTS.get(self.language, REFLECTION_PROMPTS["en"])
+        self._decision = _CompiledPrompt(decision["system"], decision["user"], self.token_counter)
+        self._reflection = _CompiledPrompt(reflection["system"], reflection["user"], self.token_counter)
+
+    def _format_stats(self, stats: Dict[str, Any]) -> str:
+        if self.layout == "prefix":
+            # 紧凑格式，数值保留一位小数
+            compact = {k: round(v, 1) if isinstance(v, float) else v for k, v in stats.items()}
+            return json.dumps(compact, ensure_ascii=False, separators=(",", ":"))
+        return json.dumps(stats, indent=2, ensure_ascii=False)
+
+    def _finish(self, kind: str, prompt: _CompiledPrompt, user_prompt: str) -> Dict[str, str]:
+        if self.count_tokens:
+            # system 固定不变，只对每次渲染的 user 部分分词
+            total = prompt.system_tokens + self.token_counter.count(user_prompt)
+            self.stats.record_prompt(kind, total, prompt.prefix_tokens)
+        return {
+            "system": prompt.system,
+            "user": user_prompt
+        }
 
     def get_decision_prompt(self, perception_text: str, memory_context: str, stats: Dict[str, Any]) -> Dict[str, str]:
         """
         获取并格式化决策提示词。
-        
+
         :param perception_text: 感知文本
         :param memory_context: 记忆上下文
         :param stats: 状态数据
         :return: 包含 system 和 user 提示词的字典
         """
-        templates = DECISION_PROMPTS.get(self.language, DECISION_PROMPTS["en"])
-        
-        user_prompt = templates["user"].format(
+        user_prompt = self._decision.user.render(
             perception_text=perception_text,
             memory_context=memory_context,
-            stats_json=json.dumps(stats, indent=2, ensure_ascii=False)
+            stats_json=self._format_stats(stats)
         )
-        
-        return {
-            "system": templates["system"],
-            "user": user_prompt
-        }
+        return self._finish("decision", self._decision, user_prompt)
 
     def get_reflection_prompt(self, daily_log: str) -> Dict[str, str]:
         """
         获取并格式化反思提示词。
-        
+
         :param daily_log: 当日日志
         :return: 包含 system 和 user 提示词的字典
         """
-        templates = REFLECTION_PROMPTS.get(self.language, REFLECTION_PROMPTS["en"])
-        
-        user_prompt = templates["user"].format(daily_log=daily_log)
-        
-        return {
-            "system": templates["system"],
-            "user": user_prompt
-        }
+        user_prompt = self._reflection.user.render(daily_log=daily_log)
+        return self._finish("reflection", self._reflection, user_prompt)
+
+    def record_usage(self, kind: str, usage: Any):
+        """记录 LLM 响应中的 token 用量"""
+        self.stats.record_usage(kind, usage)
 
 # 全局单例
 prompt_manager = PromptManager()
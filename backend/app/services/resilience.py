@@ -0,0 +1,118 @@
+from typing import Any, Callable, Dict, Optional
+import threading
+import time
+import openai
+from app.core.config import settings
+from app.core.metrics import registry
+
+class BreakerState:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+class CircuitBreaker:
+    """
+    LLM 服务熔断器（所有大脑共享）。
+    连续 failure_threshold 次服务故障后打开，cooldown 秒内直接拒绝调用；
+    冷却结束后放行一次试探调用（半开），成功则关闭，失败则重新打开。
+    """
+
+    def __init__(self, failure_threshold: Optional[int] = None, cooldown: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = max(1, failure_threshold if failure_threshold is not None
+                                     else settings.CIRCUIT_BREAKER_THRESHOLD)
+        self.cooldown = cooldown if cooldown is not None else settings.CIRCUIT_BREAKER_COOLDOWN
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = BreakerState.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.times_opened = 0
+        self.rejected = 0
+        self._probing = False
+
+    def allow(self) -> bool:
+        """是否放行一次调用；半开状态下同一时间只放行一个试探调用"""
+        with self._lock:
+            if self.state == BreakerState.OPEN:
+                if self._clock() - self.opened_at < self.cooldown:
+                    self.rejected += 1
+                    return False
+                self.state = BreakerState.HALF_OPEN
+                self._probing = False
+            if self.state == BreakerState.HALF_OPEN:
+                if self._probing:
+                    self.rejected += 1
+                    return False
+                self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = BreakerState.CLOSED
+            self.consecutive_failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == BreakerState.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != BreakerState.OPEN:
+                    self.times_opened += 1
+                self.state = BreakerState.OPEN
+                self.opened_at = self._clock()
+                self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "failure_threshold": self.failure_threshold,
+                "cooldown": self.cooldown,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+            }
+
+class FallbackReason:
+    DEADLINE = "deadline"
+    CIRCUIT_OPEN = "circuit_open"
+    ERROR = "error"
+
+class FallbackCounter:
+    """大脑退回规则决策的次数，按原因统计"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+        self.retries = 0
+        self._metric = registry.counter(
+            "llm_decision_fallbacks_total", "Decisions that fell back to the rule-based brain",
+            labelnames=("reason",)
+        )
+
+    def record(self, reason: str):
+        with self._lock:
+            self.counts[reason] = self.counts.get(reason, 0) + 1
+        self._metric.inc(reason)
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"total": sum(self.counts.values()), "by_reason": dict(self.counts), "retries": self.retries}
+
+def is_provider_failure(error: BaseException) -> bool:
+    """服务端故障（超时、连接失败、限流、5xx），计入熔断并可以重试"""
+    if isinstance(error, openai.APIConnectionError):
+        # 含 APITimeoutError
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return False
+
+def is_parse_failure(error: BaseException) -> bool:
+    """回复无法解析为合法决策（非 JSON、缺少字段、未知动作），可以重试但不计入熔断"""
+    return isinstance(error, (ValueError, KeyError, TypeError))
@@ -0,0 +1,64 @@
+from typing import Dict, List, Optional
+import heapq
+import itertools
+
+class DecisionScheduler:
+    """
+    决策调度器：以“下一次决策的 Tick”为键的小顶堆。
+    Agent 只在当前动作结束或被事件打断时才需要再次调用大脑。
+    重新调度时旧的堆条目不删除，弹出时按 _due 校验后丢弃（惰性删除）。
+    """
+
+    def __init__(self):
+        self._heap: List[tuple] = []
+        self._due: Dict[str, int] = {}
+        self._seq = itertools.count()
+
+    def __contains__(self, agent_id: str) -> bool:
+        return agent_id in self._due
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def schedule(self, agent_id: str, tick: int):
+        """安排 Agent 在 tick 时决策（覆盖之前的安排）"""
+        self._due[agent_id] = tick
+        heapq.heappush(self._heap, (tick, next(self._seq), agent_id))
+
+    def interrupt(self, agent_id: str, tick: int):
+        """事件打断：把决策提前到 tick（已更早的安排保持不变）"""
+        due = self._due.get(agent_id)
+        if due is None or due > tick:
+            self.schedule(agent_id, tick)
+
+    def remove(self, agent_id: str):
+        self._due.pop(agent_id, None)
+
+    def due_at(self, agent_id: str) -> Optional[int]:
+        return self._due.get(agent_id)
+
+    def pop_due(self, tick: int) -> List[str]:
+        """弹出所有到期（<= tick）的 Agent，按到期时间与安排顺序排列"""
+        result = []
+        heap = self._heap
+        while heap and heap[0][0] <= tick:
+            due, _, agent_id = heapq.heappop(heap)
+            if self._due.get(agent_id) == due:
+                del self._due[agent_id]
+                result.append(agent_id)
+        return result
+
+    def next_due(self) -> Optional[int]:
+        """最早的有效决策时刻"""
+        heap = self._heap
+        while heap and self._due.get(heap[0][2]) != heap[0][0]:
+            heapq.heappop(heap)
+        return heap[0][0] if heap else None
+
+    def snapshot(self) -> Dict[str, int]:
+        """agent_id -> 决策 Tick 的副本"""
+        return dict(self._due)
+
+    def clear(self):
+        self._heap.clear()
+        self._due.clear()
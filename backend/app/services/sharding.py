@@ -0,0 +1,330 @@
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+import multiprocessing
+import traceback
+from app.core.config import settings
+from app.models.agent import Agent
+from app.models.entity import Entity
+from app.models.time import GameTime
+
+logger = logging.getLogger(__name__)
+
+# 幽灵实体：(id, x, y)
+Ghost = Tuple[str, int, int]
+# 迁移中的 Agent：(encode_agent 记录, 数值, 决策 Tick)
+Handoff = Tuple[Dict[str, Any], Dict[str, float], Optional[int]]
+
+def shard_bounds(width: int, shards: int) -> List[Tuple[int, int]]:
+    """把地图按 x 切成 shards 条竖带，返回每条的 [x0, x1)"""
+    shards = max(1, min(shards, width))
+    edges = [width * i // shards for i in range(shards + 1)]
+    return list(zip(edges[:-1], edges[1:]))
+
+class _ShardWorker:
+    """
+    worker 进程内的分片：一个只负责 [x0, x1) 区域的 WorldEngine。
+    相邻分片边界附近的 Agent 以普通 Entity（幽灵）注册到地图，只参与感知，不参与模拟。
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        from app.services.checkpoint import load_map
+        from app.services.journal import DecisionJournal
+        from app.services.world import WorldEngine
+
+        self.index = config["index"]
+        self.x0, self.x1 = config["bounds"]
+        self.ghost_radius = config["ghost_radius"]
+        engine = self.world = WorldEngine()
+        if settings.JOURNAL_PATH:
+            # 各分片写各自的 SQLite 文件，避免多进程争用同一个写锁
+            engine.journal = DecisionJournal(path=f"{settings.JOURNAL_PATH}.shard{self.index}")
+        load_map(engine.map_system, config["map"])
+        engine.time_system.current_time = GameTime(**config["time"])
+        engine.time_system.minutes_per_tick = config["minutes_per_tick"]
+        engine.tick_count = config["tick"]
+        self.ghost_ids: List[str] = []
+
+    def add(self, agent_id: str, x: int, y: int, use_mock_brain: bool = True,
+            stats: Optional[Dict[str, float]] = None) -> str:
+        agent = self.world.create_agent(agent_id, x, y, use_mock_brain=use_mock_brain)
+        for name, value in (stats or {}).items():
+            setattr(agent.stats, name, value)
+        return agent_id
+
+    def receive(self, incoming: List[Handoff]) -> int:
+        """接收迁入的 Agent（同 ID 的幽灵先移除）"""
+        from app.services.checkpoint import decode_agent
+
+        engine = self.world
+        scheduler = engine.scheduler
+        for record, stats, due in incoming:
+            engine.map_system.unregister_entity(record["id"])
+            decode_agent(engine, record, stats)
+            if scheduler is not None and due is not None:
+                # 保留原分片中的决策时刻，迁移不打断正在进行的动作
+                scheduler.schedule(record["id"], due)
+        return len(incoming)
+
+    def step(self, ghosts: List[Ghost]) -> Dict[str, Any]:
+        """换上新的幽灵，推进一个 Tick，返回迁出的 Agent 与边界 Agent"""
+        engine = self.world
+        map_system = engine.map_system
+        for ghost_id in self.ghost_ids:
+            if not isinstance(map_system.entities.get(ghost_id), Agent):
+                map_system.unregister_entity(ghost_id)
+        self.ghost_ids = []
+        for ghost_id, x, y in ghosts:
+            if ghost_id not in map_system.entities:
+                map_system.register_entity(Entity(id=ghost_id, x=x, y=y, type="Agent"))
+                self.ghost_ids.append(ghost_id)
+
+        engine.run_agent_loop(1)
+
+        agents = engine.get_all_agents()
+        outgoing = self._hand_off(agents)
+        x0, x1, radius = self.x0, self.x1, self.ghost_radius
+        border = [(agent.id, agent.x, agent.y) for agent in agents
+                  if x0 <= agent.x < x1 and (agent.x < x0 + radius or agent.x >= x1 - radius)]
+        return {
+            "tick": engine.tick_count,
+            "time": engine.time_system.current_time.model_dump(),
+            "outgoing": outgoing,
+            "border": border,
+            "agents": len(agents) - len(outgoing),
+        }
+
+    def move(self, agent_id: str, x: int, y: int) -> List[Handoff]:
+        """把 Agent 直接放到 (x, y)；越出本分片时立即迁出"""
+        agent = self.world.get_agent(agent_id)
+        if agent is None:
+            raise KeyError(agent_id)
+        self.world.map_system.update_entity_position(agent_id, (x, y))
+        return self._hand_off([agent])
+
+    def nearby(self, agent_id: str, radius: int) -> List[Ghost]:
+        """Agent 周围的实体（含幽灵），与 Agent 感知时看到的一致"""
+        agent = self.world.get_agent(agent_id)
+        if agent is None:
+            raise KeyError(agent_id)
+        return [(e.id, e.x, e.y) for e in self.world.map_system.get_nearby_entities((agent.x, agent.y), radius)
+                if e.id != agent_id]
+
+    def _hand_off(self, agents: List[Agent]) -> List[Handoff]:
+        """把位于本分片区域之外的 Agent 打包并移出世界"""
+        from app.services.checkpoint import encode_agent
+
+        engine = self.world
+        scheduler = engine.scheduler
+        leaving = [agent for agent in agents if not self.x0 <= agent.x < self.x1]
+        if not leaving:
+            return []
+        outgoing = []
+        for agent, stats in zip(leaving, engine.state_dynamics.store.stats_dicts(leaving)):
+            due = scheduler.due_at(agent.id) if scheduler is not None else None
+            outgoing.append((encode_agent(agent), stats, due))
+            engine.remove_agent(agent.id)
+        return outgoing
+
+    def agents(self) -> List[Dict[str, Any]]:
+        """与 GET /agents 相同字段的记录，数值从 StatsStore 按列批量读取"""
+        agents = self.world.get_all_agents()
+        stats = self.world.state_dynamics.store.stats_dicts(agents)
+        return [
+            {
+                "id": agent.id, "x": agent.x, "y": agent.y, "type": agent.type,
+                "stats": agent_stats, "current_action": agent.current_action.value,
+                "is_active": agent.is_active, "values": agent.values, "is_sleeping": agent.is_sleeping,
+            }
+            for agent, agent_stats in zip(agents, stats)
+        ]
+
+    def stop(self):
+        self.world.shutdown()
+
+def _shard_main(conn, config: Dict[str, Any]):
+    """worker 进程入口：按顺序执行协调者发来的 (命令, 参数)，回复 (是否成功, 结果)"""
+    try:
+        shard = _ShardWorker(config)
+    except Exception:
+        conn.send((False, traceback.format_exc()))
+        return
+    conn.send((True, None))
+    while True:
+        try:
+            command, args = conn.recv()
+        except EOFError:
+            break
+        try:
+            conn.send((True, getattr(shard, command)(*args)))
+        except Exception:
+            conn.send((False, traceback.format_exc()))
+        if command == "stop":
+            break
+    conn.close()
+
+class ShardedWorld:
+    """
+    按地图区域分片的多进程模拟协调者。
+    地图按 x 切成竖带，每个 worker 进程拥有一条竖带内 Agent 的感知、决策与 StateDynamics。
+    每个 Tick 所有分片并行推进一步，协调者在两步之间转交越界的 Agent，
+    并把边界附近的 Agent 作为幽灵发给相邻分片，使 get_nearby_entities 跨分片依然正确。
+    幽灵位置为上一个 Tick 结束时的位置；长期记忆（Chroma）留在原进程，不随 Agent 迁移。
+    """
+
+    def __init__(self, world_engine=None, shards: Optional[int] = None, ghost_radius: Optional[int] = None):
+        # 地图、时间与 Tick 计数取自 world_engine（默认为全局单例）
+        if world_engine is None:
+            from app.services.world import world as world_engine
+        self.world = world_engine
+        self.shards = shards if shards is not None else settings.SHARD_COUNT
+        self.ghost_radius = ghost_radius if ghost_radius is not None else settings.SHARD_GHOST_RADIUS
+        self.bounds = shard_bounds(world_engine.map_system.width, self.shards)
+        self.tick_count = world_engine.tick_count
+        self.current_time = world_engine.time_system.current_time
+        self.handoffs = 0
+        # agent_id -> 所属分片
+        self.owners: Dict[str, int] = {}
+        self._processes = []
+        self._conns = []
+        # 下一个 Tick 要发给各分片的幽灵
+        self._ghosts: List[List[Ghost]] = [[] for _ in self.bounds]
+
+    def __enter__(self) -> "ShardedWorld":
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        """启动 worker 进程（spawn，与 numpy / 线程池安全共存）"""
+        from app.services.checkpoint import capture_map
+
+        engine = self.world
+        ctx = multiprocessing.get_context("spawn")
+        base = {
+            "ghost_radius": self.ghost_radius,
+            "map": capture_map(engine.map_system),
+            "time": engine.time_system.current_time.model_dump(),
+            "minutes_per_tick": engine.time_system.minutes_per_tick,
+            "tick": engine.tick_count,
+        }
+        for index, bounds in enumerate(self.bounds):
+            parent, child = ctx.Pipe()
+            proc = ctx.Process(target=_shard_main, args=(child, {**base, "index": index, "bounds": bounds}),
+                               name=f"world-shard-{index}", daemon=True)
+            proc.start()
+            child.close()
+            self._processes.append(proc)
+            self._conns.append(parent)
+        for conn in self._conns:
+            self._receive(conn)
+
+    @staticmethod
+    def _check(reply: Tuple[bool, Any]):
+        ok, result = reply
+        if not ok:
+            raise RuntimeError(f"Shard worker failed:\n{result}")
+        return result
+
+    def _receive(self, conn):
+        return self._check(conn.recv())
+
+    def _call(self, index: int, command: str, *args):
+        self._conns[index].send((command, args))
+        return self._receive(self._conns[index])
+
+    def _broadcast(self, command: str, args_per_shard: List[tuple]) -> list:
+        """先发给所有分片再依次收取，各分片并行执行；收齐所有回复后再抛出错误"""
+        for conn, args in zip(self._conns, args_per_shard):
+            conn.send((command, args))
+        replies = [conn.recv() for conn in self._conns]
+        return [self._check(reply) for reply in replies]
+
+    def shard_of(self, x: int) -> int:
+        for index, (x0, x1) in enumerate(self.bounds):
+            if x < x1:
+                return index
+        return len(self.bounds) - 1
+
+    def create_agent(self, agent_id: str, x: int, y: int, use_mock_brain: bool = True,
+                     stats: Optional[Dict[str, float]] = None) -> str:
+        """在 (x, y) 所属的分片中创建 Agent，stats 为需要覆盖的初始数值"""
+        if agent_id in self.owners:
+            raise ValueError(f"Agent {agent_id} already exists")
+        index = self.shard_of(x)
+        self._call(index, "add", agent_id, x, y, use_mock_brain, stats)
+        self.owners[agent_id] = index
+        return agent_id
+
+    def move_agent(self, agent_id: str, x: int, y: int):
+        """把 Agent 放到 (x, y)，跨区域时立即转交给新的分片"""
+        outgoing = self._call(self.owners[agent_id], "move", agent_id, x, y)
+        if outgoing:
+            self._deliver(outgoing)
+
+    def nearby_entities(self, agent_id: str, radius: int = 3) -> List[Ghost]:
+        """Agent 所在分片中它周围的实体 (id, x, y)，包括其他分片同步来的幽灵"""
+        return self._call(self.owners[agent_id], "nearby", agent_id, radius)
+
+    def step(self, ticks: int = 1):
+        """所有分片锁步推进 ticks 个 Tick"""
+        for _ in range(ticks):
+            results = self._broadcast("step", [(ghosts,) for ghosts in self._ghosts])
+            ticks_seen = {result["tick"] for result in results}
+            if len(ticks_seen) != 1:
+                raise RuntimeError(f"Shards out of lockstep: {sorted(ticks_seen)}")
+            self.tick_count = ticks_seen.pop()
+            self.current_time = GameTime(**results[0]["time"])
+            self._route(results)
+
+    def _route(self, results: List[Dict[str, Any]]):
+        """把迁出的 Agent 交给新的所属分片，并为相邻分片生成下一个 Tick 的幽灵"""
+        ghosts: List[List[Ghost]] = [[] for _ in self.bounds]
+        positions: List[Tuple[int, Ghost]] = []
+        outgoing: List[Handoff] = []
+        for index, result in enumerate(results):
+            for item in result["outgoing"]:
+                record = item[0]
+                outgoing.append(item)
+                positions.append((self.shard_of(record["x"]), (record["id"], record["x"], record["y"])))
+            positions.extend((index, ghost) for ghost in result["border"])
+
+        radius = self.ghost_radius
+        for owner, ghost in positions:
+            x = ghost[1]
+            for index, (x0, x1) in enumerate(self.bounds):
+                if index != owner and x0 - radius <= x < x1 + radius:
+                    ghosts[index].append(ghost)
+        self._ghosts = ghosts
+        if outgoing:
+            self._deliver(outgoing)
+
+    def _deliver(self, outgoing: List[Handoff]):
+        incoming: List[List[Handoff]] = [[] for _ in self.bounds]
+        for item in outgoing:
+            record = item[0]
+            owner = self.shard_of(record["x"])
+            incoming[owner].append(item)
+            self.owners[record["id"]] = owner
+        self.handoffs += len(outgoing)
+        self._broadcast("receive", [(items,) for items in incoming])
+
+    def agents(self) -> List[Dict[str, Any]]:
+        """所有分片中 Agent 的快照"""
+        results = self._broadcast("agents", [()] * len(self._conns))
+        return [agent for shard in results for agent in shard]
+
+    def stop(self):
+        for index, conn in enumerate(self._conns):
+            try:
+                self._call(index, "stop")
+            except (EOFError, OSError, RuntimeError):
+                logger.exception("Shard %d did not stop cleanly", index)
+            conn.close()
+        for proc in self._processes:
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
+        self._processes.clear()
+        self._conns.clear()
@@ -1,11 +1,190 @@
-from typing import Dict
-from app.models.agent import Agent, ActionType
+from typing import Deque, Dict, List, Mapping, Optional, Tuple
+from collections import deque
+from app.core.config import settings
+from app.models.agent import Agent, ActionType, STAT_FIELDS
 from app.services.map_system import MapSystem
+import numpy as np
+
+# 有上下限约束的数值列（wealth 无上下限）
+_BOUNDED_FIELDS = ("health", "sanity", "energy")
+_ACTION_TYPES: List[ActionType] = list(ActionType)
+_ACTION_CODES: Dict[ActionType, int] = {a: i for i, a in enumerate(_ACTION_TYPES)}
+
+class StatsStore:
+    """
+    结构化数组（struct-of-arrays）形式的 Agent 数值存储。
+    每个 Agent 占用一个 slot，health/sanity/wealth/energy 各为一列 float64 数组，
+    Agent.stats 绑定后作为对应 slot 的视图；current_action 与 is_active 另以
+    actions/active 两列镜像，使整 Tick 结算无需遍历 Agent 对象。
+
+    增量查询：modified 列记录每个 slot 最后被修改的 Tick（tick 由 WorldEngine 维护）。
+    坐标、动作等字段在写入时打上时间戳；数值每 Tick 都在变，改为查询时按精度
+    与上次观察的值比较（stamp_stat_changes），变化记在观察到的 Tick 上。
+    离开的 Agent 记入有界的 removals 日志，更早的移除由 removal_horizon 标明已遗忘。
+    时间戳取 stamp：某个 Tick 的变化被查询过（seal）之后，同一 Tick 内的写入记到下一 Tick，
+    以免 since 等于当前 Tick 的查询漏掉 Tick 之间的修改。
+    """
+
+    def __init__(self, capacity: int = 1024, removal_log_size: Optional[int] = None):
+        self.capacity = max(1, capacity)
+        self.columns: Dict[str, np.ndarray] = {
+            name: np.zeros(self.capacity, dtype=np.float64) for name in STAT_FIELDS
+        }
+        self.observed: Dict[str, np.ndarray] = {
+            name: np.full(self.capacity, np.nan) for name in STAT_FIELDS
+        }
+        self.actions = np.zeros(self.capacity, dtype=np.int8)
+        self.active = np.zeros(self.capacity, dtype=np.bool_)
+        self.modified = np.zeros(self.capacity, dtype=np.int64)
+        self.agents: List[Optional[Agent]] = []
+        self.slots: Dict[str, int] = {}
+        self._free: List[int] = []
+
+        self._tick = 0
+        self.stamp = 0
+        # 任何经由 store 的写入都会递增，配合 tick 作为列表接口的 ETag
+        self.revision = 0
+        if removal_log_size is None:
+            removal_log_size = settings.DIFF_REMOVAL_LOG_SIZE
+        self.removals: Deque[Tuple[int, str]] = deque(maxlen=max(1, removal_log_size))
+        self.removal_horizon = 0
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    @property
+    def tick(self) -> int:
+        return self._tick
+
+    @tick.setter
+    def tick(self, value: int):
+        self._tick = value
+        self.stamp = value
+
+    def seal(self):
+        """当前 Tick 的变化已被查询，之后的写入记到下一 Tick"""
+        self.stamp = self._tick + 1
+
+    def bind(self, agent: Agent) -> int:
+        """为 Agent 分配 slot（已有则复用），并把 agent.stats 切换为视图"""
+        slot = self.slots.get(agent.id)
+        if slot is not None:
+            if agent.stats._store is self and agent.stats._slot == slot and self.agents[slot] is agent:
+                return slot
+            # 同 ID 的旧 Agent 对象取回数值后脱离
+            previous = self.agents[slot]
+            if previous is not None and previous.stats is not agent.stats:
+                previous.stats.detach()
+        else:
+            slot = self._allocate()
+            self.slots[agent.id] = slot
+
+        if agent.stats._store is not None:
+            agent.stats.detach()
+        agent.stats.attach(self, slot)
+        self.agents[slot] = agent
+        self.actions[slot] = _ACTION_CODES[agent.current_action]
+        self.active[slot] = agent.is_active
+        self.modified[slot] = self.stamp
+        self.revision += 1
+        for observed in self.observed.values():
+            observed[slot] = np.nan
+        return slot
+
+    def sync_field(self, slot: int, name: str, value):
+        """记录 Agent 字段的修改，并镜像 current_action / is_active"""
+        self.modified[slot] = self.stamp
+        self.revision += 1
+        if name == "current_action":
+            self.actions[slot] = _ACTION_CODES[ActionType(value)]
+        elif name == "is_active":
+            self.active[slot] = bool(value)
+
+    def release(self, agent_id: str):
+        slot = self.slots.pop(agent_id, None)
+        if slot is None:
+            return
+        agent = self.agents[slot]
+        if agent is not None:
+            agent.stats.detach()
+        self.agents[slot] = None
+        self.active[slot] = False
+        self._free.append(slot)
+
+        self.revision += 1
+        if len(self.removals) == self.removals.maxlen:
+            self.removal_horizon = max(self.removal_horizon, self.removals[0][0])
+        self.removals.append((self.stamp, agent_id))
+
+    def stats_dicts(self, agents: List[Agent]) -> List[Dict[str, float]]:
+        """批量读取多个 Agent 的数值（按列切片，避免逐个属性访问）"""
+        slots = self.slots
+        slot_list = [slots.get(agent.id, -1) for agent in agents]
+        if not slot_list or min(slot_list) < 0:
+            return [agent.stats.as_dict() for agent in agents]
+        slot_idx = np.fromiter(slot_list, dtype=np.intp, count=len(slot_list))
+        columns = [self.columns[name][slot_idx].tolist() for name in STAT_FIELDS]
+        return [dict(zip(STAT_FIELDS, row)) for row in zip(*columns)]
+
+    def stamp_stat_changes(self, precision: int):
+        """按 precision 位小数比较数值与上次观察的值，有变化的 slot 记为当前 Tick 修改"""
+        n = len(self.agents)
+        if n == 0:
+            return
+        changed = np.zeros(n, dtype=np.bool_)
+        for name in STAT_FIELDS:
+            rounded = np.round(self.columns[name][:n], precision)
+            # NaN（从未观察过）与任何值都不相等
+            changed |= rounded != self.observed[name][:n]
+            self.observed[name][:n] = rounded
+        self.modified[:n][changed] = self.stamp
+
+    def changed_since(self, since: int) -> List[Agent]:
+        """修改 Tick 晚于 since 的 Agent（按 slot 顺序）"""
+        n = len(self.agents)
+        agents = self.agents
+        return [agents[slot] for slot in np.flatnonzero(self.modified[:n] > since) if agents[slot] is not None]
+
+    def removed_since(self, since: int) -> List[str]:
+        return [agent_id for tick, agent_id in self.removals if tick > since]
+
+    def clear(self):
+        for agent_id in list(self.slots):
+            self.release(agent_id)
+        self.agents.clear()
+        self._free.clear()
+
+    def _allocate(self) -> int:
+        if self._free:
+            return self._free.pop()
+        slot = len(self.agents)
+        if slot >= self.capacity:
+            self._grow(self.capacity * 2)
+        self.agents.append(None)
+        return slot
+
+    def _grow(self, capacity: int):
+        def grow(column: np.ndarray) -> np.ndarray:
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self.capacity] = column
+            return grown
+
+        for name, column in self.columns.items():
+            self.columns[name] = grow(column)
+        for name, observed in self.observed.items():
+            grown = grow(observed)
+            grown[self.capacity:] = np.nan
+            self.observed[name] = grown
+        self.actions = grow(self.actions)
+        self.active = grow(self.active)
+        self.modified = grow(self.modified)
+        self.capacity = capacity
 
 class StateDynamics:
     def __init__(self, map_system: MapSystem):
         self.map_system = map_system
-        
+        self.store = StatsStore()
+
         # 定义动作对数值的影响 (每 Tick 或 单次结算)
         # 这里简化为单次结算或每小时结算的数值，具体取决于调用频率。
         # 假设 apply_action_effect 是在 Action 完成或 Tick 时调用。
@@ -18,7 +197,7 @@ class StateDynamics:
         # Let's assume apply_action_effect is called per Tick for continuous actions,
         # or once for instant actions.
         # For simplicity in this phase, let's assume it's called PER TICK for continuous states.
-        
+
         self.effects = {
             ActionType.WORK_996: {"health": -0.05, "sanity": -0.05, "wealth": 0.5, "energy": -0.4},
             ActionType.WORK_965: {"health": -0.01, "sanity": -0.01, "wealth": 0.2, "energy": -0.1},
@@ -28,38 +207,170 @@ class StateDynamics:
             ActionType.IDLE: {"health": 0.0, "sanity": 0.0, "wealth": 0.0, "energy": -0.01}
         }
 
+        # 动作持续时长（游戏分钟），动作结束后 Agent 才会再次决策。
+        # None 表示没有固定时长（睡眠持续到被唤醒）。
+        self.durations = {
+            ActionType.WORK_996: 240,
+            ActionType.WORK_965: 180,
+            ActionType.REST_PARK: 60,
+            ActionType.CONSUME_ENT: 60,
+            ActionType.SLEEP: None,
+            ActionType.IDLE: 15
+        }
+
+        # 有界数值跌破该值时需要打断当前动作；由 _apply_deltas 记录，WorldEngine 取走
+        self.critical_threshold = settings.CRITICAL_STAT_THRESHOLD
+        self._critical: List[Agent] = []
+
+    def duration_ticks(self, action_type: ActionType, minutes_per_tick: int) -> Optional[int]:
+        """动作持续的 Tick 数（至少 1）；无固定时长时返回 None"""
+        minutes = self.durations.get(action_type, minutes_per_tick)
+        if minutes is None:
+            return None
+        return max(1, -(-minutes // minutes_per_tick))
+
+    def bind_agent(self, agent: Agent) -> int:
+        """把 Agent 的数值接入 StatsStore"""
+        return self.store.bind(agent)
+
+    def release_agent(self, agent_id: str):
+        """Agent 离开世界时释放其 slot"""
+        self.store.release(agent_id)
+
+    def release_all(self):
+        """释放所有 slot，Agent.stats 恢复为独立模型"""
+        self.store.clear()
+
+    def _slot_of(self, agent: Agent) -> int:
+        # 热路径：直接读私有属性字典，避开 pydantic 的 __getattr__
+        store = self.store
+        slot = store.slots.get(agent.id)
+        if slot is not None and agent.stats.__pydantic_private__["_store"] is store:
+            return slot
+        return store.bind(agent)
+
+    def _delta_table(self) -> np.ndarray:
+        """动作 -> 数值增量表，行号为动作编码，列顺序同 STAT_FIELDS"""
+        table = np.zeros((len(_ACTION_TYPES), len(STAT_FIELDS)), dtype=np.float64)
+        for action_type, effect in self.effects.items():
+            row = _ACTION_CODES[action_type]
+            for col, name in enumerate(STAT_FIELDS):
+                table[row, col] = effect.get(name, 0)
+        return table
+
+    def take_critical(self) -> List[Agent]:
+        """取走自上次调用以来有数值跌破临界值的存活 Agent"""
+        critical, self._critical = self._critical, []
+        return critical
+
+    def ticks_until_critical(self) -> Optional[int]:
+        """按当前动作持续下去，最早有 Agent 数值跌破临界值的是第几个 Tick；不会发生时返回 None"""
+        threshold = self.critical_threshold
+        store = self.store
+        slot_idx = np.flatnonzero(store.active[:len(store.agents)])
+        if threshold <= 0 or len(slot_idx) == 0:
+            return None
+        deltas = self._delta_table()[store.actions[slot_idx]]
+        earliest = None
+        for name in _BOUNDED_FIELDS:
+            delta = deltas[:, STAT_FIELDS.index(name)]
+            values = store.columns[name][slot_idx]
+            falling = (delta < 0) & (values >= threshold)
+            if not falling.any():
+                continue
+            ticks = int(np.floor((values[falling] - threshold) / -delta[falling]).min()) + 1
+            earliest = ticks if earliest is None else min(earliest, ticks)
+        return earliest
+
     def apply_action_effect(self, agent_id: str, action_type: ActionType):
         """根据动作类型结算数值变化 (Per Tick)"""
-        agent = self.map_system.entities.get(agent_id)
-        if not agent or not isinstance(agent, Agent):
-            return # Agent not found
-
-        if not agent.is_active:
-            return # Dead or inactive
-
-        effect = self.effects.get(action_type, {})
-        
-        stats = agent.stats
-        
-        # Apply deltas
-        stats.health += effect.get("health", 0)
-        stats.sanity += effect.get("sanity", 0)
-        stats.wealth += effect.get("wealth", 0)
-        stats.energy += effect.get("energy", 0)
-        
-        # Clamp values
-        stats.health = max(0.0, min(100.0, stats.health))
-        stats.sanity = max(0.0, min(100.0, stats.sanity))
-        stats.energy = max(0.0, min(100.0, stats.energy))
-        # Wealth has no upper bound, but min 0? Docs say "Bankruptcy". Let's allow negative or clamp 0.
-        # ENV-004 implies transactions fail if wealth < price.
-        # So wealth acts as a resource.
-        
+        self.apply_all({agent_id: action_type})
+
+    def apply_all(self, actions: Optional[Mapping[str, ActionType]] = None) -> List[Agent]:
+        """
+        批量结算一个 Tick 内的动作效果。
+        actions 为 None 时结算所有已绑定且存活的 Agent 的当前动作（全程向量化）；
+        否则只结算给定的 Agent -> 动作。
+        Returns: 本次结算中死亡的 Agent
+        """
+        store = self.store
+        if actions is None:
+            slot_idx = np.flatnonzero(store.active[:len(store.agents)])
+            codes = store.actions[slot_idx]
+        else:
+            entities = self.map_system.entities
+            slot_of = self._slot_of
+            slots: List[int] = []
+            code_list: List[int] = []
+            for agent_id, action_type in actions.items():
+                agent = entities.get(agent_id)
+                if not agent or not isinstance(agent, Agent):
+                    continue # Agent not found
+                if not agent.is_active:
+                    continue # Dead or inactive
+                slots.append(slot_of(agent))
+                code_list.append(_ACTION_CODES[action_type])
+            slot_idx = np.fromiter(slots, dtype=np.intp, count=len(slots))
+            codes = np.fromiter(code_list, dtype=np.intp, count=len(code_list))
+
+        if len(slot_idx) == 0:
+            return []
+        return self._apply_deltas(slot_idx, self._delta_table()[codes])
+
+    def apply_repeated(self, ticks: int) -> List[Agent]:
+        """
+        闭式结算连续 ticks 个 Tick 的效果（快进用），等价于调用 ticks 次 apply_all()。
+        每个 Agent 的动作在这段时间内不变，单列增量恒定，因此逐 Tick 钳制等价于
+        对 n * delta 整体钳制；health 递减的 Agent 在归零的那个 Tick 死亡并停止结算。
+        Returns: 结算期间死亡的 Agent
+        """
+        if ticks <= 0:
+            return []
+        store = self.store
+        slot_idx = np.flatnonzero(store.active[:len(store.agents)])
+        if len(slot_idx) == 0:
+            return []
+        deltas = self._delta_table()[store.actions[slot_idx]]
+
+        # 每个 Agent 实际结算的 Tick 数：会死亡的 Agent 截止到死亡那一刻
+        health = store.columns["health"][slot_idx]
+        health_delta = deltas[:, STAT_FIELDS.index("health")]
+        steps = np.full(len(slot_idx), float(ticks))
+        dying = health_delta < 0
+        steps[dying] = np.minimum(ticks, np.ceil(health[dying] / -health_delta[dying]))
+
+        return self._apply_deltas(slot_idx, deltas * steps[:, None])
+
+    def _apply_deltas(self, slot_idx: np.ndarray, deltas: np.ndarray) -> List[Agent]:
+        """对一组 slot 叠加增量 (k x 4)，钳制后检测死亡"""
+        columns = self.store.columns
+        threshold = self.critical_threshold
+        crossed = np.zeros(len(slot_idx), dtype=np.bool_)
+        for col, name in enumerate(STAT_FIELDS):
+            before = columns[name][slot_idx]
+            values = before + deltas[:, col]
+            # Clamp values
+            # Wealth has no upper bound, but min 0? Docs say "Bankruptcy". Let's allow negative or clamp 0.
+            # ENV-004 implies transactions fail if wealth < price.
+            if name in _BOUNDED_FIELDS:
+                np.clip(values, 0.0, 100.0, out=values)
+                if threshold > 0:
+                    crossed |= (before >= threshold) & (values < threshold)
+            columns[name][slot_idx] = values
+        # 批量写入与逐个赋值一样推进 revision（列表接口的 ETag 依赖它）
+        self.store.revision += 1
+
         # Check Critical States
-        if stats.health <= 0:
+        dead = []
+        for slot in slot_idx[columns["health"][slot_idx] <= 0]:
+            agent = self.store.agents[slot]
             agent.is_active = False
             # Trigger Death Event (TODO)
-            
-        if stats.energy <= 0:
-            # Trigger Fainting (Force Sleep) (TODO)
-            pass
+            dead.append(agent)
+
+        if crossed.any():
+            agents = self.store.agents
+            self._critical.extend(agents[slot] for slot in slot_idx[crossed] if agents[slot].is_active)
+
+        # energy <= 0: Trigger Fainting (Force Sleep) (TODO)
+        return dead
@@ -0,0 +1,160 @@
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import json
+import threading
+from app.core.config import settings
+from app.models.agent import Agent, STAT_FIELDS
+from app.services.world import world
+
+def agent_record(agent: Agent, precision: int) -> Dict[str, Any]:
+    """推送给前端的单个 Agent 状态"""
+    stats = agent.stats
+    return {
+        "id": agent.id,
+        "x": agent.x,
+        "y": agent.y,
+        "stats": {name: round(getattr(stats, name), precision) for name in STAT_FIELDS},
+        "current_action": agent.current_action.value,
+        "is_active": agent.is_active,
+        "is_sleeping": agent.is_sleeping,
+        "thought": agent._memory.get_latest_thought() if agent._memory else None,
+    }
+
+class ChangeTracker:
+    """
+    以 StatsStore 的修改 Tick 与移除记录计算增量，与 /world/diff 共用同一套标记。
+    since 为上一次广播（或快照）时的 Tick。
+    """
+
+    def __init__(self, precision: Optional[int] = None):
+        self.precision = precision if precision is not None else settings.STREAM_STAT_PRECISION
+        self.since: Optional[int] = None
+
+    def reset(self):
+        self.since = None
+
+    def mark(self, world_engine):
+        """以当前 Tick 为基线（刚发出全量快照）"""
+        self.since = world_engine.tick_count
+        world_engine.state_dynamics.store.seal()
+
+    def records(self, world_engine) -> List[Dict[str, Any]]:
+        return [agent_record(agent, self.precision) for agent in world_engine.get_all_agents()]
+
+    def diff(self, world_engine) -> Tuple[bool, List[Dict[str, Any]], List[str]]:
+        """返回 (是否需要全量, 有变化的 Agent, 已移除的 Agent ID)，并推进基线"""
+        full, agents, removed = world_engine.changes_since(self.since)
+        self.mark(world_engine)
+        return full, [agent_record(agent, self.precision) for agent in agents], removed
+
+def world_header(world_engine) -> Dict[str, Any]:
+    return {
+        "tick": world_engine.tick_count,
+        "time": str(world_engine.time_system.get_current_time()),
+        "is_night": world_engine.time_system.is_night(),
+    }
+
+def _encode(message: Dict[str, Any]) -> str:
+    return json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+
+class StreamSubscriber:
+    """
+    一个推送客户端：事件循环上的有界队列。
+    队列满说明客户端跟不上，丢弃积压的消息并标记 needs_resync，
+    下一次广播改为给它发送全量快照。
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_queue: int):
+        self.loop = loop
+        self.queue: "asyncio.Queue[str]" = asyncio.Queue(maxsize=max(1, max_queue))
+        self.needs_resync = False
+        self.dropped = 0
+
+    def offer(self, message: str):
+        """只能在 self.loop 线程中调用"""
+        if self.queue.full():
+            self.dropped += self.queue.qsize()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.needs_resync = True
+            return
+        self.queue.put_nowait(message)
+
+class WorldBroadcaster:
+    """
+    World 的 Tick 监听器：每次推进后计算一次增量，序列化一次，
+    再分发给所有订阅者。没有订阅者时不做任何工作。
+    """
+
+    def __init__(self, world_engine, max_queue: Optional[int] = None):
+        self.world = world_engine
+        self.max_queue = max_queue if max_queue is not None else settings.STREAM_QUEUE_SIZE
+        self.tracker = ChangeTracker()
+        self._subscribers: List[StreamSubscriber] = []
+        self._lock = threading.Lock()
+        world_engine.add_tick_listener(self.on_tick)
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def snapshot(self) -> str:
+        """全量快照（调用方需持有 world.lock）"""
+        return _encode({
+            "type": "snapshot",
+            **world_header(self.world),
+            "agents": self.tracker.records(self.world),
+        })
+
+    def subscribe(self, loop: asyncio.AbstractEventLoop) -> Tuple[StreamSubscriber, str]:
+        """
+        注册订阅者并返回初始快照。
+        在世界锁内完成，保证之后收到的增量都比快照新。
+        """
+        with self.world.lock:
+            subscriber = StreamSubscriber(loop, self.max_queue)
+            snapshot = self.snapshot()
+            if self.tracker.since is None:
+                self.tracker.mark(self.world)
+            with self._lock:
+                self._subscribers.append(subscriber)
+        return subscriber, snapshot
+
+    def unsubscribe(self, subscriber: StreamSubscriber):
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def on_tick(self, world_engine):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        if not subscribers:
+            # 基线只在模拟线程中修改；无人订阅时释放
+            self.tracker.reset()
+            return
+
+        full, changed, removed = self.tracker.diff(world_engine)
+        delta = None
+        snapshot = None
+        for subscriber in subscribers:
+            if subscriber.needs_resync or full:
+                if snapshot is None:
+                    snapshot = self.snapshot()
+                subscriber.needs_resync = False
+                message = snapshot
+            else:
+                if delta is None:
+                    delta = _encode({
+                        "type": "delta",
+                        **world_header(world_engine),
+                        "agents": changed,
+                        "removed": removed,
+                    })
+                message = delta
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.offer, message)
+            except RuntimeError:
+                # 事件循环已关闭
+                self.unsubscribe(subscriber)
+
+# Singleton Instance
+broadcaster = WorldBroadcaster(world)
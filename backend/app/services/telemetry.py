@@ -0,0 +1,179 @@
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+import threading
+import time
+import openai
+from app.core.metrics import registry
+
+class CallType:
+    DECISION = "decision"
+    REFLECTION = "reflection"
+    EMBEDDING = "embedding"
+
+# 调用结果分类
+OK = "ok"
+PARSE_ERROR = "parse_error"
+TIMEOUT = "timeout"
+HTTP_ERROR = "http_error"
+CONNECTION_ERROR = "connection_error"
+OTHER_ERROR = "error"
+
+_OUTCOME_FIELDS = {
+    PARSE_ERROR: "parse_errors",
+    TIMEOUT: "timeouts",
+    HTTP_ERROR: "http_errors",
+    CONNECTION_ERROR: "connection_errors",
+    OTHER_ERROR: "other_errors",
+}
+
+def classify_error(error: BaseException) -> str:
+    if isinstance(error, openai.APITimeoutError):
+        return TIMEOUT
+    if isinstance(error, openai.APIStatusError):
+        return HTTP_ERROR
+    if isinstance(error, openai.APIConnectionError):
+        return CONNECTION_ERROR
+    # json.JSONDecodeError 与 pydantic.ValidationError 都是 ValueError 的子类
+    if isinstance(error, (ValueError, KeyError, TypeError)):
+        return PARSE_ERROR
+    return OTHER_ERROR
+
+def _empty_stats() -> Dict[str, float]:
+    return {
+        "calls": 0, "latency_seconds": 0.0, "max_latency_seconds": 0.0,
+        "prompt_tokens": 0, "completion_tokens": 0,
+        **{field: 0 for field in _OUTCOME_FIELDS.values()},
+    }
+
+def _summary(stats: Dict[str, float]) -> Dict[str, float]:
+    calls = stats["calls"]
+    errors = sum(stats[field] for field in _OUTCOME_FIELDS.values())
+    return {
+        **stats,
+        "errors": errors,
+        "error_rate": errors / calls if calls else 0.0,
+        "avg_latency_seconds": stats["latency_seconds"] / calls if calls else 0.0,
+    }
+
+class LLMCall:
+    """一次调用的记录，track 的 with 块内填入 usage"""
+
+    __slots__ = ("prompt_tokens", "completion_tokens")
+
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def set_usage(self, usage: Any):
+        """OpenAI 格式的 usage；服务商未返回时保持为 0"""
+        if usage is None:
+            return
+        self.prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        self.completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+
+class LLMTelemetry:
+    """
+    LLM 与 Embedding 调用统计：延迟、token、解析失败、超时与 HTTP 错误。
+    按 (模型, 调用类型)、(Agent, 调用类型) 与 (模拟日期, 调用类型) 累计，
+    同时写入指标注册表供 /admin/metrics 导出。
+    """
+
+    def __init__(self, clock: Optional[Callable[[], Any]] = None):
+        # 返回当前游戏时间（GameTime）的回调，用于按模拟日期归档
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._by_model: Dict[Tuple[str, str], Dict[str, float]] = {}
+        self._by_agent: Dict[str, Dict[str, Dict[str, float]]] = {}
+        self._by_day: Dict[Tuple[str, str], Dict[str, float]] = {}
+        self._latency = registry.histogram(
+            "llm_call_seconds", "LLM call wall latency", labelnames=("model", "call_type")
+        )
+        self._tokens = registry.counter(
+            "llm_tokens_total", "LLM tokens used", labelnames=("model", "call_type", "direction")
+        )
+        self._errors = registry.counter(
+            "llm_call_errors_total", "Failed LLM calls", labelnames=("model", "call_type", "error")
+        )
+
+    def _day(self) -> str:
+        if self.clock is None:
+            return "unknown"
+        try:
+            now = self.clock()
+            return f"{now.year:04d}-{now.month:02d}-{now.day:02d}"
+        except Exception:
+            return "unknown"
+
+    @contextmanager
+    def track(self, call_type: str, model: Optional[str], agent_id: Optional[str] = None) -> Iterator[LLMCall]:
+        """计时 with 块内的调用；块内抛出的异常按类型计数后继续抛出"""
+        call = LLMCall()
+        started = time.perf_counter()
+        try:
+            yield call
+        except BaseException as e:
+            self.record(call_type, model, agent_id, time.perf_counter() - started,
+                        call.prompt_tokens, call.completion_tokens, classify_error(e))
+            raise
+        self.record(call_type, model, agent_id, time.perf_counter() - started,
+                    call.prompt_tokens, call.completion_tokens, OK)
+
+    def record(self, call_type: str, model: Optional[str], agent_id: Optional[str], latency: float,
+               prompt_tokens: int = 0, completion_tokens: int = 0, outcome: str = OK):
+        model = model or "unknown"
+        day = self._day()
+        with self._lock:
+            buckets = [
+                self._by_model.setdefault((model, call_type), _empty_stats()),
+                self._by_day.setdefault((day, call_type), _empty_stats()),
+            ]
+            if agent_id is not None:
+                buckets.append(self._by_agent.setdefault(agent_id, {}).setdefault(call_type, _empty_stats()))
+            error_field = _OUTCOME_FIELDS.get(outcome)
+            for stats in buckets:
+                stats["calls"] += 1
+                stats["latency_seconds"] += latency
+                stats["max_latency_seconds"] = max(stats["max_latency_seconds"], latency)
+                stats["prompt_tokens"] += prompt_tokens
+                stats["completion_tokens"] += completion_tokens
+                if error_field is not None:
+                    stats[error_field] += 1
+
+        self._latency.observe(latency, model, call_type)
+        if prompt_tokens:
+            self._tokens.inc(model, call_type, "prompt", amount=prompt_tokens)
+        if completion_tokens:
+            self._tokens.inc(model, call_type, "completion", amount=completion_tokens)
+        if outcome != OK:
+            self._errors.inc(model, call_type, outcome)
+
+    def agent_stats(self, agent_id: str) -> Dict[str, Dict[str, float]]:
+        """某个 Agent 按调用类型的统计"""
+        with self._lock:
+            return {call_type: _summary(stats) for call_type, stats in self._by_agent.get(agent_id, {}).items()}
+
+    def snapshot(self) -> Dict[str, Any]:
+        """全局统计：总计、按模型与调用类型、按模拟日期"""
+        with self._lock:
+            totals = _empty_stats()
+            for stats in self._by_model.values():
+                for field, value in stats.items():
+                    if field == "max_latency_seconds":
+                        totals[field] = max(totals[field], value)
+                    else:
+                        totals[field] += value
+            by_model = [{"model": model, "call_type": call_type, **_summary(stats)}
+                        for (model, call_type), stats in self._by_model.items()]
+            by_day: Dict[str, Dict[str, Any]] = {}
+            for (day, call_type), stats in sorted(self._by_day.items()):
+                by_day.setdefault(day, {})[call_type] = _summary(stats)
+        return {"totals": _summary(totals), "by_model": by_model, "by_day": by_day}
+
+    def reset(self):
+        with self._lock:
+            self._by_model.clear()
+            self._by_agent.clear()
+            self._by_day.clear()
+
+# Singleton Instance
+llm_telemetry = LLMTelemetry()
@@ -13,6 +13,16 @@ class TimeSystem:
         self._normalize_time()
         return self.current_time
 
+    def advance(self, ticks: int) -> GameTime:
+        """一次推进多个时间片（用于快进）"""
+        self.current_time.minute += self.minutes_per_tick * ticks
+        self._normalize_time()
+        return self.current_time
+
+    def minute_of_day(self) -> int:
+        """当天已过去的分钟数（0-1439）"""
+        return self.current_time.hour * 60 + self.current_time.minute
+
     def get_current_time(self) -> GameTime:
         """获取当前游戏时间"""
         return self.current_time
@@ -24,13 +34,13 @@ class TimeSystem:
 
     def _normalize_time(self):
         """处理时间进位"""
-        while self.current_time.minute >= 60:
-            self.current_time.minute -= 60
-            self.current_time.hour += 1
+        if self.current_time.minute >= 60:
+            self.current_time.hour += self.current_time.minute // 60
+            self.current_time.minute %= 60
         
-        while self.current_time.hour >= 24:
-            self.current_time.hour -= 24
-            self.current_time.day += 1
+        if self.current_time.hour >= 24:
+            self.current_time.day += self.current_time.hour // 24
+            self.current_time.hour %= 24
             
         # 简化版日历：每月30天
         while self.current_time.day > 30:
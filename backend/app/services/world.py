@@ -1,36 +1,171 @@
 from app.services.time_system import TimeSystem
 from app.services.map_system import MapSystem
 from app.services.state_dynamics import StateDynamics
-from app.services.memory import MemorySystem
+from app.services.memory import MemorySystem, MemoryWriteBuffer
 from app.services.brain import AgentBrain
+from app.services.telemetry import llm_telemetry
+from app.services.resilience import CircuitBreaker, FallbackCounter, FallbackReason
 from app.services.perception import PerceptionFilter
-from app.models.agent import Agent, ActionType
-from typing import List, Optional
+from app.services.decision_cache import DecisionCache
+from app.services.scheduler import DecisionScheduler
+from app.services.journal import DecisionJournal
+from app.services.context_builder import ContextBuilder
+from app.models.agent import Agent, ActionType, DecisionContext
+from app.models.memory import EntryKind
+from app.core.config import settings
+from app.core.metrics import MetricsPhaseTimer, registry
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 睡眠期间会触发处理的时刻（当天分钟数）：00:00 反思、07:00 唤醒
+_EVENT_MINUTES = (0, 7 * 60)
+# 夜间强制入睡的时段（当天分钟数）：22:00 - 06:00
+_NIGHT_START, _NIGHT_END = 22 * 60, 6 * 60
 
 class WorldEngine:
-    def __init__(self):
+    def __init__(self, decision_concurrency: Optional[int] = None, fast_forward: Optional[bool] = None,
+                 use_scheduler: Optional[bool] = None):
         self.time_system = TimeSystem()
+        # 推进世界与修改世界（创建 Agent、注入事件、重置）的请求互斥
+        self.lock = threading.RLock()
+        # 单调递增的 Tick 计数（经 tick_count 属性同步给 StatsStore 作修改时间戳）
+        self._tick_count = 0
         self.map_system = MapSystem()
         self.state_dynamics = StateDynamics(self.map_system)
         self.perception_filter = PerceptionFilter(self.time_system)
+        
+        # 决策并发上限与线程池（首次需要并发时再创建）
+        self.decision_concurrency = (
+            decision_concurrency if decision_concurrency is not None else settings.DECISION_CONCURRENCY
+        )
+        self._decision_executor: Optional[ThreadPoolExecutor] = None
+        
+        # 没有 Agent 需要决策时，直接跳到下一个事件（决策到期 / 午夜反思 / 07:00 唤醒）
+        self.fast_forward = settings.FAST_FORWARD_IDLE if fast_forward is None else fast_forward
+        
+        # 动作调度：Agent 只在当前动作结束或被事件打断时决策
+        if use_scheduler is None:
+            use_scheduler = settings.ACTION_SCHEDULER_ENABLED
+        self.scheduler: Optional[DecisionScheduler] = DecisionScheduler() if use_scheduler else None
+        
+        # 午夜归档的长期记忆写入缓冲，整批写入
+        self.memory_buffer = MemoryWriteBuffer()
+        
+        # 只追加的决策日志，缓冲满或午夜时整批写入
+        self.journal = DecisionJournal()
+        
+        # 午夜反思并发发起，结果在之后的 Tick 中到达时再应用
+        self.reflection_concurrency = settings.REFLECTION_CONCURRENCY
+        self.reflection_timeout = settings.REFLECTION_TIMEOUT
+        self._reflection_executor: Optional[ThreadPoolExecutor] = None
+        # agent_id -> (future, agent, 当日日志, 截止时间, 截断日志时的 Tick)
+        self._pending_reflections: Dict[str, Tuple[Future, Agent, str, float, int]] = {}
+        
+        # 每推进一次（单 Tick 或一次快进）后调用的监听器，在模拟线程中执行
+        self._tick_listeners: List[Callable[["WorldEngine"], None]] = []
+        
+        # 决策记忆上下文的 token 预算压缩（所有 Agent 共享统计）
+        self.context_builder: Optional[ContextBuilder] = (
+            ContextBuilder() if settings.MEMORY_CONTEXT_TOKEN_BUDGET > 0 else None
+        )
+        
+        # 可选的分阶段计时器（PhaseTimer），为 None 时不计时
+        self.phase_timer = None
+        if settings.METRICS_ENABLED:
+            self._enable_metrics()
+        
+        # 所有 LLM 大脑共享的决策缓存（可选）
+        self.decision_cache: Optional[DecisionCache] = None
+        if settings.DECISION_CACHE_ENABLED:
+            self.decision_cache = DecisionCache(
+                max_size=settings.DECISION_CACHE_SIZE,
+                ttl_seconds=settings.DECISION_CACHE_TTL,
+                bypass_probability=settings.DECISION_CACHE_BYPASS_PROB
+            )
+        
+        # 所有 LLM 大脑共享的熔断器与退回规则决策的计数
+        self.circuit_breaker = CircuitBreaker()
+        self.brain_fallbacks = FallbackCounter()
+        # 单个大脑抛出异常时，只有该 Agent 退回规则决策
+        self._rule_brain = AgentBrain(use_mock=True)
+        # 每个 Tick 决策阶段的截止时间（秒），<= 0 表示不限
+        self.decision_deadline = settings.DECISION_DEADLINE
+
+    def _enable_metrics(self):
+        """挂上写入直方图的计时器，并注册世界状态指标"""
+        self.phase_timer = MetricsPhaseTimer(registry)
+        registry.gauge("world_tick_count", "Ticks simulated since start", lambda: self.tick_count)
+        registry.gauge("world_agents", "Agents in the world", lambda: len(self.state_dynamics.store.slots))
+        registry.gauge("world_pending_reflections", "Reflections in flight", lambda: len(self._pending_reflections))
+
+    @property
+    def tick_count(self) -> int:
+        return self._tick_count
+
+    @tick_count.setter
+    def tick_count(self, value: int):
+        self._tick_count = value
+        self.state_dynamics.store.tick = value
+        self.journal.tick = value
+
+    def changes_since(self, since: Optional[int]) -> Tuple[bool, List[Agent], List[str]]:
+        """
+        增量查询：返回 (是否全量, Agent 列表, 已移除的 ID)。
+        since 为空、晚于当前 Tick 或早于已遗忘的移除记录时返回全量。
+        """
+        store = self.state_dynamics.store
+        store.stamp_stat_changes(settings.STREAM_STAT_PRECISION)
+        store.seal()
+        if since is None or since > self.tick_count or since < store.removal_horizon:
+            return True, self.get_all_agents(), []
+        return False, store.changed_since(since), store.removed_since(since)
 
     def create_agent(self, agent_id: str, x: int, y: int, use_mock_brain: bool = True) -> Agent:
         """创建并初始化一个完整的 Agent"""
         agent = Agent(id=agent_id, x=x, y=y, type="Agent")
+        return self.add_agent(agent, use_mock_brain=use_mock_brain)
+
+    def add_agent(self, agent: Agent, use_mock_brain: bool = True) -> Agent:
+        """为已构造好的 Agent（例如从检查点恢复的）接上意识层组件并加入世界"""
+        agent_id = agent.id
         
         # 创建意识层组件
-        memory = MemorySystem(agent_id=agent_id, use_mock=True)
-        brain = AgentBrain(use_mock=use_mock_brain)
+        memory = MemorySystem(agent_id=agent_id, use_mock=True, context_builder=self.context_builder)
+        brain = AgentBrain(use_mock=use_mock_brain, cache=self.decision_cache, agent_id=agent_id,
+                           breaker=self.circuit_breaker, fallbacks=self.brain_fallbacks)
         perception = PerceptionFilter(self.time_system)
         
         # 绑定到 Agent
-        agent.bind_soul(memory, brain, perception, self.map_system)
+        agent.bind_soul(memory, brain, perception, self.map_system, journal=self.journal)
         
-        # 注册到地图系统
+        # 注册到地图系统，并把数值接入状态存储
         self.map_system.register_entity(agent)
+        self.state_dynamics.bind_agent(agent)
+        
+        # 下一个 Tick 即做出第一次决策
+        if self.scheduler is not None:
+            self.scheduler.schedule(agent_id, self.tick_count)
         
         return agent
 
+    def remove_agent(self, agent_id: str) -> Optional[Agent]:
+        """把 Agent 移出世界（地图、状态存储、调度表），返回被移除的 Agent"""
+        agent = self.get_agent(agent_id)
+        if agent is None:
+            return None
+        self.map_system.unregister_entity(agent_id)
+        self.state_dynamics.release_agent(agent_id)
+        if self.scheduler is not None:
+            self.scheduler.remove(agent_id)
+        self._pending_reflections.pop(agent_id, None)
+        return agent
+
     def get_agent(self, agent_id: str) -> Optional[Agent]:
         """获取指定 Agent"""
         entity = self.map_system.entities.get(agent_id)
@@ -46,6 +181,7 @@ class WorldEngine:
         """推进一个时间片"""
         # 1. 时间推进
         current_time = self.time_system.tick()
+        self.tick_count += 1
         
         # 2. 检测夜间条件（22:00 - 06:00）
         is_night = self.time_system.is_night()
@@ -63,41 +199,315 @@ class WorldEngine:
             if current_time.hour == 7 and current_time.minute == 0:
                 if agent.is_sleeping:
                     agent.wake_up()
-            
-            # 应用当前动作的效果
-            self.state_dynamics.apply_action_effect(agent_id, agent.current_action)
+        
+        landed = self._collect_reflections()
+        midnight = current_time.hour == 0 and current_time.minute == 0
+        if landed or midnight:
+            self.memory_buffer.flush()
+        if midnight:
+            self.journal.flush()
+        
+        # 4. 批量应用当前动作的效果（StatsStore 中所有存活 Agent）
+        self.state_dynamics.apply_all()
+        self._interrupt_critical()
+        self._notify_tick()
 
     def run_agent_loop(self, ticks: int = 1):
         """运行 Agent 循环，驱动多个时间片"""
-        for _ in range(ticks):
-            # 1. 时间推进
-            current_time = self.time_system.tick()
+        remaining = ticks
+        while remaining > 0:
+            remaining -= self.advance(remaining)
+
+    def advance(self, limit: int) -> int:
+        """
+        推进一步：单个 Tick，或无人可决策时整段快进（不超过 limit 个 Tick）。
+        返回推进的 Tick 数；调用方可以在两步之间释放 world.lock。
+        """
+        # 无人可决策时整段快进到下一个事件之前
+        idle_ticks = self._idle_ticks(limit) if self.fast_forward else 0
+        if idle_ticks > 0:
+            self._fast_forward(idle_ticks)
+            return idle_ticks
+        
+        timer = self.phase_timer
+        if timer is not None:
+            started = time.perf_counter()
+        self._step()
+        if timer is not None:
+            timer.record("tick", time.perf_counter() - started)
+        return 1
+
+    def _step(self):
+        """推进一个时间片并执行完整的 Agent 循环"""
+        timer = self.phase_timer
+        if timer is not None:
+            started = time.perf_counter()
+        
+        # 1. 时间推进
+        current_time = self.time_system.tick()
+        self.tick_count += 1
+        scheduler = self.scheduler
+        
+        # 2. 检测夜间条件（22:00 - 06:00）
+        is_night = self.time_system.is_night()
+        
+        # 3. 遍历所有 Agent，处理昼夜并收集醒着的 Agent
+        awake_agents = []
+        for agent in self.get_all_agents():
+            if not agent.is_active:
+                continue
             
-            # 2. 检测夜间条件（22:00 - 06:00）
-            is_night = self.time_system.is_night()
+            # 夜间处理：强制睡眠和反思
+            if is_night:
+                self._handle_night_time(agent, current_time)
             
-            # 3. 遍历所有 Agent
-            for agent in self.get_all_agents():
-                if not agent.is_active:
-                    continue
-                
-                # 夜间处理：强制睡眠和反思
-                if is_night:
-                    self._handle_night_time(agent, current_time)
-                
-                # 早晨唤醒（07:00）
-                if current_time.hour == 7 and current_time.minute == 0:
-                    if agent.is_sleeping:
-                        agent.wake_up()
-                
-                # 执行决策（如果没睡觉）
-                if not agent.is_sleeping:
-                    agent.decide_and_act()
+            # 早晨唤醒（07:00）
+            if current_time.hour == 7 and current_time.minute == 0:
+                if agent.is_sleeping:
+                    agent.wake_up()
+                    if scheduler is not None:
+                        scheduler.interrupt(agent.id, self.tick_count)
             
-            # 4. 应用行动效果
-            for agent in self.get_all_agents():
-                if agent.is_active:
-                    self.state_dynamics.apply_action_effect(agent.id, agent.current_action)
+            if not agent.is_sleeping:
+                # 醒着却没有排期的 Agent（例如被外部唤醒）立即补排
+                if scheduler is not None and agent.id not in scheduler:
+                    scheduler.schedule(agent.id, self.tick_count)
+                awake_agents.append(agent)
+        
+        # 应用已到达的反思，归档的总结整批写入长期记忆
+        landed = self._collect_reflections()
+        midnight = current_time.hour == 0 and current_time.minute == 0
+        if landed or midnight:
+            self.memory_buffer.flush()
+        if midnight:
+            self.journal.flush()
+        
+        # 只有动作结束或被打断的 Agent 需要决策
+        if scheduler is not None:
+            due = set(scheduler.pop_due(self.tick_count))
+            awake_agents = [agent for agent in awake_agents if agent.id in due]
+        
+        if timer is not None:
+            timer.record("time", time.perf_counter() - started)
+        
+        # 执行决策（如果没睡觉）
+        self._run_decision_phase(awake_agents)
+        if self.journal.should_flush():
+            self.journal.flush()
+        
+        # 4. 批量应用行动效果（StatsStore 中所有存活 Agent）
+        if timer is not None:
+            started = time.perf_counter()
+        self.state_dynamics.apply_all()
+        self._interrupt_critical()
+        if timer is not None:
+            timer.record("effects", time.perf_counter() - started)
+        
+        self._notify_tick()
+
+    def add_tick_listener(self, listener: Callable[["WorldEngine"], None]):
+        if listener not in self._tick_listeners:
+            self._tick_listeners.append(listener)
+
+    def remove_tick_listener(self, listener: Callable[["WorldEngine"], None]):
+        if listener in self._tick_listeners:
+            self._tick_listeners.remove(listener)
+
+    def _notify_tick(self):
+        """通知监听器世界已推进；监听器的异常不影响模拟"""
+        for listener in list(self._tick_listeners):
+            try:
+                listener(self)
+            except Exception:
+                logger.exception("Tick listener %r failed", listener)
+
+    def _idle_ticks(self, limit: int) -> int:
+        """
+        计算从现在起可以跳过的 Tick 数，即下一个“有事发生”的 Tick 之前的空闲 Tick：
+        - 有 Agent 的决策到期（启用调度器时；未启用时醒着的 Agent 每个 Tick 都要决策）；
+        - 00:00 反思、07:00 唤醒；
+        - 有醒着的 Agent 时，夜间 Tick 会强制其入睡；
+        - 有 Agent 的数值跌破临界值（打断当前动作）。
+        事件 Tick 本身不跳过，交给 _step 正常处理。
+        """
+        scheduler = self.scheduler
+        awake = False
+        for agent in self.get_all_agents():
+            if agent.is_active and not agent.is_sleeping:
+                if scheduler is None or agent.id not in scheduler:
+                    return 0
+                awake = True
+        
+        if scheduler is not None:
+            next_due = scheduler.next_due()
+            if next_due is not None:
+                limit = min(limit, next_due - self.tick_count - 1)
+        critical = self.state_dynamics.ticks_until_critical()
+        if critical is not None:
+            limit = min(limit, critical - 1)
+        if limit <= 0:
+            return 0
+        
+        minutes_per_tick = self.time_system.minutes_per_tick
+        now = self.time_system.minute_of_day()
+        # 时间按天循环，1440 个 Tick 内没碰到事件就永远碰不到
+        for t in range(1, min(limit, 1440) + 1):
+            minute = (now + t * minutes_per_tick) % 1440
+            if minute in _EVENT_MINUTES:
+                return t - 1
+            if awake and (minute >= _NIGHT_START or minute < _NIGHT_END):
+                return t - 1
+        return limit
+
+    def _interrupt_critical(self):
+        """数值跌破临界值的醒着的 Agent 打断当前动作，下一个 Tick 重新决策"""
+        critical = self.state_dynamics.take_critical()
+        if self.scheduler is None:
+            return
+        for agent in critical:
+            if not agent.is_sleeping:
+                self.scheduler.interrupt(agent.id, self.tick_count)
+
+    def _fast_forward(self, ticks: int):
+        """跳过 ticks 个空闲 Tick，并以闭式一次性结算这段时间的动作效果"""
+        timer = self.phase_timer
+        if timer is not None:
+            started = time.perf_counter()
+        self.time_system.advance(ticks)
+        self.tick_count += ticks
+        if timer is not None:
+            advanced = time.perf_counter()
+            timer.record("time", advanced - started)
+        self.state_dynamics.apply_repeated(ticks)
+        self._interrupt_critical()
+        if timer is not None:
+            timer.record("effects", time.perf_counter() - advanced)
+        
+        # 快进期间到达的反思
+        if self._collect_reflections():
+            self.memory_buffer.flush()
+        
+        self._notify_tick()
+
+    def _run_decision_phase(self, agents: List[Agent]):
+        """
+        决策阶段：先为所有 Agent 采集感知与记忆，再并发调用决策引擎，
+        最后按 Agent 顺序依次执行结果，保证同样的决策输出得到同样的世界状态。
+        """
+        timer = self.phase_timer
+        pending: List[Tuple[Agent, DecisionContext]] = []
+        for agent in agents:
+            context = agent.prepare_decision(timer)
+            if context is not None:
+                pending.append((agent, context))
+        
+        if timer is not None:
+            started = time.perf_counter()
+        decisions = self._dispatch_decisions(pending)
+        if timer is not None:
+            dispatched = time.perf_counter()
+            timer.record("brain", dispatched - started)
+        
+        for (agent, _), decision in zip(pending, decisions):
+            agent.apply_decision(decision)
+            if self.scheduler is not None:
+                self._schedule_next_decision(agent, decision)
+        
+        if timer is not None:
+            timer.record("action", time.perf_counter() - dispatched)
+
+    def _schedule_next_decision(self, agent: Agent, decision):
+        """按动作时长安排下一次决策；睡眠没有固定时长，等唤醒时再排期"""
+        target = decision.target or {}
+        if hasattr(target, 'get') and 'x' in target and 'y' in target:
+            # 移动一步只占一个 Tick
+            ticks = 1
+        else:
+            ticks = self.state_dynamics.duration_ticks(decision.action, self.time_system.minutes_per_tick)
+        
+        if ticks is not None and not agent.is_sleeping:
+            self.scheduler.schedule(agent.id, self.tick_count + ticks)
+
+    def _dispatch_decisions(self, pending: List[Tuple[Agent, DecisionContext]]) -> list:
+        """
+        并发调用决策引擎，返回结果与 pending 顺序一致。
+        所有调用共享同一个截止时间，未能按时完成的 Agent 由大脑退回规则决策。
+        """
+        deadline = time.monotonic() + self.decision_deadline if self.decision_deadline > 0 else None
+        call = partial(self._call_brain, deadline=deadline)
+        
+        # Mock 大脑没有网络等待，直接顺序调用以省去线程切换
+        needs_pool = any(not getattr(agent._brain, "use_mock", False) for agent, _ in pending)
+        if self.decision_concurrency <= 1 or len(pending) <= 1 or not needs_pool:
+            return [call(item) for item in pending]
+        
+        if self._decision_executor is None:
+            self._decision_executor = ThreadPoolExecutor(
+                max_workers=self.decision_concurrency,
+                thread_name_prefix="decision"
+            )
+        # executor.map 按提交顺序返回结果；_call_brain 不抛出异常，一个 Agent 失败不影响其他 Agent
+        return list(self._decision_executor.map(call, pending))
+
+    def _call_brain(self, item: Tuple[Agent, DecisionContext], deadline: Optional[float] = None):
+        agent, context = item
+        try:
+            return agent._brain.decide_next_action(
+                context.perception_text, context.memory_context, context.stats,
+                cache_key=context.cache_key, deadline=deadline
+            )
+        except Exception:
+            logger.exception("Decision failed for agent %s, falling back to rules", agent.id)
+            self.brain_fallbacks.record(FallbackReason.ERROR)
+            return self._rule_brain._mock_decision(context.perception_text, context.stats)
+
+    def clear_agents(self):
+        """
+        移除所有 Agent：取消进行中的反思，写出缓冲中的记忆与决策日志，
+        再清空调度表、地图实体与数值存储。
+        """
+        for future, *_ in self._pending_reflections.values():
+            future.cancel()
+        self._pending_reflections.clear()
+        # 已做出的决策与归档照常写出，之后不再有旧 Agent 的记录
+        self.memory_buffer.flush()
+        self.journal.flush()
+        if self.scheduler is not None:
+            self.scheduler.clear()
+        self.map_system.clear_entities()
+        self.state_dynamics.release_all()
+
+    def advance_version(self, at_least: int = 0):
+        """
+        让 tick_count 越过 max(当前值, at_least) 一个 Tick，并把 removal_horizon 设为新值。
+        tick_count 是增量同步的版本号，只能前进；此前取得的 since 都会拿到全量快照。
+        """
+        self.tick_count = max(self.tick_count, at_least) + 1
+        self.state_dynamics.store.removal_horizon = self.tick_count
+
+    def reset(self):
+        """
+        清空世界：Agent、数值存储、调度表、进行中的反思，时间回到初始时刻。
+        tick_count 不归零而是越过一个 Tick（见 advance_version）。
+        """
+        self.clear_agents()
+        # 原地重置时钟，持有 time_system 引用的组件（感知过滤器等）继续有效
+        initial = TimeSystem()
+        self.time_system.current_time = initial.current_time
+        self.time_system.minutes_per_tick = initial.minutes_per_tick
+        self.advance_version()
+
+    def shutdown(self):
+        """等待进行中的反思、写出缓冲中的记忆与决策日志并释放线程池"""
+        self.drain_reflections()
+        self.memory_buffer.flush()
+        self.journal.flush()
+        if self._decision_executor is not None:
+            self._decision_executor.shutdown(wait=True)
+            self._decision_executor = None
+        if self._reflection_executor is not None:
+            self._reflection_executor.shutdown(wait=False, cancel_futures=True)
+            self._reflection_executor = None
 
     def _handle_night_time(self, agent: Agent, current_time):
         """处理夜间逻辑：强制睡眠和反思"""
@@ -105,29 +515,87 @@ class WorldEngine:
         if not agent.is_sleeping:
             agent.is_sleeping = True
             agent.current_action = ActionType.SLEEP
-            agent._memory.add_short_term("It's night time, I must sleep.")
+            agent._memory.add_short_term("It's night time, I must sleep.", tick=self.tick_count)
         
         # 在 00:00 触发反思机制
         if current_time.hour == 0 and current_time.minute == 0:
             self._trigger_reflection(agent)
 
     def _trigger_reflection(self, agent: Agent):
-        """触发 Agent 的反思机制"""
+        """触发 Agent 的反思机制（真实 LLM 大脑提交到反思线程池，不阻塞 Tick）"""
         if not agent._brain or not agent._memory:
             return
         
-        # 生成反思
-        reflection = agent._brain.reflect(agent.daily_log)
+        # 日志在此刻截断，之后的记录属于新的一天
+        daily_log = agent.daily_log
+        agent.daily_log = ""
+        cutoff = self.tick_count
         
-        # 更新价值观
-        agent.values = reflection
+        brain = agent._brain
+        if getattr(brain, "use_mock", False) or self.reflection_concurrency <= 1:
+            self._apply_reflection(agent, daily_log, brain.reflect(daily_log), cutoff)
+            return
         
-        # 归档记忆
-        summary = f"Daily Log: {agent.daily_log}\nReflection: {reflection}"
-        agent._memory.consolidate_daily(summary)
+        if self._reflection_executor is None:
+            self._reflection_executor = ThreadPoolExecutor(
+                max_workers=self.reflection_concurrency,
+                thread_name_prefix="reflection"
+            )
+        # 截止时间同时交给大脑：超时的请求由客户端中断，不会一直占用反思线程
+        deadline = time.monotonic() + self.reflection_timeout
+        future = self._reflection_executor.submit(brain.reflect, daily_log, deadline=deadline)
+        self._pending_reflections[agent.id] = (future, agent, daily_log, deadline, cutoff)
+
+    def _apply_reflection(self, agent: Agent, daily_log: str, reflection: Optional[str], cutoff: int):
+        """
+        更新价值观并归档记忆；reflection 为 None（超时或失败）时保留原价值观。
+        只清除 cutoff（触发反思的 Tick）及之前的短期记忆，反思迟到时新一天的记录保留。
+        """
+        if reflection is not None:
+            agent.values = reflection
+            summary = f"Daily Log: {daily_log}\nReflection: {reflection}"
+        else:
+            summary = f"Daily Log: {daily_log}"
+        agent._memory.consolidate_daily(summary, buffer=self.memory_buffer, until_tick=cutoff)
+
+    def _collect_reflections(self, wait: bool = False) -> int:
+        """
+        应用已完成或已超时的反思，返回处理的数量。
+        wait 为 True 时等待每个反思完成（至多到其截止时间）。
+        """
+        if not self._pending_reflections:
+            return 0
         
-        # 清空每日日志
-        agent.daily_log = ""
+        handled = 0
+        for agent_id, (future, agent, daily_log, deadline, cutoff) in list(self._pending_reflections.items()):
+            if wait and not future.done():
+                try:
+                    future.result(timeout=max(0.0, deadline - time.monotonic()))
+                except Exception:
+                    pass
+            
+            if future.done():
+                try:
+                    reflection = future.result()
+                except Exception:
+                    logger.exception("Reflection failed for agent %s", agent_id)
+                    reflection = None
+            elif time.monotonic() >= deadline:
+                future.cancel()
+                logger.warning("Reflection timed out for agent %s, keeping previous values", agent_id)
+                reflection = None
+            else:
+                continue
+            
+            del self._pending_reflections[agent_id]
+            self._apply_reflection(agent, daily_log, reflection, cutoff)
+            handled += 1
+        return handled
+
+    def drain_reflections(self):
+        """等待所有进行中的反思并写入记忆"""
+        if self._collect_reflections(wait=True):
+            self.memory_buffer.flush()
 
     def inject_event(self, event_type: str, description: str, target_agents: Optional[List[str]] = None):
         """注入全局事件"""
@@ -136,7 +604,14 @@ class WorldEngine:
         for agent_id in targets:
             agent = self.get_agent(agent_id)
             if agent and agent._memory:
-                agent._memory.add_short_term(f"[EVENT] {event_type}: {description}")
+                agent._memory.add_short_term(
+                    f"[EVENT] {event_type}: {description}", kind=EntryKind.EVENT, tick=self.tick_count
+                )
+                # 事件打断当前动作，醒着的 Agent 下一个 Tick 重新决策
+                if self.scheduler is not None and not agent.is_sleeping:
+                    self.scheduler.interrupt(agent_id, self.tick_count)
 
 # Singleton Instance
 world = WorldEngine()
+# LLM 调用统计按当前世界的模拟日期归档
+llm_telemetry.clock = lambda: world.time_system.current_time
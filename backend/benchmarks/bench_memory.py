@@ -0,0 +1,69 @@
+"""
+记忆系统基准：对比“每个 Agent 独立 Chroma 客户端 + 集合”（旧方案）与
+“进程共享客户端 + 单一多租户集合”（当前方案）创建 N 个 Agent 的耗时与内存占用。
+
+用法（在 backend 目录下）：
+    python -m benchmarks.bench_memory --agents 1000
+"""
+import argparse
+import json
+import multiprocessing
+import time
+from typing import Dict
+
+def _rss_mb() -> float:
+    """当前进程常驻内存（MB），仅支持 Linux /proc"""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+def _run_legacy(agents: int) -> Dict[str, float]:
+    import chromadb
+    from app.services.memory import MockEmbeddingFunction
+
+    base = _rss_mb()
+    start = time.perf_counter()
+    collections = []
+    for i in range(agents):
+        client = chromadb.Client()
+        collections.append(client.get_or_create_collection(
+            name=f"bench_legacy_{i}",
+            embedding_function=MockEmbeddingFunction()
+        ))
+    elapsed = time.perf_counter() - start
+    return {"seconds": elapsed, "rss_delta_mb": _rss_mb() - base}
+
+def _run_shared(agents: int) -> Dict[str, float]:
+    from app.services.memory import MemorySystem
+
+    base = _rss_mb()
+    start = time.perf_counter()
+    memories = [MemorySystem(agent_id=f"bench_{i}", use_mock=True) for i in range(agents)]
+    elapsed = time.perf_counter() - start
+    return {"seconds": elapsed, "rss_delta_mb": _rss_mb() - base}
+
+def _worker(mode: str, agents: int, queue):
+    runner = _run_legacy if mode == "legacy" else _run_shared
+    queue.put(runner(agents))
+
+def run(agents: int) -> Dict[str, Dict[str, float]]:
+    """每种方案在独立子进程中运行，避免互相影响内存统计"""
+    ctx = multiprocessing.get_context("spawn")
+    results = {}
+    for mode in ("legacy", "shared"):
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_worker, args=(mode, agents, queue))
+        proc.start()
+        results[mode] = queue.get()
+        proc.join()
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory system creation benchmark")
+    parser.add_argument("--agents", type=int, default=1000)
+    args = parser.parse_args()
+
+    results = run(args.agents)
+    print(json.dumps({"agents": args.agents, **results}, indent=2))
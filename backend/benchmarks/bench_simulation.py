@@ -0,0 +1,200 @@
+"""
+模拟性能基准：用 Mock 大脑驱动 WorldEngine，按 Agent 数量 x 地图尺寸组合测量
+ticks/sec、单 Tick 延迟 p50/p99、峰值 RSS 与各阶段耗时，结果写为 JSON 便于跨提交对比。
+
+每个组合在独立子进程中运行，峰值 RSS 互不干扰。
+
+用法（在 backend 目录下）：
+    python -m benchmarks.bench_simulation --agents 10 100 1000 --map-sizes 100 --ticks 240
+    python -m benchmarks.bench_simulation --agents 1000 --out new.json --compare old.json
+    python -m benchmarks.bench_simulation --agents 10000 --shards 4   # 按地图区域分片的多进程模式
+"""
+import argparse
+import json
+import multiprocessing
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+def _percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def _peak_rss_mb() -> float:
+    # Linux 上 ru_maxrss 单位为 KB，macOS 上为字节
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def run_case(agents: int, map_size: int, ticks: int, start_hour: int = 7, seed: int = 0,
+             shards: int = 0) -> Dict[str, Any]:
+    """在当前进程中运行一个组合（shards > 1 时由当前进程协调分片 worker）"""
+    from app.core.config import settings
+    settings.MAP_WIDTH = map_size
+    settings.MAP_HEIGHT = map_size
+
+    from app.core.profiling import PhaseTimer
+    from app.services.world import WorldEngine
+
+    rng = random.Random(seed)
+    setup_started = time.perf_counter()
+    world = WorldEngine()
+    world.time_system.current_time.hour = start_hour
+    world.time_system.current_time.minute = 0
+    if shards > 1:
+        return _run_sharded(world, rng, agents, map_size, ticks, shards)
+    for i in range(agents):
+        agent = world.create_agent(f"bench_{i}", x=rng.randrange(map_size), y=rng.randrange(map_size))
+        agent.stats.wealth = rng.uniform(0, 100)
+        agent.stats.energy = rng.uniform(10, 100)
+    setup_seconds = time.perf_counter() - setup_started
+
+    timer = PhaseTimer()
+    world.phase_timer = timer
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(ticks):
+        tick_started = time.perf_counter()
+        world.run_agent_loop(1)
+        latencies.append(time.perf_counter() - tick_started)
+    elapsed = time.perf_counter() - started
+
+    return {
+        "agents": agents,
+        "map_size": map_size,
+        "ticks": ticks,
+        "setup_seconds": setup_seconds,
+        "elapsed_seconds": elapsed,
+        "ticks_per_sec": ticks / elapsed if elapsed > 0 else 0.0,
+        "tick_p50_ms": _percentile(latencies, 50) * 1000,
+        "tick_p99_ms": _percentile(latencies, 99) * 1000,
+        "peak_rss_mb": _peak_rss_mb(),
+        "phases": timer.snapshot(),
+    }
+
+def _run_sharded(world, rng: random.Random, agents: int, map_size: int, ticks: int, shards: int) -> Dict[str, Any]:
+    from app.services.sharding import ShardedWorld
+
+    setup_started = time.perf_counter()
+    with ShardedWorld(world, shards=shards) as sharded:
+        for i in range(agents):
+            sharded.create_agent(
+                f"bench_{i}", x=rng.randrange(map_size), y=rng.randrange(map_size),
+                stats={"wealth": rng.uniform(0, 100), "energy": rng.uniform(10, 100)}
+            )
+        setup_seconds = time.perf_counter() - setup_started
+
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(ticks):
+            tick_started = time.perf_counter()
+            sharded.step(1)
+            latencies.append(time.perf_counter() - tick_started)
+        elapsed = time.perf_counter() - started
+        handoffs = sharded.handoffs
+
+    return {
+        "agents": agents,
+        "map_size": map_size,
+        "ticks": ticks,
+        "shards": shards,
+        "setup_seconds": setup_seconds,
+        "elapsed_seconds": elapsed,
+        "ticks_per_sec": ticks / elapsed if elapsed > 0 else 0.0,
+        "tick_p50_ms": _percentile(latencies, 50) * 1000,
+        "tick_p99_ms": _percentile(latencies, 99) * 1000,
+        # 只含协调进程，worker 进程的内存不计入
+        "peak_rss_mb": _peak_rss_mb(),
+        "handoffs": handoffs,
+        "phases": {},
+    }
+
+def _worker(queue, kwargs):
+    queue.put(run_case(**kwargs))
+
+def run_isolated(**kwargs) -> Dict[str, Any]:
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_worker, args=(queue, kwargs))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """按 (agents, map_size, ticks) 对齐，输出 ticks/sec 与 p99 的变化"""
+    key = lambda r: (r["agents"], r["map_size"], r["ticks"], r.get("shards", 0))
+    previous = {key(r): r for r in baseline.get("results", [])}
+    lines = []
+    for result in current["results"]:
+        old = previous.get(key(result))
+        if old is None:
+            continue
+        speedup = result["ticks_per_sec"] / old["ticks_per_sec"] if old["ticks_per_sec"] else float("inf")
+        lines.append(
+            f"agents={result['agents']:>7} map={result['map_size']:>5} ticks={result['ticks']:>5}  "
+            f"ticks/sec {old['ticks_per_sec']:.1f} -> {result['ticks_per_sec']:.1f} ({speedup:.2f}x)  "
+            f"p99 {old['tick_p99_ms']:.2f} -> {result['tick_p99_ms']:.2f} ms"
+        )
+    return lines
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="WorldEngine simulation benchmark")
+    parser.add_argument("--agents", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--map-sizes", type=int, nargs="+", default=[100])
+    parser.add_argument("--ticks", type=int, default=240)
+    parser.add_argument("--start-hour", type=int, default=7)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--shards", type=int, default=0, help="按地图区域分片的 worker 进程数（<= 1 为单进程）")
+    parser.add_argument("--out", help="写入 JSON 结果的路径")
+    parser.add_argument("--compare", help="与之前的 JSON 结果对比")
+    parser.add_argument("--in-process", action="store_true", help="不启动子进程（峰值 RSS 会累积）")
+    args = parser.parse_args(argv)
+
+    runner = run_case if args.in_process else run_isolated
+    results = []
+    for map_size in args.map_sizes:
+        for agents in args.agents:
+            result = runner(agents=agents, map_size=map_size, ticks=args.ticks,
+                            start_hour=args.start_hour, seed=args.seed, shards=args.shards)
+            results.append(result)
+            print(
+                f"agents={agents:>7} map={map_size:>5}  {result['ticks_per_sec']:10.1f} ticks/sec  "
+                f"p50={result['tick_p50_ms']:.2f}ms p99={result['tick_p99_ms']:.2f}ms  "
+                f"rss={result['peak_rss_mb']:.0f}MB",
+                flush=True
+            )
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        for line in compare(report, baseline):
+            print(line)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+本地 OpenAI 兼容的桩 LLM 服务，用于离线压测 AgentBrain 与 Embedding 链路。
+
+提供 /chat/completions 与 /embeddings（同时挂在 /v1 前缀下），支持：
+- 延迟分布：fixed / uniform / lognormal
+- 错误注入：按比例返回 500 或 429
+- 超时注入：按比例挂起请求 hang_seconds 秒
+- 规则决策：从提示词中的状态 JSON 解析 energy / wealth，返回合法的动作 JSON
+
+用法（在 backend 目录下）：
+    python -m benchmarks.stub_llm_server --port 8001 --latency lognormal --latency-ms 400
+    LLM_BASE_URL=http://127.0.0.1:8001/v1 LLM_API_KEY=stub uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import random
+import re
+import time
+import uuid
+from typing import Any, Dict, List, Literal, Optional, Union
+
+import numpy as np
+from fastapi import APIRouter, FastAPI, Request
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+class StubConfig(BaseModel):
+    latency: Literal["fixed", "uniform", "lognormal"] = "fixed"
+    # fixed: 固定值；uniform: [latency_ms, latency_max_ms]；lognormal: 中位数为 latency_ms
+    latency_ms: float = 0.0
+    latency_max_ms: float = 0.0
+    latency_sigma: float = 0.5
+    error_rate: float = 0.0
+    # 注入的错误中 429 所占比例，其余为 500
+    rate_limit_share: float = 0.5
+    timeout_rate: float = 0.0
+    hang_seconds: float = 120.0
+    embedding_dim: int = 64
+    seed: Optional[int] = None
+
+class StubStats:
+    """请求计数，便于压测结束后与客户端统计对账"""
+
+    def __init__(self):
+        self.requests: Dict[str, int] = {"chat": 0, "embeddings": 0}
+        self.errors: Dict[int, int] = {}
+        self.hangs = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"requests": dict(self.requests), "errors": dict(self.errors), "hangs": self.hangs}
+
+_STAT_PATTERN = r'"{name}"\s*:\s*(-?\d+(?:\.\d+)?)'
+
+def parse_stat(text: str, name: str, default: float) -> float:
+    """从提示词里的状态 JSON 中取出某个数值"""
+    match = re.search(_STAT_PATTERN.format(name=name), text)
+    return float(match.group(1)) if match else default
+
+def rule_based_action(prompt: str) -> Dict[str, Any]:
+    """与 AgentBrain._mock_decision 相同的规则，输出 LLM 的 JSON 格式"""
+    energy = parse_stat(prompt, "energy", 100.0)
+    wealth = parse_stat(prompt, "wealth", 0.0)
+    if energy < 20:
+        return {"action": "SLEEP", "thought": "I am too tired. I need to sleep."}
+    if wealth < 50:
+        return {"action": "WORK_996", "thought": "I am broke. I need to work hard."}
+    return {"action": "REST_PARK", "thought": "I have some money and energy. I will chill at the park."}
+
+def fake_embedding(text: str, dim: int) -> np.ndarray:
+    """由文本哈希确定的单位向量（相同文本得到相同向量）"""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+def _count_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+def create_app(config: Optional[StubConfig] = None) -> FastAPI:
+    config = config or StubConfig()
+    rng = random.Random(config.seed)
+    stats = StubStats()
+
+    def sample_latency() -> float:
+        if config.latency == "uniform":
+            return rng.uniform(config.latency_ms, max(config.latency_ms, config.latency_max_ms)) / 1000
+        if config.latency == "lognormal":
+            if config.latency_ms <= 0:
+                return 0.0
+            return rng.lognormvariate(np.log(config.latency_ms), config.latency_sigma) / 1000
+        return config.latency_ms / 1000
+
+    async def inject_faults() -> Optional[JSONResponse]:
+        """模拟延迟；命中错误注入时返回错误响应"""
+        delay = sample_latency()
+        if config.timeout_rate > 0 and rng.random() < config.timeout_rate:
+            stats.hangs += 1
+            delay = config.hang_seconds
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if config.error_rate > 0 and rng.random() < config.error_rate:
+            status = 429 if rng.random() < config.rate_limit_share else 500
+            stats.errors[status] = stats.errors.get(status, 0) + 1
+            kind = "rate_limit_exceeded" if status == 429 else "server_error"
+            return JSONResponse(
+                status_code=status,
+                content={"error": {"message": f"Injected {kind}", "type": kind, "code": status}}
+            )
+        return None
+
+    router = APIRouter()
+
+    @router.post("/chat/completions")
+    async def chat_completions(request: Request):
+        stats.requests["chat"] += 1
+        body = await request.json()
+        failure = await inject_faults()
+        if failure is not None:
+            return failure
+
+        messages: List[Dict[str, Any]] = body.get("messages", [])
+        prompt = "\n".join(str(m.get("content", "")) for m in messages)
+        if body.get("response_format", {}).get("type") == "json_object":
+            content = json.dumps(rule_based_action(prompt))
+        else:
+            # 反思等自由文本请求
+            content = "Health is wealth."
+
+        prompt_tokens = _count_tokens(prompt)
+        completion_tokens = _count_tokens(content)
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    @router.post("/embeddings")
+    async def embeddings(request: Request):
+        stats.requests["embeddings"] += 1
+        body = await request.json()
+        failure = await inject_faults()
+        if failure is not None:
+            return failure
+
+        inputs: Union[str, List[str]] = body.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        as_base64 = body.get("encoding_format") == "base64"
+        dim = body.get("dimensions") or config.embedding_dim
+
+        data = []
+        for index, text in enumerate(inputs):
+            vector = fake_embedding(str(text), dim)
+            embedding = base64.b64encode(vector.tobytes()).decode("ascii") if as_base64 else vector.tolist()
+            data.append({"object": "embedding", "index": index, "embedding": embedding})
+
+        tokens = sum(_count_tokens(str(text)) for text in inputs)
+        return {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "stub-embedding"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    @router.get("/models")
+    def list_models():
+        return {"object": "list", "data": [{"id": "stub", "object": "model", "owned_by": "stub"}]}
+
+    app = FastAPI(title="Stub LLM")
+    # 兼容 LLM_BASE_URL 带或不带 /v1
+    app.include_router(router)
+    app.include_router(router, prefix="/v1")
+
+    @app.get("/stub/stats")
+    def stub_stats():
+        return stats.as_dict()
+
+    app.state.config = config
+    app.state.stats = stats
+    return app
+
+def main(argv: Optional[List[str]] = None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", choices=["fixed", "uniform", "lognormal"], default="fixed")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--latency-max-ms", type=float, default=0.0)
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-share", type=float, default=0.5)
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--hang-seconds", type=float, default=120.0)
+    parser.add_argument("--embedding-dim", type=int, default=64)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    config = StubConfig(**{k: v for k, v in vars(args).items() if k not in ("host", "port")})
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -96,4 +96,116 @@ def test_agent_wake_up():
     
     # 运行 tick，时间推进到 07:00，系统应自动唤醒 Agent
     world_engine.tick()
-    assert agent.is_sleeping == False
\ No newline at end of file
+    assert agent.is_sleeping == False
+
+def test_concurrent_decision_dispatch():
+    """测试决策阶段并发调用大脑，并按 Agent 顺序执行结果；单个大脑异常只影响该 Agent"""
+    import threading
+    import time
+    from app.services.brain import ActionDecision
+    
+    actions = [ActionType.WORK_996, ActionType.REST_PARK, ActionType.WORK_965, ActionType.CONSUME_ENT] * 2
+    # 所有调用都到达屏障后才能返回：顺序调用时第一个调用就会超时
+    barrier = threading.Barrier(len(actions), timeout=5)
+    
+    class SlowBrain:
+        use_mock = False
+        
+        def __init__(self, action, delay, fail=False):
+            self.action = action
+            self.delay = delay
+            self.fail = fail
+        
+        def decide_next_action(self, perception_text, memory_context, stats, cache_key=None, deadline=None):
+            barrier.wait()
+            time.sleep(self.delay)
+            if self.fail:
+                raise RuntimeError("brain crashed")
+            return ActionDecision(action=self.action, thought=threading.current_thread().name)
+    
+    world_engine = WorldEngine(decision_concurrency=8)
+    agents = []
+    for i, action in enumerate(actions):
+        agent = world_engine.create_agent(agent_id=f"parallel_{i}", x=i, y=0)
+        # 越靠前的 Agent 返回越慢，验证结果仍按顺序落地
+        agent._brain = SlowBrain(action, delay=0.05 - i * 0.005)
+        agents.append(agent)
+    
+    world_engine.run_agent_loop(ticks=1)
+    assert [a.current_action for a in agents] == actions
+    assert all("decision" in a._memory.get_recent_context() for a in agents)
+    
+    # 一个大脑抛出异常：该 Agent 退回规则决策，其余照常
+    barrier.reset()
+    agents[2]._brain.fail = True
+    for agent in agents:
+        world_engine.scheduler.schedule(agent.id, world_engine.tick_count)
+    world_engine.run_agent_loop(ticks=1)
+    world_engine.shutdown()
+    assert [a.current_action for i, a in enumerate(agents) if i != 2] == actions[:2] + actions[3:]
+    assert agents[2].current_action == ActionType.WORK_996
+    assert world_engine.brain_fallbacks.stats()["by_reason"]["error"] == 1
+
+def test_parallel_midnight_reflection():
+    """午夜反思并发发起，不阻塞 Tick；结果到达后再应用，失败或超时保留原价值观"""
+    import threading
+    import time
+    
+    release = threading.Event()
+    
+    class SlowReflectBrain:
+        use_mock = False
+        
+        def __init__(self, fail=False):
+            self.fail = fail
+        
+        def reflect(self, daily_log, deadline=None):
+            # 在测试放行前阻塞，但不超过世界给出的截止时间
+            if not release.wait(timeout=max(0.0, deadline - time.monotonic())):
+                raise TimeoutError("reflection deadline passed")
+            if self.fail:
+                raise RuntimeError("LLM unavailable")
+            return f"Reflected: {daily_log}"
+    
+    world_engine = WorldEngine()
+    agents = []
+    for i in range(4):
+        agent = world_engine.create_agent(agent_id=f"reflect_{i}", x=i, y=0)
+        agent._brain = SlowReflectBrain(fail=(i == 3))
+        agent.values = "Old values"
+        agent.daily_log = f"day {i}"
+        agents.append(agent)
+    world_engine.time_system.current_time.hour = 23
+    world_engine.time_system.current_time.minute = 59
+    
+    # 反思仍被阻塞时 Tick 已经返回，结果尚未应用
+    world_engine.run_agent_loop(ticks=1)
+    pending = [entry[0] for entry in world_engine._pending_reflections.values()]
+    assert len(pending) == 4 and not any(f.done() for f in pending)
+    assert all(a.values == "Old values" and a.daily_log == "" for a in agents)
+    
+    # 反思到达前写入的新一天记录，归档时不会被清除
+    midnight = world_engine.tick_count
+    agents[0]._memory.add_short_term("New day note", tick=midnight + 1)
+    
+    release.set()
+    world_engine.drain_reflections()
+    assert [e.content for e in agents[0]._memory.short_term_memory] == ["New day note"]
+    assert [a.values for a in agents[:3]] == [f"Reflected: day {i}" for i in range(3)]
+    assert agents[3].values == "Old values"
+    assert all(a._memory.collection.count() == 1 for a in agents)
+    
+    # 超时：下一个 Tick 放弃等待，日志照常归档；大脑拿到同一截止时间，不再占用线程
+    release.clear()
+    slow = world_engine.create_agent(agent_id="reflect_slow", x=9, y=0)
+    slow._brain = SlowReflectBrain()
+    slow.values = "Old values"
+    world_engine.reflection_timeout = 0.0
+    world_engine._trigger_reflection(slow)
+    future = world_engine._pending_reflections["reflect_slow"][0]
+    world_engine.run_agent_loop(ticks=1)
+    assert not world_engine._pending_reflections
+    assert slow.values == "Old values"
+    assert slow._memory.collection.count() == 1
+    assert future.cancelled() or isinstance(future.exception(timeout=5), TimeoutError)
+    world_engine.shutdown()
@@ -21,3 +21,269 @@ def test_get_world_status():
     # Check if time format matches
     # "2024-01-01 07:00"
     assert "2024" in data["time"]
+
+def test_background_tick_job():
+    """POST /admin/world/tick 启动后台任务，可查询进度与取消"""
+    import time
+    
+    start_tick = world.tick_count
+    response = client.post("/api/v1/admin/world/tick", json={"ticks": 30})
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    
+    for _ in range(500):
+        job = client.get(f"/api/v1/admin/world/jobs/{job_id}").json()
+        if job["status"] == "completed":
+            break
+        time.sleep(0.01)
+    assert job["status"] == "completed"
+    assert job["ticks_done"] == 30
+    assert world.tick_count == start_tick + 30
+    assert job["current_time"] == str(world.time_system.get_current_time())
+    
+    assert client.get("/api/v1/admin/world/jobs/missing").status_code == 404
+    assert client.post("/api/v1/admin/world/tick", json={"ticks": 0}).status_code == 422
+
+def test_tick_job_releases_lock_every_tick():
+    """后台任务每个 Tick 单独持有 world.lock，读请求不必等待整段"""
+    import threading
+    import time
+    from app.services.jobs import JobManager
+    from app.services.world import WorldEngine
+    
+    class CountingLock:
+        def __init__(self):
+            self._lock = threading.RLock()
+            self.acquired = 0
+        
+        def __enter__(self):
+            self._lock.acquire()
+            self.acquired += 1
+        
+        def __exit__(self, *exc):
+            self._lock.release()
+    
+    engine = WorldEngine(fast_forward=False)
+    engine.create_agent("lock_agent", x=0, y=0)
+    engine.lock = CountingLock()
+    manager = JobManager(engine, chunk_size=10)
+    job = manager.start(25)
+    for _ in range(500):
+        if job.is_finished:
+            break
+        time.sleep(0.01)
+    assert job.status == "completed"
+    assert job.ticks_done == 25
+    assert engine.lock.acquired == 25
+
+def test_background_tick_job_cancel_and_conflict():
+    """同一时间只允许一个任务；取消后任务在当前段结束时停止"""
+    import time
+    
+    with world.lock:
+        # 持有世界锁，任务停在第一段之前
+        job_id = client.post("/api/v1/admin/world/tick", json={"ticks": 100000}).json()["job_id"]
+        conflict = client.post("/api/v1/admin/world/tick", json={"ticks": 1})
+        assert conflict.status_code == 409
+        cancelled = client.post(f"/api/v1/admin/world/jobs/{job_id}/cancel")
+        assert cancelled.status_code == 200
+    
+    for _ in range(500):
+        job = client.get(f"/api/v1/admin/world/jobs/{job_id}").json()
+        if job["status"] != "running" and job["status"] != "pending":
+            break
+        time.sleep(0.01)
+    assert job["status"] == "cancelled"
+    assert job["ticks_done"] < 100000
+
+def test_world_stream_websocket():
+    """/world/stream 先推送全量快照，之后每次推进只推送有变化的 Agent"""
+    import json
+    
+    with world.lock:
+        world.create_agent("stream_agent", x=3, y=4)
+    
+    with client.websocket_connect("/api/v1/world/stream") as websocket:
+        snapshot = json.loads(websocket.receive_text())
+        assert snapshot["type"] == "snapshot"
+        assert any(a["id"] == "stream_agent" for a in snapshot["agents"])
+        
+        with world.lock:
+            world.time_system.current_time.hour = 9
+            world.run_agent_loop(1)
+        delta = json.loads(websocket.receive_text())
+        assert delta["type"] == "delta"
+        assert delta["tick"] == world.tick_count
+        
+        # 移动后的增量带上新坐标
+        with world.lock:
+            world.map_system.update_entity_position("stream_agent", (5, 5))
+            world.tick()
+        delta = json.loads(websocket.receive_text())
+        changed = {a["id"]: a for a in delta["agents"]}
+        assert (changed["stream_agent"]["x"], changed["stream_agent"]["y"]) == (5, 5)
+
+def test_stream_subscriber_backpressure():
+    """慢客户端的队列满后丢弃积压，下一次广播改发全量快照"""
+    import asyncio
+    import json
+    from app.services.stream import WorldBroadcaster
+    from app.services.world import WorldEngine
+    
+    engine = WorldEngine()
+    engine.create_agent("slow_client_agent", x=0, y=0)
+    broadcaster = WorldBroadcaster(engine, max_queue=2)
+    
+    async def scenario():
+        subscriber, snapshot = broadcaster.subscribe(asyncio.get_running_loop())
+        for _ in range(3):
+            engine.tick()
+            await asyncio.sleep(0)
+        assert subscriber.needs_resync and subscriber.queue.empty()
+        
+        engine.tick()
+        await asyncio.sleep(0)
+        message = json.loads(subscriber.queue.get_nowait())
+        assert message["type"] == "snapshot"
+        broadcaster.unsubscribe(subscriber)
+    
+    asyncio.run(scenario())
+
+def test_stream_delta_uses_store_stamps():
+    """推送增量与 /world/diff 同源：移除记录随增量下发，重置后改发全量快照"""
+    import asyncio
+    import json
+    from app.services.stream import WorldBroadcaster
+    from app.services.world import WorldEngine
+    
+    engine = WorldEngine()
+    engine.create_agent("stamp_a", x=0, y=0)
+    engine.create_agent("stamp_b", x=1, y=1)
+    broadcaster = WorldBroadcaster(engine, max_queue=8)
+    
+    async def scenario():
+        subscriber, snapshot = broadcaster.subscribe(asyncio.get_running_loop())
+        since = engine.tick_count
+        engine.remove_agent("stamp_b")
+        engine.tick()
+        await asyncio.sleep(0)
+        delta = json.loads(subscriber.queue.get_nowait())
+        full, agents, removed = engine.changes_since(since)
+        assert delta["type"] == "delta" and delta["removed"] == removed == ["stamp_b"]
+        assert [a["id"] for a in delta["agents"]] == [a.id for a in agents]
+        
+        engine.reset()
+        engine.create_agent("stamp_c", x=2, y=2)
+        engine.tick()
+        await asyncio.sleep(0)
+        message = json.loads(subscriber.queue.get_nowait())
+        assert message["type"] == "snapshot"
+        assert [a["id"] for a in message["agents"]] == ["stamp_c"]
+        broadcaster.unsubscribe(subscriber)
+    
+    asyncio.run(scenario())
+
+def test_world_diff_since():
+    """/world/diff?since= 只返回之后修改过的 Agent 与移除记录，过旧时返回全量"""
+    from app.services.world import WorldEngine
+    
+    engine = WorldEngine()
+    store = engine.state_dynamics.store
+    store.removals = type(store.removals)(maxlen=2)
+    a = engine.create_agent("diff_a", x=0, y=0)
+    b = engine.create_agent("diff_b", x=1, y=0)
+    
+    full, agents, removed = engine.changes_since(None)
+    assert full and {x.id for x in agents} == {"diff_a", "diff_b"}
+    since = engine.tick_count
+    
+    engine.tick_count += 1
+    b.x = 5
+    full, agents, removed = engine.changes_since(since)
+    assert not full
+    assert [x.id for x in agents] == ["diff_b"]
+    
+    # 数值变化在查询时按精度比较
+    since = engine.tick_count
+    engine.tick_count += 1
+    a.stats.energy -= 0.01
+    assert engine.changes_since(since)[1] == []
+    a.stats.energy -= 5
+    assert [x.id for x in engine.changes_since(since)[1]] == ["diff_a"]
+    
+    # 移除记录
+    since = engine.tick_count
+    engine.tick_count += 1
+    engine.map_system.unregister_entity("diff_a")
+    engine.state_dynamics.release_agent("diff_a")
+    full, agents, removed = engine.changes_since(since)
+    assert not full and removed == ["diff_a"]
+    
+    # 移除日志溢出后，早于遗忘记录的 since 退回全量
+    for i in range(3):
+        engine.tick_count += 1
+        engine.create_agent(f"diff_tmp_{i}", x=2, y=2)
+        engine.state_dynamics.release_agent(f"diff_tmp_{i}")
+    assert engine.changes_since(since)[0] is True
+    assert engine.changes_since(engine.tick_count + 10)[0] is True
+    
+    response = client.get("/api/v1/world/diff", params={"since": world.tick_count})
+    assert response.status_code == 200
+    assert response.json()["type"] == "delta"
+    assert client.get("/api/v1/world/diff").json()["type"] == "snapshot"
+
+def test_world_reset_clears_engine_state():
+    """重置清空调度表与进行中的反思，重置前的 since 只能拿到全量快照"""
+    from concurrent.futures import Future
+    from app.services.world import WorldEngine
+    
+    engine = WorldEngine()
+    agent = engine.create_agent("reset_agent", x=0, y=0)
+    engine.run_agent_loop(3)
+    engine._pending_reflections["reset_agent"] = (Future(), agent, "log", 0.0, 0)
+    since = engine.tick_count
+    
+    engine.reset()
+    assert engine.get_all_agents() == []
+    assert engine.scheduler is None or len(engine.scheduler) == 0
+    assert engine._pending_reflections == {}
+    assert str(engine.time_system.get_current_time()) == "2024-01-01 07:00"
+    
+    engine.create_agent("reset_new", x=1, y=1)
+    full, agents, removed = engine.changes_since(since)
+    assert full and [a.id for a in agents] == ["reset_new"]
+    assert engine.changes_since(engine.tick_count)[0] is False
+    
+    assert client.get("/api/v1/admin/world/reset").status_code == 200
+    assert world.get_all_agents() == []
+
+def test_checkpoint_manager_built_in_lifespan(tmp_path, monkeypatch):
+    """检查点管理器在应用启动时创建、退出时注销并关闭，导入模块不注册监听器"""
+    from app.core.config import settings
+    
+    monkeypatch.setattr(settings, "CHECKPOINT_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "CHECKPOINT_RESTORE_ON_START", False)
+    listeners = list(world._tick_listeners)
+    with TestClient(app) as lifespan_client:
+        manager = app.state.checkpoint_manager
+        assert manager.on_tick in world._tick_listeners
+        response = lifespan_client.post("/api/v1/admin/world/checkpoint", params={"full": True})
+        assert response.status_code == 200 and response.json()["kind"] == "base"
+        assert lifespan_client.post("/api/v1/admin/world/restore").status_code == 200
+    assert world._tick_listeners == listeners
+
+def test_admin_metrics_endpoint(monkeypatch):
+    """/admin/metrics：关闭时 404，开启后输出 Prometheus 文本"""
+    from app.core.config import settings
+    from app.core.metrics import registry
+    
+    response = client.get("/api/v1/admin/metrics")
+    assert response.status_code == 404
+    
+    monkeypatch.setattr(settings, "METRICS_ENABLED", True)
+    registry.histogram("test_latency_seconds", "Test latency").observe(0.003)
+    response = client.get("/api/v1/admin/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'test_latency_seconds_bucket{le="0.005"} 1' in response.text
+    assert "test_latency_seconds_count 1" in response.text
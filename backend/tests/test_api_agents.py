@@ -54,6 +54,30 @@ def test_get_agent_thought():
     assert "timestamp" in data
     assert "action" in data
 
+def test_get_agent_thoughts_bulk():
+    """批量获取最新思维：一次返回多个 Agent，未知 ID 被忽略"""
+    thinker = world.create_agent("api_test_bulk_1", 0, 0)
+    world.create_agent("api_test_bulk_2", 1, 0)
+    thinker.stats.wealth = 0
+    thinker.decide_and_act()
+    # 之后的普通记录不影响最新想法
+    for _ in range(25):
+        thinker._memory.add_short_term("noise")
+    
+    response = client.get("/api/v1/agents/thoughts?ids=api_test_bulk_1,api_test_bulk_2,missing")
+    assert response.status_code == 200
+    
+    data = response.json()
+    assert "timestamp" in data
+    thoughts = {t["agent_id"]: t for t in data["thoughts"]}
+    assert set(thoughts) == {"api_test_bulk_1", "api_test_bulk_2"}
+    assert thoughts["api_test_bulk_1"]["content"] == "I am broke. I need to work hard."
+    assert thoughts["api_test_bulk_1"]["action"] == "WORK_996"
+    assert thoughts["api_test_bulk_2"]["content"] is None
+    
+    single = client.get("/api/v1/agents/api_test_bulk_1/thought").json()
+    assert single["content"] == thoughts["api_test_bulk_1"]["content"]
+
 def test_get_agent_history():
     """测试获取 Agent 的历史日记记录"""
     agent = world.create_agent("api_test_history", 0, 0)
@@ -83,4 +107,38 @@ def test_set_agent_action():
 def test_get_nonexistent_agent():
     """测试获取不存在的 Agent"""
     response = client.get("/api/v1/agents/nonexistent")
-    assert response.status_code == 404
\ No newline at end of file
+    assert response.status_code == 404
+
+def test_get_all_agents_projection_paging_etag():
+    """列表接口：字段投影、游标分页与条件 GET"""
+    for i in range(5):
+        world.create_agent(f"page_agent_{i}", i, 1)
+    
+    response = client.get("/api/v1/agents", params={"fields": "id,stats"})
+    assert response.status_code == 200
+    records = response.json()
+    assert all(set(r) == {"id", "stats"} for r in records)
+    page_agent = next(r for r in records if r["id"] == "page_agent_0")
+    assert page_agent["stats"] == world.get_agent("page_agent_0").stats.as_dict()
+    assert client.get("/api/v1/agents", params={"fields": "id,secret"}).status_code == 422
+    
+    # 逐页拉取与一次性拉取结果一致
+    all_ids = [r["id"] for r in client.get("/api/v1/agents", params={"fields": "id"}).json()]
+    paged_ids = []
+    params = {"fields": "id", "limit": 2}
+    while True:
+        page = client.get("/api/v1/agents", params=params)
+        paged_ids += [r["id"] for r in page.json()]
+        if "x-next-cursor" not in page.headers:
+            break
+        params["cursor"] = page.headers["x-next-cursor"]
+    assert paged_ids == all_ids
+    
+    # 世界没变化时返回 304，任何修改都会让 ETag 失效
+    etag = response.headers["etag"]
+    cached = client.get("/api/v1/agents", params={"fields": "id,stats"}, headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    world.get_agent("page_agent_0").stats.wealth += 1
+    changed = client.get("/api/v1/agents", params={"fields": "id,stats"}, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
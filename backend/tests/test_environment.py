@@ -2,7 +2,7 @@ import pytest
 from app.services.time_system import TimeSystem
 from app.services.map_system import MapSystem
 from app.models.map import TerrainType
-from app.models.agent import Agent, ActionType
+from app.models.agent import Agent, AgentStats, ActionType
 
 def test_time_flow_env_001():
     """ENV-001: 时间流逝测试"""
@@ -61,3 +61,178 @@ def test_state_dynamics_env_002():
     assert agent.stats.energy < 100
     assert agent.stats.wealth > 0
     assert agent.stats.sanity < 100
+
+def test_spatial_index_matches_brute_force():
+    """空间索引的半径查询结果与全量扫描一致（含顺序）"""
+    import math
+    import random
+    
+    rng = random.Random(42)
+    ms = MapSystem(cell_size=4)
+    for i in range(300):
+        ms.register_entity(Agent(id=f"a{i}", x=rng.randrange(ms.width), y=rng.randrange(ms.height), type="Agent"))
+    
+    # 随机移动一部分实体，验证索引随 move_entity 同步
+    for _ in range(1000):
+        entity = ms.entities[f"a{rng.randrange(300)}"]
+        ms.move_entity(entity.id, (entity.x + rng.choice([-1, 0, 1]), entity.y + rng.choice([-1, 0, 1])))
+    ms.unregister_entity("a0")
+    
+    for _ in range(200):
+        center = (rng.randrange(-5, ms.width + 5), rng.randrange(-5, ms.height + 5))
+        radius = rng.choice([0, 1, 3, 7, 20, 500])
+        expected = [
+            e for e in ms.entities.values()
+            if math.sqrt((e.x - center[0])**2 + (e.y - center[1])**2) <= radius
+        ]
+        assert ms.get_nearby_entities(center, radius) == expected
+
+def test_map_grid_read_only_view():
+    """grid 保留旧的按坐标访问方式，返回按需构建的 LocationInfo"""
+    ms = MapSystem(width=4, height=3)
+    ms.set_terrain(1, 2, TerrainType.WALL, False)
+    assert len(ms.grid) == 12 and (3, 2) in ms.grid and (4, 0) not in ms.grid
+    assert ms.grid[(1, 2)].terrain == TerrainType.WALL and not ms.grid[(1, 2)].is_walkable
+    with pytest.raises(KeyError):
+        ms.grid[(-1, 0)]
+
+def test_spatial_index_follows_direct_coordinate_writes():
+    """直接给 Agent 的 x/y 赋值时，空间索引随之更新"""
+    from app.services.world import WorldEngine
+    
+    engine = WorldEngine()
+    agent = engine.create_agent("index_agent", x=0, y=0)
+    agent.x = 40
+    agent.y = 40
+    ms = engine.map_system
+    assert agent not in ms.get_nearby_entities((0, 0), 3)
+    assert ms.get_nearby_entities((40, 40), 0) == [agent]
+
+def test_bulk_terrain_and_large_map():
+    """批量设置地形，大地图按数组存储"""
+    import numpy as np
+    
+    ms = MapSystem(width=2000, height=2000)
+    assert ms.terrain.nbytes + ms.walkable.nbytes + ms.description_refs.nbytes == 2000 * 2000 * 6
+    
+    ms.set_terrain_rect(10, 10, 20, 15, TerrainType.BUILDING, is_walkable=False, description="Office Tower")
+    loc = ms.get_location((19, 14))
+    assert loc.terrain == TerrainType.BUILDING
+    assert loc.is_walkable is False
+    assert loc.description == "Office Tower"
+    assert ms.get_location((20, 14)).terrain == TerrainType.EMPTY
+    
+    mask = np.zeros((2000, 2000), dtype=bool)
+    mask[:, 100] = True
+    ms.set_terrain_mask(mask, TerrainType.ROAD, is_walkable=True)
+    assert ms.get_location((1500, 100)).terrain == TerrainType.ROAD
+    
+    # 越界坐标视为墙
+    assert ms.get_location((-1, 0)).is_walkable is False
+
+def test_state_dynamics_apply_all_batch():
+    """批量结算：钳制、死亡检测，Agent.stats 作为 StatsStore 的视图"""
+    from app.services.state_dynamics import StateDynamics
+    
+    ms = MapSystem()
+    sd = StateDynamics(ms)
+    
+    worker = Agent(id="batch_worker", x=0, y=0, type="Agent")
+    sleeper = Agent(id="batch_sleeper", x=1, y=0, type="Agent")
+    dying = Agent(id="batch_dying", x=2, y=0, type="Agent")
+    for agent in (worker, sleeper, dying):
+        ms.register_entity(agent)
+        sd.bind_agent(agent)
+    
+    worker.stats.energy = 0.2
+    sleeper.stats.energy = 99.9
+    dying.stats.health = 0.03
+    
+    dead = sd.apply_all({
+        "batch_worker": ActionType.WORK_996,
+        "batch_sleeper": ActionType.SLEEP,
+        "batch_dying": ActionType.WORK_996,
+        "missing": ActionType.IDLE,
+    })
+    
+    assert worker.stats.energy == 0.0
+    assert worker.stats.wealth == 0.5
+    assert sleeper.stats.energy == 100.0
+    assert dead == [dying]
+    assert dying.is_active is False
+    assert dying.stats.health == 0.0
+    
+    # 视图读写直接作用于列数组
+    slot = worker.stats._slot
+    worker.stats.wealth = 42.0
+    assert sd.store.columns["wealth"][slot] == 42.0
+    assert worker.stats.model_dump()["wealth"] == 42.0
+    
+    # 释放后恢复为独立模型并保留数值
+    sd.release_all()
+    assert worker.stats._store is None
+    assert worker.stats.wealth == 42.0
+    
+    # 不传 actions 时按镜像的 current_action 结算所有存活 Agent
+    for agent in (worker, sleeper):
+        sd.bind_agent(agent)
+    worker.current_action = ActionType.REST_PARK
+    sleeper.current_action = ActionType.IDLE
+    sd.apply_all()
+    assert worker.stats.sanity > 99.9
+    assert sleeper.stats.energy == 99.99
+    assert dying.stats.health == 0.0
+
+def test_bound_stats_serialization_round_trip():
+    """绑定到 StatsStore 后，Agent 的序列化、repr 与深拷贝仍包含数值"""
+    from app.services.state_dynamics import StateDynamics
+    
+    ms = MapSystem()
+    sd = StateDynamics(ms)
+    agent = Agent(id="serial_agent", x=0, y=0, type="Agent")
+    ms.register_entity(agent)
+    sd.bind_agent(agent)
+    agent.stats.wealth = 12.5
+    agent.stats.energy = 40.0
+    
+    dumped = agent.model_dump()
+    assert dumped["stats"] == {"health": 100.0, "sanity": 100.0, "wealth": 12.5, "energy": 40.0}
+    restored = Agent.model_validate_json(agent.model_dump_json())
+    assert restored.stats.model_dump() == dumped["stats"]
+    assert Agent(**dumped).stats.wealth == 12.5
+    assert "wealth=12.5" in repr(agent.stats)
+    
+    # 深拷贝脱离 store，修改副本不影响原 Agent
+    copied = agent.model_copy(deep=True)
+    copied.stats.wealth = 99.0
+    assert copied.stats._store is None
+    assert agent.stats.wealth == 12.5
+
+def test_bound_stats_copy_equality_and_bounds():
+    """绑定的 stats：model_copy 得到独立副本，按数值比较相等，写入截断到上下限，批量结算推进 revision"""
+    from app.services.state_dynamics import StateDynamics
+    
+    ms = MapSystem()
+    sd = StateDynamics(ms)
+    agent = Agent(id="copy_agent", x=0, y=0, type="Agent", current_action=ActionType.WORK_996)
+    ms.register_entity(agent)
+    sd.bind_agent(agent)
+    agent.stats.wealth = 30.0
+    
+    copied = agent.stats.model_copy()
+    assert copied._store is None and copied == agent.stats
+    copied.wealth = 1.0
+    assert agent.stats.wealth == 30.0 and copied != agent.stats
+    assert agent.stats.model_copy(update={"energy": 5.0}).energy == 5.0
+    assert agent.stats == AgentStats(wealth=30.0)
+    
+    agent.stats.energy = 150.0
+    agent.stats.sanity = -3.0
+    assert (agent.stats.energy, agent.stats.sanity) == (100.0, 0.0)
+    
+    revision = sd.store.revision
+    sd.apply_all()
+    assert sd.store.revision > revision
+    revision = sd.store.revision
+    sd.apply_repeated(5)
+    assert sd.store.revision > revision
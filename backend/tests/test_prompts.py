@@ -29,6 +29,52 @@ def test_prompt_manager_en():
     assert "You are a digital soul in a virtual world" in prompts["user"]
     assert "Current Situation:\nYou are at home. It's evening." in prompts["user"]
 
+def test_prefix_layout_static_text_first():
+    """前缀布局：静态规则全部在 system 中，user 只有状态；不同 Agent 的 system 完全相同"""
+    legacy = PromptManager(language="en", layout="legacy")
+    prefix = PromptManager(language="en", layout="prefix")
+    stats = {"energy": 30.123, "wealth": 100.0, "health": 80.0}
+    
+    a = prefix.get_decision_prompt("You are at home.", "Nothing.", stats)
+    b = prefix.get_decision_prompt("You are at the park.", "I worked.", {"energy": 90.0})
+    assert a["system"] == b["system"]
+    assert "WORK_996" in a["system"] and '"thought"' in a["system"]
+    assert "WORK_996" not in a["user"]
+    assert a["user"].startswith("Current Situation:\nYou are at home.")
+    assert a["user"].endswith('{"energy":30.1,"wealth":100.0,"health":80.0}')
+    
+    # 旧布局与 str.format 的结果一致
+    from app.core.prompts import DECISION_PROMPTS
+    expected = DECISION_PROMPTS["en"]["user"].format(
+        perception_text="You are at home.", memory_context="Nothing.",
+        stats_json=json.dumps(stats, indent=2, ensure_ascii=False)
+    )
+    assert legacy.get_decision_prompt("You are at home.", "Nothing.", stats)["user"] == expected
+
+def test_prompt_token_stats():
+    """记录每次提示词的 token 数与服务商返回的缓存命中"""
+    from types import SimpleNamespace
+    pm = PromptManager(language="zh", layout="prefix")
+    counted = []
+    count = pm.token_counter.count
+    pm.token_counter.count = lambda text: counted.append(text) or count(text)
+    for _ in range(3):
+        pm.get_decision_prompt("你在家里。", "无。", {"energy": 30.0})
+    # system 只分词一次，之后每次只对 user 部分分词
+    assert counted.count(pm._decision.system) == 1
+    pm.record_usage("decision", SimpleNamespace(
+        prompt_tokens=200, completion_tokens=20,
+        prompt_tokens_details=SimpleNamespace(cached_tokens=150)
+    ))
+    
+    stats = pm.stats.snapshot()["decision"]
+    assert stats["prompts"] == 3
+    assert stats["prompt_tokens"] > stats["prefix_tokens"] > 0
+    # 静态内容占了提示词的大部分
+    assert stats["prefix_share"] > 0.5
+    assert stats["cache_hit_rate"] == 0.75
+    assert stats["avg_completion_tokens"] == 20
+
 if __name__ == "__main__":
     test_prompt_manager_zh()
     test_prompt_manager_en()
@@ -1,3 +1,4 @@
+import pytest
 from app.services.world import WorldEngine
 from app.models.agent import ActionType
 
@@ -104,4 +105,302 @@ def test_scenario_social_interaction():
     world.run_agent_loop(ticks=10)
     
     assert worker.current_action != ActionType.IDLE
-    assert beggar.current_action != ActionType.IDLE
\ No newline at end of file
+    assert beggar.current_action != ActionType.IDLE
+
+def test_fast_forward_matches_step_by_step():
+    """快进：全员睡眠时跳过空闲 Tick，结果与逐 Tick 模拟一致"""
+    import pytest
+    
+    worlds = []
+    for fast_forward in (False, True):
+        world = WorldEngine(fast_forward=fast_forward)
+        world.time_system.current_time.hour = 21
+        world.time_system.current_time.minute = 30
+        for i, (energy, wealth) in enumerate([(90, 0), (15, 100), (60, 80)]):
+            agent = world.create_agent(f"ff_agent_{i}", x=i, y=0)
+            agent.stats.energy = energy
+            agent.stats.wealth = wealth
+        # 21:30 -> 次日 08:30，覆盖入睡、午夜反思、07:00 唤醒
+        world.run_agent_loop(ticks=660)
+        worlds.append(world)
+    
+    step_world, ff_world = worlds
+    assert str(ff_world.time_system.get_current_time()) == str(step_world.time_system.get_current_time())
+    for expected, actual in zip(step_world.get_all_agents(), ff_world.get_all_agents()):
+        assert actual.is_sleeping == expected.is_sleeping
+        assert actual.current_action == expected.current_action
+        assert actual.values == expected.values
+        for name, value in expected.stats.as_dict().items():
+            assert getattr(actual.stats, name) == pytest.approx(value)
+
+def test_fast_forward_closed_form_death():
+    """闭式结算在 health 归零的那个 Tick 停止"""
+    from app.services.state_dynamics import StateDynamics
+    from app.services.map_system import MapSystem
+    from app.models.agent import Agent
+    
+    ms = MapSystem()
+    sd = StateDynamics(ms)
+    agent = Agent(id="ff_dying", x=0, y=0, type="Agent", current_action=ActionType.WORK_996)
+    ms.register_entity(agent)
+    sd.bind_agent(agent)
+    agent.stats.health = 1.0
+    
+    dead = sd.apply_repeated(100)
+    
+    # health -0.05/Tick，第 20 个 Tick 归零；财富只累计到那时
+    assert dead == [agent]
+    assert agent.is_active is False
+    assert agent.stats.health == 0.0
+    assert agent.stats.wealth == 20 * 0.5
+
+def test_action_scheduler_reduces_brain_calls():
+    """动作调度：Agent 只在动作结束或被事件打断时调用大脑"""
+    calls = {True: 0, False: 0}
+    
+    for use_scheduler in (True, False):
+        world = WorldEngine(use_scheduler=use_scheduler)
+        agent = world.create_agent(f"sched_agent_{use_scheduler}", x=0, y=0)
+        agent.stats.wealth = 0
+        brain = agent._brain
+        original = brain.decide_next_action
+        
+        def counting(*args, use_scheduler=use_scheduler, original=original, **kwargs):
+            calls[use_scheduler] += 1
+            return original(*args, **kwargs)
+        brain.decide_next_action = counting
+        
+        # 07:00 -> 12:00
+        world.run_agent_loop(ticks=300)
+        assert world.tick_count == 300
+    
+    # WORK_996 持续 240 分钟：300 个 Tick 内只需决策 2 次
+    assert calls[True] == 2
+    assert calls[False] == 300
+    
+    # 事件会打断当前动作，下一个 Tick 重新决策
+    world = WorldEngine()
+    agent = world.create_agent("sched_event_agent", x=0, y=0)
+    world.run_agent_loop(ticks=1)
+    assert world.scheduler.due_at(agent.id) == 1 + 240
+    world.inject_event("Fire", "The office is on fire!", ["sched_event_agent"])
+    assert world.scheduler.due_at(agent.id) == world.tick_count
+
+def test_critical_stat_interrupts_long_action():
+    """数值跌破临界值时打断持续动作：逐 Tick 与快进在同一个 Tick 重新决策"""
+    results = {}
+    for fast_forward in (False, True):
+        world = WorldEngine(fast_forward=fast_forward)
+        agent = world.create_agent(f"critical_agent_{fast_forward}", x=0, y=0)
+        agent.stats.wealth = 0
+        agent.stats.energy = 30
+        world.run_agent_loop(ticks=1)
+        assert agent.current_action == ActionType.WORK_996
+        assert world.scheduler.due_at(agent.id) == 1 + 240
+        
+        world.run_agent_loop(ticks=59)
+        results[fast_forward] = (agent.daily_log, agent.stats.as_dict())
+        assert agent.is_sleeping
+    
+    # 每 Tick 消耗 0.4 能量：07:26 结算后跌破 20，07:27 改为睡觉，而不是干满 4 小时
+    log, stats = results[False]
+    assert log.splitlines() == ["[07:01] I am broke. I need to work hard.",
+                                "[07:27] I am too tired. I need to sleep."]
+    assert results[True][0] == log
+    assert results[True][1] == pytest.approx(stats)
+
+def test_phase_timer_records_tick_phases():
+    """性能剖析：挂上 PhaseTimer 后按阶段累计耗时，快进 Tick 也计入"""
+    from app.core.profiling import PhaseTimer
+    
+    world = WorldEngine()
+    world.create_agent("timer_agent", x=0, y=0)
+    world.time_system.current_time.hour = 7
+    world.time_system.current_time.minute = 0
+    timer = PhaseTimer()
+    world.phase_timer = timer
+    
+    world.run_agent_loop(ticks=10)
+    snapshot = timer.snapshot()
+    
+    for phase in ("time", "perception", "memory", "brain", "action", "effects"):
+        assert phase in snapshot
+        assert snapshot[phase]["seconds"] >= 0
+    # 只有第一个 Tick 需要决策
+    assert snapshot["perception"]["count"] == 1
+    
+    timer.reset()
+    assert timer.snapshot() == {}
+
+def test_metrics_phase_histograms():
+    """指标：阶段耗时写入直方图，按 Prometheus 文本格式输出"""
+    from app.core.metrics import MetricsPhaseTimer, MetricsRegistry
+    
+    metrics = MetricsRegistry()
+    world = WorldEngine(fast_forward=True)
+    world.create_agent("metrics_agent", x=0, y=0)
+    world.time_system.current_time.hour = 7
+    world.time_system.current_time.minute = 0
+    world.phase_timer = MetricsPhaseTimer(metrics)
+    
+    world.run_agent_loop(ticks=3)
+    agent = world.get_agent("metrics_agent")
+    agent.decide_and_act(world.phase_timer)
+    
+    histogram = metrics.get("world_phase_seconds")
+    # 快进模式：1 个 Tick + 1 次快进
+    assert histogram.count("tick") >= 1
+    assert histogram.count("perception") == 2
+    assert histogram.count("brain") == 2
+    
+    text = metrics.render()
+    assert "# TYPE world_phase_seconds histogram" in text
+    assert 'world_phase_seconds_bucket{phase="brain",le="+Inf"} 2' in text
+    assert 'world_phase_seconds_count{phase="perception"} 2' in text
+
+def test_checkpoint_incremental_restore(tmp_path):
+    """检查点：全量基线 + 只含脏 Agent 的增量段，恢复后状态一致"""
+    from app.services.checkpoint import CheckpointManager
+    from app.models.map import TerrainType
+    
+    world = WorldEngine()
+    world.map_system.set_terrain_rect(0, 0, 5, 5, TerrainType.ROAD, True, description="Central Park")
+    agents = [world.create_agent(f"ckpt_agent_{i}", x=i, y=0) for i in range(20)]
+    manager = CheckpointManager(world, directory=str(tmp_path), full_every=5)
+    
+    info = manager.checkpoint(wait=True)
+    assert info["kind"] == "base" and info["agents_written"] == 20
+    
+    world.time_system.current_time.hour = 9
+    world.run_agent_loop(ticks=1)
+    # 只有之前改动过的 Agent 写入增量段
+    world.tick_count += 1
+    info = manager.checkpoint(wait=True)
+    assert info["kind"] == "delta"
+    agents[3].x = 7
+    agents[4]._memory.add_short_term("[EVENT] Storm: heavy rain")
+    world.tick_count += 1
+    info = manager.checkpoint(wait=True)
+    assert info["kind"] == "delta" and info["agents_written"] == 2
+    
+    expected = {
+        a.id: (a.x, a.y, a.current_action, a.daily_log, list(a._memory.short_term_memory), a.stats.as_dict())
+        for a in agents
+    }
+    expected_time = str(world.time_system.get_current_time())
+    due = world.scheduler.due_at("ckpt_agent_0")
+    
+    restored = WorldEngine()
+    result = CheckpointManager(restored, directory=str(tmp_path)).restore()
+    assert result["tick"] == world.tick_count and result["files"] == 3
+    assert str(restored.time_system.get_current_time()) == expected_time
+    assert restored.map_system.get_location((2, 2)).description == "Central Park"
+    # tick_count 继续前进，到期 Tick 随之平移
+    assert restored.tick_count == result["tick"] + 1
+    assert restored.scheduler.due_at("ckpt_agent_0") == due + 1
+    for agent_id, state in expected.items():
+        agent = restored.get_agent(agent_id)
+        assert (agent.x, agent.y, agent.current_action, agent.daily_log,
+                list(agent._memory.short_term_memory), agent.stats.as_dict()) == state
+    
+    restored.run_agent_loop(ticks=10)
+    manager.shutdown()
+
+def test_checkpoint_restore_keeps_version_moving_forward(tmp_path):
+    """恢复不让 tick_count 倒退：恢复前取得的 since 拿到全量快照，进行中的反思被取消"""
+    from concurrent.futures import Future
+    from app.services.checkpoint import CheckpointManager
+    
+    world = WorldEngine()
+    agent = world.create_agent("ckpt_version_agent", x=0, y=0)
+    manager = CheckpointManager(world, directory=str(tmp_path))
+    manager.checkpoint(wait=True)
+    
+    world.run_agent_loop(ticks=20)
+    since = world.tick_count
+    future = Future()
+    world._pending_reflections[agent.id] = (future, agent, "log", 0.0, since)
+    manager.restore()
+    
+    assert world.tick_count == since + 1
+    assert future.cancelled() and world._pending_reflections == {}
+    assert str(world.time_system.get_current_time()) == "2024-01-01 07:00"
+    full, agents, removed = world.changes_since(since)
+    assert full and [a.id for a in agents] == ["ckpt_version_agent"]
+    
+    # 之后的增量照常：只包含恢复后修改的 Agent
+    since = world.tick_count
+    world.run_agent_loop(ticks=2)
+    full, agents, removed = world.changes_since(since)
+    assert not full and [a.id for a in agents] == ["ckpt_version_agent"]
+    manager.shutdown()
+
+def test_checkpoint_failed_write_forces_new_base(tmp_path, monkeypatch):
+    """增量段写入失败后链被标记为损坏，下一次检查点写新的基线；非检查点文件拒绝读取"""
+    import pickle
+    from app.services import checkpoint
+    from app.services.checkpoint import CheckpointManager, read_file
+    
+    world = WorldEngine()
+    agent = world.create_agent("ckpt_fail_agent", x=0, y=0)
+    manager = CheckpointManager(world, directory=str(tmp_path), full_every=5)
+    assert manager.checkpoint(wait=True)["kind"] == "base"
+    
+    original = checkpoint.write_file
+    def failing(path, payload):
+        raise OSError("disk full")
+    monkeypatch.setattr(checkpoint, "write_file", failing)
+    agent.x = 3
+    world.tick_count += 1
+    with pytest.raises(OSError):
+        manager.checkpoint(wait=True)
+    monkeypatch.setattr(checkpoint, "write_file", original)
+    
+    # 失败的那段只改了 x；新的基线必须包含它
+    world.tick_count += 1
+    info = manager.checkpoint(wait=True)
+    assert info["kind"] == "base"
+    restored = WorldEngine()
+    CheckpointManager(restored, directory=str(tmp_path)).restore()
+    assert restored.get_agent("ckpt_fail_agent").x == 3
+    
+    bogus = tmp_path / "bogus.ckpt"
+    bogus.write_bytes(pickle.dumps({"kind": "base"}))
+    with pytest.raises(ValueError):
+        read_file(str(bogus))
+    manager.shutdown()
+
+def test_sharded_world_ghosts_and_handoff():
+    """两个分片锁步推进：边界附近的 Agent 以幽灵跨分片可见，越界的 Agent 被转交"""
+    from app.services.sharding import ShardedWorld
+
+    world = WorldEngine()
+    world.time_system.current_time.hour = 9
+    world.time_system.current_time.minute = 0
+    start_tick = world.tick_count
+
+    with ShardedWorld(world, shards=2, ghost_radius=3) as sharded:
+        assert sharded.bounds == [(0, 50), (50, 100)]
+        sharded.create_agent("shard_a", x=48, y=10)
+        sharded.create_agent("shard_b", x=51, y=10)
+        sharded.create_agent("shard_c", x=20, y=20)
+        assert sharded.owners == {"shard_a": 0, "shard_b": 1, "shard_c": 0}
+
+        # 第一个 Tick 结束后生成幽灵，第二个 Tick 中可以感知到
+        sharded.step(2)
+        assert sharded.tick_count == start_tick + 2
+        assert ("shard_b", 51, 10) in sharded.nearby_entities("shard_a", radius=3)
+        assert ("shard_a", 48, 10) in sharded.nearby_entities("shard_b", radius=3)
+        assert [e[0] for e in sharded.nearby_entities("shard_c", radius=3)] == []
+
+        sharded.move_agent("shard_a", 60, 10)
+        assert sharded.owners["shard_a"] == 1
+        assert sharded.handoffs == 1
+
+        sharded.step(1)
+        agents = {agent["id"]: agent for agent in sharded.agents()}
+        assert set(agents) == {"shard_a", "shard_b", "shard_c"}
+        assert (agents["shard_a"]["x"], agents["shard_a"]["y"]) == (60, 10)
+        # 迁移保留数值：与一直留在原分片的同类 Agent 同步变化
+        assert agents["shard_a"]["stats"] == agents["shard_c"]["stats"]
+        assert sharded.tick_count == start_tick + 3
@@ -78,3 +78,243 @@ def test_real_llm_decision():
         print(f"Error type: {type(e).__name__}")
         print(f"Error message: {str(e)}")
         raise
+
+def test_memory_isolation_shared_collection():
+    """多个 Agent 共用一个集合时，recall 只返回自己的记忆"""
+    alice = MemorySystem(agent_id="isolation_alice", use_mock=True)
+    bob = MemorySystem(agent_id="isolation_bob", use_mock=True)
+    assert alice.collection.name == bob.collection.name
+    
+    alice.consolidate_daily("Alice worked all day.")
+    bob.consolidate_daily("Bob slept in the park.")
+    
+    assert alice.recall("day", k=5) == ["Alice worked all day."]
+    assert bob.recall("day", k=5) == ["Bob slept in the park."]
+
+def test_decision_cache_brain():
+    """决策缓存：相同量化状态复用 LLM 决策，TTL 过期与随机跳过"""
+    from app.services.decision_cache import DecisionCache
+    
+    now = [0.0]
+    cache = DecisionCache(max_size=2, ttl_seconds=10, bypass_probability=0.0, clock=lambda: now[0])
+    brain = AgentBrain(use_mock=True, cache=cache)
+    brain.use_mock = False
+    calls = []
+    
+    def fake_llm(perception_text, memory_context, stats, timeout=None):
+        calls.append(stats)
+        return ActionDecision(action=ActionType.SLEEP, thought="I am exhausted.")
+    brain._llm_decision = fake_llm
+    
+    stats = {"energy": 10, "wealth": 5, "health": 90, "sanity": 80}
+    key = cache.make_key(stats, "Empty", 0, 23, "生存第一")
+    # 同一分桶内的细微差别得到相同的键
+    assert key == cache.make_key({**stats, "energy": 12}, "Empty", 0, 22, "生存第一")
+    
+    first = brain.decide_next_action("...", "", stats, cache_key=key)
+    second = brain.decide_next_action("...", "", stats, cache_key=key)
+    assert first.action == second.action == ActionType.SLEEP
+    assert len(calls) == 1
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+    
+    now[0] = 11.0
+    brain.decide_next_action("...", "", stats, cache_key=key)
+    assert len(calls) == 2
+    assert cache.expirations == 1
+    
+    always_bypass = DecisionCache(bypass_probability=1.0)
+    always_bypass.put(key, first)
+    assert always_bypass.get(key) is None
+    assert always_bypass.bypasses == 1
+
+def test_memory_write_buffer_batches_and_retries():
+    """午夜归档批量写入：按 batch_size 分块，失败的条目保留到下次 flush"""
+    from app.services.memory import MemoryWriteBuffer
+    
+    memories = [MemorySystem(agent_id=f"buffer_agent_{i}", use_mock=True) for i in range(5)]
+    buffer = MemoryWriteBuffer(batch_size=2, max_retries=1, retry_backoff=0, sleep=lambda s: None)
+    
+    shared = memories[0].collection.shared
+    original_upsert = shared.upsert
+    calls = []
+    failing = [True]
+    
+    def flaky_upsert(**kwargs):
+        calls.append(len(kwargs["ids"]))
+        if failing[0]:
+            raise RuntimeError("embedding service unavailable")
+        return original_upsert(**kwargs)
+    shared.upsert = flaky_upsert
+    try:
+        for i, memory in enumerate(memories):
+            memory.add_short_term("worked")
+            memory.consolidate_daily(f"Summary {i}", buffer=buffer)
+            assert len(memory.short_term_memory) == 0
+        
+        # 3 个分块，每块 1 次重试，全部失败后留在队列里
+        assert buffer.flush() == 0
+        assert len(buffer) == 5
+        assert calls == [2, 2, 2, 2, 1, 1]
+        
+        failing[0] = False
+        calls.clear()
+        assert buffer.flush() == 5
+        assert calls == [2, 2, 1]
+        assert len(buffer) == 0
+    finally:
+        del shared.upsert
+    
+    for i, memory in enumerate(memories):
+        assert memory.recall("summary", k=5) == [f"Summary {i}"]
+
+def test_midnight_reflection_single_batched_write():
+    """00:00 所有 Agent 的总结整批写入，而不是每个 Agent 一次"""
+    from app.services.world import WorldEngine
+    
+    world = WorldEngine()
+    agents = [world.create_agent(f"midnight_agent_{i}", x=i, y=0) for i in range(4)]
+    world.time_system.current_time.hour = 23
+    world.time_system.current_time.minute = 59
+    
+    world.run_agent_loop(ticks=1)
+    
+    assert world.memory_buffer.batches_written == 1
+    assert world.memory_buffer.documents_written == 4
+    for agent in agents:
+        assert agent._memory.collection.count() == 1
+        assert agent.daily_log == ""
+
+def test_decision_journal_batches_and_daily_log(tmp_path):
+    """决策按结构化记录追加，攒满一批写入 SQLite，daily_log 按需渲染"""
+    from app.services.journal import DecisionJournal
+    from app.services.world import WorldEngine
+    
+    world = WorldEngine(use_scheduler=False, fast_forward=False)
+    world.journal = DecisionJournal(path=str(tmp_path / "journal.db"), flush_size=5)
+    agent = world.create_agent("journal_agent", x=0, y=0)
+    agent._journal = world.journal
+    agent.stats.wealth = 0
+    world.time_system.current_time.hour = 9
+    world.time_system.current_time.minute = 0
+    
+    world.run_agent_loop(ticks=7)
+    
+    # 第 5 个决策后整批写入，余下 2 条仍在缓冲中
+    assert world.journal.entries_written == 5
+    assert len(world.journal) == 2
+    entries = world.journal.entries("journal_agent")
+    assert [e.tick for e in entries] == [1, 2, 3, 4, 5]
+    assert all(e.action == "WORK_996" and e.success for e in entries)
+    
+    lines = agent.daily_log.splitlines()
+    assert len(lines) == 7
+    assert lines[0].endswith("I am broke. I need to work hard.")
+    
+    world.shutdown()
+    assert len(world.journal.entries("journal_agent", since=6)) == 2
+    
+    agent.daily_log = ""
+    assert agent.daily_log == ""
+    
+    # daily_log 作为计算字段参与序列化，构造时传入的值不会丢失
+    restored = Agent(**agent.model_dump(exclude={"stats"}) | {"daily_log": "carried over"})
+    assert restored.model_dump()["daily_log"] == "carried over"
+
+def test_in_memory_journal_retention():
+    """内存数据库只保留最近 retention_ticks 个 Tick 的记录"""
+    from app.models.journal import JournalEntry
+    from app.services.journal import DecisionJournal
+    
+    journal = DecisionJournal(path="", flush_size=1, retention_ticks=10)
+    for tick in range(30):
+        journal.tick = tick
+        journal.record(JournalEntry("retention_agent", tick, "", "IDLE", None, "...", True))
+        journal.flush()
+    assert [e.tick for e in journal.entries("retention_agent")] == list(range(19, 30))
+    
+    # 配置了文件路径时保留完整历史
+    assert DecisionJournal(path=":memory:", retention_ticks=10).retention_ticks == 0
+
+def test_journal_concurrent_record_and_flush():
+    """模拟线程追加记录的同时其他线程 flush，每条记录恰好写入一次"""
+    import threading
+    from app.models.journal import JournalEntry
+    from app.services.journal import DecisionJournal
+    
+    journal = DecisionJournal(path="", flush_size=10**6, retention_ticks=0)
+    done = threading.Event()
+    
+    def flusher():
+        while not done.is_set():
+            journal.flush()
+    
+    threads = [threading.Thread(target=flusher) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for tick in range(5000):
+        journal.record(JournalEntry("concurrent_agent", tick, "", "IDLE", None, "...", True))
+    done.set()
+    for thread in threads:
+        thread.join()
+    journal.flush()
+    
+    assert [e.tick for e in journal.entries("concurrent_agent")] == list(range(5000))
+    assert journal.entries_written == 5000
+
+def test_context_builder_budget_and_compression():
+    """记忆上下文：连续相同动作合并、重复组去重、事件总是保留、超出预算丢弃最旧的记录"""
+    from app.models.memory import EntryKind
+    from app.services.context_builder import ContextBuilder
+    from app.services.prompt_manager import TokenCounter
+    
+    class WordCounter(TokenCounter):
+        def count(self, text):
+            return len(text.split())
+    
+    memory = MemorySystem(agent_id="context_agent", use_mock=True)
+    memory.add_short_term("[EVENT] Storm: heavy rain", kind=EntryKind.EVENT, tick=1)
+    for tick in range(2, 6):
+        memory.add_short_term("I am broke.", kind=EntryKind.THOUGHT, tick=tick)
+        memory.add_short_term("WORK_996", kind=EntryKind.ACTION, tick=tick)
+    memory.add_short_term("I am tired.", kind=EntryKind.THOUGHT, tick=6)
+    memory.add_short_term("SLEEP", kind=EntryKind.ACTION, tick=6)
+    memory.add_short_term("I woke up.", tick=7)
+    memory.add_short_term("I am broke.", kind=EntryKind.THOUGHT, tick=8)
+    memory.add_short_term("WORK_996", kind=EntryKind.ACTION, tick=8)
+    
+    memory.context_builder = ContextBuilder(budget=100, counter=WordCounter())
+    assert memory.get_recent_context().split("\n") == [
+        "[EVENT] Storm: heavy rain",
+        "Thought: I am tired.",
+        "Action: SLEEP",
+        "I woke up.",
+        "Thought: I am broke.",
+        "Action: WORK_996",
+    ]
+    
+    # 预算只够事件与最近一组决策
+    builder = ContextBuilder(budget=12, counter=WordCounter())
+    memory.context_builder = builder
+    assert memory.get_recent_context().split("\n") == [
+        "[EVENT] Storm: heavy rain",
+        "Thought: I am broke.",
+        "Action: WORK_996",
+    ]
+    stats = builder.stats()
+    assert stats["calls"] == 1
+    assert stats["context_tokens"] == 10
+    assert stats["saved_tokens"] == stats["raw_tokens"] - 10 > 0
+    assert stats["budget_dropped"] == 2
+
+def test_context_builder_run_length():
+    """连续相同动作合并为一组并标注次数，保留最新的想法"""
+    from app.models.memory import EntryKind
+    from app.services.context_builder import ContextBuilder
+    
+    memory = MemorySystem(agent_id="context_rle_agent", use_mock=True,
+                          context_builder=ContextBuilder(budget=1000))
+    for tick, thought in enumerate(["Need money.", "Still broke.", "Almost there."]):
+        memory.add_short_term(thought, kind=EntryKind.THOUGHT, tick=tick)
+        memory.add_short_term("WORK_996", kind=EntryKind.ACTION, tick=tick)
+    
+    assert memory.get_recent_context() == "Thought: Almost there.\nAction: WORK_996 (x3)"
@@ -0,0 +1,191 @@
+import base64
+
+import numpy as np
+from fastapi.testclient import TestClient
+from openai import OpenAI
+
+from benchmarks.stub_llm_server import StubConfig, create_app
+from app.services.brain import AgentBrain, ActionType
+
+def _stub_brain(app) -> AgentBrain:
+    brain = AgentBrain(use_mock=True)
+    brain.use_mock = False
+    brain.client = OpenAI(api_key="stub", base_url="http://testserver/v1",
+                          http_client=TestClient(app), max_retries=0)
+    brain.model = "stub"
+    return brain
+
+def test_stub_llm_drives_agent_brain():
+    """桩服务按提示词中的状态返回规则决策，AgentBrain 走真实 LLM 链路"""
+    app = create_app(StubConfig(seed=0))
+    brain = _stub_brain(app)
+    
+    tired = brain.decide_next_action("You are at home.", "", {"health": 80, "energy": 10, "wealth": 100})
+    assert tired.action == ActionType.SLEEP
+    broke = brain.decide_next_action("You are at home.", "", {"health": 80, "energy": 90, "wealth": 5})
+    assert broke.action == ActionType.WORK_996
+    assert brain.reflect("Worked all day.")
+    
+    assert app.state.stats.requests["chat"] == 3
+    
+    # 截止时间已过的反思不再发起请求，反思线程立即释放
+    import time
+    import pytest
+    with pytest.raises(TimeoutError):
+        brain.reflect("Worked all day.", deadline=time.monotonic() - 1)
+    assert app.state.stats.requests["chat"] == 3
+
+def test_stub_llm_embeddings_and_fault_injection():
+    """Embedding 支持 float/base64 两种编码；错误注入返回 429/500"""
+    client = TestClient(create_app(StubConfig(embedding_dim=8)))
+    
+    plain = client.post("/embeddings", json={"input": ["hello", "world"], "model": "m"}).json()
+    assert len(plain["data"]) == 2 and len(plain["data"][0]["embedding"]) == 8
+    assert plain["usage"]["total_tokens"] > 0
+    encoded = client.post("/v1/embeddings", json={"input": "hello", "encoding_format": "base64"}).json()
+    decoded = np.frombuffer(base64.b64decode(encoded["data"][0]["embedding"]), dtype=np.float32)
+    assert np.allclose(decoded, plain["data"][0]["embedding"])
+    
+    failing = TestClient(create_app(StubConfig(error_rate=1.0, rate_limit_share=1.0, seed=1)))
+    response = failing.post("/v1/chat/completions", json={"messages": []})
+    assert response.status_code == 429
+    assert response.json()["error"]["code"] == 429
+
+def test_llm_telemetry_per_agent():
+    """每次 LLM 调用按 Agent 与调用类型记录延迟、token 与错误"""
+    import pytest
+    from app.services.telemetry import llm_telemetry
+    
+    brain = _stub_brain(create_app(StubConfig(seed=0)))
+    brain.agent_id = "telemetry_agent"
+    brain.decide_next_action("You are at home.", "", {"energy": 90, "wealth": 5})
+    brain.reflect("Worked all day.")
+    
+    failing = _stub_brain(create_app(StubConfig(error_rate=1.0, rate_limit_share=0.0, seed=1)))
+    failing.agent_id = "telemetry_agent"
+    failing.max_retries = 0
+    # 服务故障时退回规则决策
+    fallback = failing.decide_next_action("You are at home.", "", {"energy": 90, "wealth": 5})
+    assert fallback.action == ActionType.WORK_996
+    
+    stats = llm_telemetry.agent_stats("telemetry_agent")
+    decision = stats["decision"]
+    assert decision["calls"] == 2
+    assert decision["http_errors"] == 1
+    assert decision["error_rate"] == 0.5
+    assert decision["prompt_tokens"] > 0 and decision["completion_tokens"] > 0
+    assert decision["latency_seconds"] > 0
+    assert stats["reflection"]["calls"] == 1
+    
+    snapshot = llm_telemetry.snapshot()
+    assert any(row["model"] == "stub" and row["call_type"] == "decision" for row in snapshot["by_model"])
+    assert snapshot["totals"]["calls"] >= 3
+    
+    # 无法解析的回复计为解析失败
+    import json
+    with pytest.raises(ValueError):
+        with llm_telemetry.track("decision", "stub", "telemetry_parse_agent"):
+            json.loads("not json")
+    assert llm_telemetry.agent_stats("telemetry_parse_agent")["decision"]["parse_errors"] == 1
+
+def test_brain_retries_breaker_and_deadline():
+    """服务故障时抖动重试；连续故障打开熔断器，打开期间与超过截止时间都退回规则决策"""
+    import time
+    import httpx
+    import openai
+    from app.services.brain import ActionDecision
+    from app.services.resilience import BreakerState, CircuitBreaker, FallbackCounter
+    
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=3, cooldown=10, clock=lambda: now[0])
+    fallbacks = FallbackCounter()
+    brain = AgentBrain(use_mock=True, breaker=breaker, fallbacks=fallbacks)
+    brain.use_mock = False
+    brain.max_retries = 2
+    sleeps = []
+    brain._sleep = sleeps.append
+    
+    request = httpx.Request("POST", "http://stub/v1/chat/completions")
+    outcomes = []
+    
+    def fake_llm(perception_text, memory_context, stats, timeout=None):
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    brain._llm_decision = fake_llm
+    stats = {"energy": 90, "wealth": 5}
+    
+    # 两次故障后第三次成功
+    outcomes[:] = [openai.APITimeoutError(request=request),
+                   openai.InternalServerError("boom", response=httpx.Response(500, request=request), body=None),
+                   ActionDecision(action=ActionType.REST_PARK, thought="ok")]
+    assert brain.decide_next_action("...", "", stats).action == ActionType.REST_PARK
+    assert len(sleeps) == 2 and 0.25 <= sleeps[0] <= 0.75 and 0.5 <= sleeps[1] <= 1.5
+    assert breaker.state == BreakerState.CLOSED
+    
+    # 连续 3 次故障：用完重试后退回规则决策，熔断器打开
+    outcomes[:] = [openai.APITimeoutError(request=request)] * 3
+    assert brain.decide_next_action("...", "", stats).action == ActionType.WORK_996
+    assert breaker.state == BreakerState.OPEN
+    
+    # 打开期间不再调用 LLM
+    assert brain.decide_next_action("...", "", stats).action == ActionType.WORK_996
+    assert outcomes == []
+    
+    # 冷却结束后试探成功，熔断器关闭
+    now[0] = 11.0
+    outcomes[:] = [ActionDecision(action=ActionType.REST_PARK, thought="back")]
+    assert brain.decide_next_action("...", "", stats).action == ActionType.REST_PARK
+    assert breaker.state == BreakerState.CLOSED
+    
+    # 截止时间已过：直接退回
+    outcomes[:] = [ActionDecision(action=ActionType.REST_PARK, thought="late")]
+    late = brain.decide_next_action("...", "", stats, deadline=time.monotonic() - 1)
+    assert late.action == ActionType.WORK_996
+    
+    report = fallbacks.stats()
+    assert report["by_reason"] == {"error": 1, "circuit_open": 1, "deadline": 1}
+    assert report["retries"] == 4
+
+def test_breaker_half_open_probe_released():
+    """半开状态下截止时间已过的决策不占用试探名额；未知错误计为故障而不是成功"""
+    import time
+    from app.services.brain import ActionDecision
+    from app.services.resilience import BreakerState, CircuitBreaker, FallbackCounter
+    
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=10, clock=lambda: now[0])
+    brain = AgentBrain(use_mock=True, breaker=breaker, fallbacks=FallbackCounter())
+    brain.use_mock = False
+    brain.max_retries = 0
+    outcomes = []
+    
+    def fake_llm(perception_text, memory_context, stats, timeout=None):
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    brain._llm_decision = fake_llm
+    stats = {"energy": 90, "wealth": 5}
+    
+    # 未知错误打开熔断器
+    outcomes[:] = [RuntimeError("unexpected")]
+    brain.decide_next_action("...", "", stats)
+    assert breaker.state == BreakerState.OPEN
+    
+    # 冷却结束后，截止时间已过的调用不应占用试探名额
+    now[0] = 11.0
+    brain.decide_next_action("...", "", stats, deadline=time.monotonic() - 1)
+    outcomes[:] = [ActionDecision(action=ActionType.REST_PARK, thought="recovered")]
+    assert brain.decide_next_action("...", "", stats).action == ActionType.REST_PARK
+    assert breaker.state == BreakerState.CLOSED
+    assert outcomes == []
+    
+    # 半开试探遇到未知错误时重新打开
+    outcomes[:] = [RuntimeError("unexpected")]
+    brain.decide_next_action("...", "", stats)
+    now[0] = 22.0
+    outcomes[:] = [RuntimeError("still broken")]
+    brain.decide_next_action("...", "", stats)
+    assert breaker.state == BreakerState.OPEN
@@ -1,5 +1,5 @@
 import api from './api'
-import type { Agent, Thought, AgentHistory } from '../types'
+import type { Agent, Thought, AgentThoughts, AgentHistory } from '../types'
 
 export const agentService = {
   async getAllAgents(): Promise<Agent[]> {
@@ -17,6 +17,12 @@ export const agentService = {
     return response.data
   },
 
+  async getAgentThoughts(ids?: string[]): Promise<AgentThoughts> {
+    const params = ids && ids.length ? { ids: ids.join(',') } : undefined
+    const response = await api.get('/agents/thoughts', { params })
+    return response.data
+  },
+
   async getAgentHistory(id: string): Promise<AgentHistory> {
     const response = await api.get(`/agents/${id}/history`)
     return response.data
@@ -0,0 +1,39 @@
+import type { WorldStreamMessage } from '../types'
+
+export interface WorldStreamHandlers {
+  onMessage: (message: WorldStreamMessage) => void
+  onOpen?: () => void
+  onClose?: () => void
+}
+
+function streamUrl(): string {
+  const base = import.meta.env.VITE_API_BASE_URL || '/api/v1'
+  if (/^https?:/.test(base)) {
+    return `${base.replace(/^http/, 'ws')}/world/stream`
+  }
+  const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws'
+  return `${protocol}://${window.location.host}${base}/world/stream`
+}
+
+// 连接 /world/stream，返回关闭函数
+export function connectWorldStream(handlers: WorldStreamHandlers): () => void {
+  const socket = new WebSocket(streamUrl())
+  let closedByClient = false
+
+  socket.onopen = () => handlers.onOpen?.()
+  socket.onmessage = (event) => {
+    try {
+      handlers.onMessage(JSON.parse(event.data) as WorldStreamMessage)
+    } catch (error) {
+      console.error('Invalid world stream message:', error)
+    }
+  }
+  socket.onclose = () => {
+    if (!closedByClient) handlers.onClose?.()
+  }
+
+  return () => {
+    closedByClient = true
+    socket.close()
+  }
+}
@@ -1,5 +1,5 @@
 import api from './api'
-import type { WorldStatus } from '../types'
+import type { WorldStatus, TickJob } from '../types'
 
 export const worldService = {
   async getStatus(): Promise<WorldStatus> {
@@ -7,8 +7,19 @@ export const worldService = {
     return response.data
   },
 
-  async tick(): Promise<{ message: string; time: string }> {
-    const response = await api.post('/world/tick')
+  // 启动后台推进任务，立即返回任务信息
+  async tick(ticks = 1): Promise<TickJob> {
+    const response = await api.post('/admin/world/tick', { ticks })
+    return response.data
+  },
+
+  async getTickJob(jobId: string): Promise<TickJob> {
+    const response = await api.get(`/admin/world/jobs/${jobId}`)
+    return response.data
+  },
+
+  async cancelTickJob(jobId: string): Promise<TickJob> {
+    const response = await api.post(`/admin/world/jobs/${jobId}/cancel`)
     return response.data
   }
 }
@@ -1,7 +1,7 @@
 import { defineStore } from 'pinia'
 import { ref, computed } from 'vue'
 import { agentService } from '../services/agent'
-import type { Agent, Thought, AgentHistory } from '../types'
+import type { Agent, Thought, AgentHistory, StreamAgent } from '../types'
 
 export const useAgentStore = defineStore('agent', () => {
   const agents = ref<Map<string, Agent>>(new Map())
@@ -68,6 +68,31 @@ export const useAgentStore = defineStore('agent', () => {
     }
   }
 
+  // 推送的记录不含 type / values，沿用已有的值
+  function mergeStreamAgent(record: StreamAgent) {
+    const { thought, ...fields } = record
+    const existing = agents.value.get(record.id)
+    agents.value.set(record.id, {
+      type: 'Agent',
+      values: '',
+      ...existing,
+      ...fields
+    })
+  }
+
+  function applySnapshot(records: StreamAgent[]) {
+    const ids = new Set(records.map(record => record.id))
+    for (const id of Array.from(agents.value.keys())) {
+      if (!ids.has(id)) agents.value.delete(id)
+    }
+    records.forEach(mergeStreamAgent)
+  }
+
+  function applyDelta(records: StreamAgent[], removed: string[] = []) {
+    removed.forEach(id => agents.value.delete(id))
+    records.forEach(mergeStreamAgent)
+  }
+
   function selectAgent(id: string | null) {
     selectedAgentId.value = id
   }
@@ -90,6 +115,8 @@ export const useAgentStore = defineStore('agent', () => {
     fetchAgent,
     fetchAgentThought,
     fetchAgentHistory,
+    applySnapshot,
+    applyDelta,
     selectAgent,
     updateAgent
   }
@@ -1,7 +1,15 @@
 import { defineStore } from 'pinia'
 import { ref, computed } from 'vue'
 import { worldService } from '../services/world'
-import type { WorldStatus, GameTime } from '../types'
+import type { WorldStatus, GameTime, TickJob } from '../types'
+
+const JOB_POLL_INTERVAL = 500
+
+// "2024-01-01 07:00" -> { hour: 7, minute: 0 }
+function parseGameTime(value: string): GameTime | null {
+  const match = /(\d{1,2}):(\d{2})$/.exec(value)
+  return match ? { hour: Number(match[1]), minute: Number(match[2]) } : null
+}
 
 export const useWorldStore = defineStore('world', () => {
   const time = ref<GameTime>({ hour: 8, minute: 0 })
@@ -9,6 +17,7 @@ export const useWorldStore = defineStore('world', () => {
   const activeAgentsCount = ref(0)
   const isLoading = ref(false)
   const error = ref<string | null>(null)
+  const currentJob = ref<TickJob | null>(null)
 
   const formattedTime = computed(() => {
     return `${time.value.hour.toString().padStart(2, '0')}:${time.value.minute.toString().padStart(2, '0')}`
@@ -23,8 +32,8 @@ export const useWorldStore = defineStore('world', () => {
     error.value = null
     try {
       const status = await worldService.getStatus()
-      const [hour, minute] = status.time.split(':').map(Number)
-      time.value = { hour, minute }
+      const parsed = parseGameTime(status.time)
+      if (parsed) time.value = parsed
       weather.value = status.weather
       activeAgentsCount.value = status.active_agents
     } catch (e) {
@@ -35,12 +44,22 @@ export const useWorldStore = defineStore('world', () => {
     }
   }
 
-  async function tickWorld() {
+  // 启动后台推进任务并轮询到结束，期间持续更新时间
+  async function tickWorld(ticks = 60) {
     try {
-      const result = await worldService.tick()
-      const [hour, minute] = result.time.split(':').map(Number)
-      time.value = { hour, minute }
-      return result
+      let job = await worldService.tick(ticks)
+      currentJob.value = job
+      while (job.status === 'pending' || job.status === 'running') {
+        await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL))
+        job = await worldService.getTickJob(job.job_id)
+        currentJob.value = job
+        const parsed = job.current_time ? parseGameTime(job.current_time) : null
+        if (parsed) time.value = parsed
+      }
+      if (job.status === 'failed') {
+        throw new Error(job.error || 'Tick job failed')
+      }
+      return job
     } catch (e) {
       error.value = 'Failed to tick world'
       console.error(e)
@@ -48,20 +67,35 @@ export const useWorldStore = defineStore('world', () => {
     }
   }
 
+  async function cancelTick() {
+    if (currentJob.value) {
+      currentJob.value = await worldService.cancelTickJob(currentJob.value.job_id)
+    }
+  }
+
   function updateTime(hour: number, minute: number) {
     time.value = { hour, minute }
   }
 
+  function applyStreamTime(value: string, agentCount: number) {
+    const parsed = parseGameTime(value)
+    if (parsed) time.value = parsed
+    activeAgentsCount.value = agentCount
+  }
+
   return {
     time,
     weather,
     activeAgentsCount,
     isLoading,
     error,
+    currentJob,
     formattedTime,
     isNight,
     fetchWorldStatus,
     tickWorld,
-    updateTime
+    cancelTick,
+    updateTime,
+    applyStreamTime
   }
 })
@@ -25,10 +25,37 @@ export interface Agent {
   values: string
 }
 
+// 推送中的 Agent 记录，附带最近的想法
+export interface StreamAgent extends Omit<Agent, 'type' | 'values'> {
+  thought: string | null
+}
+
+export interface WorldStreamMessage {
+  type: 'snapshot' | 'delta'
+  tick: number
+  time: string
+  is_night: boolean
+  agents: StreamAgent[]
+  removed?: string[]
+}
+
 export interface Thought {
   content: string
   timestamp: string
   action: string
+  tick?: number | null
+}
+
+export interface AgentThought {
+  agent_id: string
+  content: string | null
+  action: string
+  tick: number | null
+}
+
+export interface AgentThoughts {
+  timestamp: string
+  thoughts: AgentThought[]
 }
 
 export interface GameTime {
@@ -42,6 +69,19 @@ export interface WorldStatus {
   active_agents: number
 }
 
+export type TickJobStatus = 'pending' | 'running' | 'completed' | 'cancelled' | 'failed'
+
+export interface TickJob {
+  job_id: string
+  status: TickJobStatus
+  ticks: number
+  ticks_done: number
+  progress: number
+  ticks_per_sec: number
+  current_time: string | null
+  error: string | null
+}
+
 export interface AgentHistory {
   agent_id: string
   history: Array<{ content: string }>